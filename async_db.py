@@ -0,0 +1,242 @@
+"""Awaitable counterparts of the :mod:`db` helpers.
+
+SQLite calls block, so running them directly inside ``async def`` handlers
+stalls the whole event loop.  Every function here forwards to the function of
+the same name in :mod:`db`.  Reads execute on a small dedicated thread pool,
+letting other updates be processed while SQLite works.  Writes are handed to
+a single writer thread which drains whatever is queued and commits it as one
+transaction, so a burst of concurrent inserts and edits costs one fsync
+instead of one per statement and never competes for the write lock.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+import db
+from config import Config
+from instrumentation import DB_ERRORS, DB_SECONDS
+
+T = TypeVar("T")
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+class _Writer:
+    """Single thread applying queued writes in grouped transactions.
+
+    Each job runs inside its own savepoint of the shared transaction, so a
+    failing job is rolled back alone and its exception is delivered to the
+    caller, while the rest of the batch is still committed.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="db-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, func: Callable[..., T], args: tuple, kwargs: dict) -> Future:
+        future: Future = Future()
+        self._queue.put((func, args, kwargs, future))
+        return future
+
+    def stop(self) -> None:
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is self._STOP:
+                break
+            batch = [job]
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is self._STOP:
+                    stopping = True
+                    break
+                batch.append(job)
+            self._apply(batch)
+
+    @staticmethod
+    def _apply(batch: list) -> None:
+        outcomes: list[tuple[Future, bool, Any]] = []
+        try:
+            with DB_SECONDS.time(function="write_batch"), db.get_connection(write=True):
+                for func, args, kwargs, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with db.get_connection():
+                            result = func(*args, **kwargs)
+                    except Exception as exc:
+                        outcomes.append((future, False, exc))
+                    else:
+                        outcomes.append((future, True, result))
+        except Exception as exc:
+            logging.exception("Failed to commit a batch of %d writes", len(batch))
+            for *_, future in batch:
+                if not future.cancelled():
+                    future.set_exception(exc)
+            return
+
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+_writer: _Writer | None = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer() -> _Writer:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = _Writer(Config.DB_WRITE_BATCH_SIZE)
+    return _writer
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.DB_EXECUTOR_WORKERS,
+                    thread_name_prefix="db",
+                )
+    return _executor
+
+
+async def run(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run blocking ``func`` on the database executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+
+
+async def write(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Queue blocking write ``func`` for the writer thread and await it.
+
+    The result is available only after the transaction containing the write
+    has been committed.
+    """
+    future = _get_writer().submit(func, args, kwargs)
+    return await asyncio.wrap_future(future)
+
+
+def write_and_wait(name: str, /, *args: Any, **kwargs: Any) -> Any:
+    """Apply :mod:`db` write function ``name`` on the writer thread and block.
+
+    For synchronous code running outside the event loop, such as
+    :mod:`bulk_import` on the executor or in a script: the write is queued,
+    batched and timed like :func:`write` calls.  Must not be called from the
+    writer thread itself.
+    """
+    return _get_writer().submit(_measured, (name, *args), kwargs).result()
+
+
+def shutdown() -> None:
+    """Wait for queued database work to finish and stop the worker threads."""
+    global _executor, _writer
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
+
+
+def _measured(name: str, /, *args: Any, **kwargs: Any) -> Any:
+    """Call :mod:`db` function ``name`` recording its time and failures."""
+    start = time.perf_counter()
+    try:
+        return getattr(db, name)(*args, **kwargs)
+    except Exception:
+        DB_ERRORS.inc(function=name)
+        raise
+    finally:
+        DB_SECONDS.observe(time.perf_counter() - start, function=name)
+
+
+def _wrap(name: str, dispatch: Callable[..., Any] = run) -> Callable[..., Any]:
+    """Return an async proxy for :mod:`db` function ``name``.
+
+    ``dispatch`` is :func:`run` for reads and :func:`write` for statements
+    that modify data.  The target is looked up on every call so
+    monkeypatching :mod:`db` in tests affects the async API as well.  Calls
+    are timed per function in :data:`instrumentation.DB_SECONDS`.
+    """
+
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return await dispatch(_measured, name, *args, **kwargs)
+
+    wrapper.__name__ = wrapper.__qualname__ = name
+    wrapper.__doc__ = getattr(db, name).__doc__
+    return wrapper
+
+
+get_user_by_telegram_id = _wrap("get_user_by_telegram_id")
+get_user_id = _wrap("get_user_id")
+add_user = _wrap("add_user", write)
+get_latest_users = _wrap("get_latest_users")
+get_all_telegram_ids = _wrap("get_all_telegram_ids")
+set_users_blocked = _wrap("set_users_blocked", write)
+
+create_broadcast = _wrap("create_broadcast", write)
+get_broadcast = _wrap("get_broadcast")
+get_latest_broadcasts = _wrap("get_latest_broadcasts")
+get_running_broadcast_ids = _wrap("get_running_broadcast_ids")
+get_broadcast_recipients = _wrap("get_broadcast_recipients")
+update_broadcast_progress = _wrap("update_broadcast_progress", write)
+finish_broadcast = _wrap("finish_broadcast", write)
+
+record_event = _wrap("record_event", write)
+prune_change_log = _wrap("prune_change_log", write)
+
+add_cargo = _wrap("add_cargo", write)
+search_cargo = _wrap("search_cargo")
+get_latest_cargo = _wrap("get_latest_cargo")
+get_cargo_by_user = _wrap("get_cargo_by_user")
+get_cargo = _wrap("get_cargo")
+update_cargo_weight = _wrap("update_cargo_weight", write)
+update_cargo_route = _wrap("update_cargo_route", write)
+update_cargo_dates = _wrap("update_cargo_dates", write)
+delete_cargo = _wrap("delete_cargo", write)
+
+add_truck = _wrap("add_truck", write)
+search_trucks = _wrap("search_trucks")
+get_latest_trucks = _wrap("get_latest_trucks")
+get_trucks_by_user = _wrap("get_trucks_by_user")
+get_truck = _wrap("get_truck")
+update_truck_weight = _wrap("update_truck_weight", write)
+update_truck_route = _wrap("update_truck_route", write)
+update_truck_dates = _wrap("update_truck_dates", write)
+delete_truck = _wrap("delete_truck", write)
+
+update_user_name = _wrap("update_user_name", write)
+update_user_city = _wrap("update_user_city", write)
+update_user_phone = _wrap("update_user_phone", write)
+delete_user = _wrap("delete_user", write)
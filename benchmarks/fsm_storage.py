@@ -0,0 +1,76 @@
+"""Compare :class:`fsm_storage.SQLiteStorage` with aiogram's ``MemoryStorage``.
+
+Simulates users walking through the add-cargo wizard concurrently: every
+step reads the state and data, updates the data and moves to the next state,
+like the handlers do.  Run from the project root::
+
+    python benchmarks/fsm_storage.py --users 2000 --steps 12
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import async_db
+from db_pool import close_all
+from fsm_storage import SQLiteStorage
+
+
+async def walk(storage: BaseStorage, user_id: int, steps: int) -> None:
+    key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+    for step in range(steps):
+        await storage.get_state(key)
+        await storage.get_data(key)
+        await storage.update_data(key, {f"field_{step}": f"value {step}"})
+        await storage.set_state(key, f"CargoAddStates:step_{step}")
+        await asyncio.sleep(0)
+    await storage.set_state(key, None)
+    await storage.set_data(key, {})
+
+
+async def measure(storage: BaseStorage, users: int, steps: int) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(walk(storage, uid, steps) for uid in range(users)))
+    await storage.close()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=12)
+    args = parser.parse_args()
+    ops = args.users * (args.steps * 4 + 2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "MemoryStorage": asyncio.run(
+                measure(MemoryStorage(), args.users, args.steps)
+            ),
+            "SQLiteStorage": asyncio.run(
+                measure(
+                    SQLiteStorage(os.path.join(tmp, "fsm.sqlite3"), flush_interval=0.05),
+                    args.users,
+                    args.steps,
+                )
+            ),
+        }
+        async_db.shutdown()
+        close_all()
+
+    for name, elapsed in results.items():
+        print(f"{name:14} {elapsed:8.3f} s  {ops / elapsed:12,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""End-to-end load test of the real dispatcher against a fake Bot API.
+
+Virtual users walk through registration, adding cargo and a truck, a cargo
+search and a truck search (dates are picked by clicking the inline calendar,
+including month navigation).  Every step is a raw update fed to the
+dispatcher built by :func:`bot.create_dispatcher`, so middlewares, FSM
+storage, handlers and the database run exactly as in production.  Bot API
+requests go over HTTP to a local fake server that answers every method
+instantly (or after ``--api-latency`` ms).
+
+The database can be seeded with large volumes of cargo and trucks first.
+The report lists updates/second and p50/p95/p99 latency per handler; use
+``--json`` to keep the numbers as a baseline and ``--seed`` to make runs
+repeatable.  Run from the project root::
+
+    python benchmarks/load.py --users 200 --cargo-rows 100000 --truck-rows 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Iterator
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# bot.py refuses to start without a token; the fake API accepts any
+os.environ.setdefault("API_TOKEN", "123456:BENCHMARK")
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+import db
+from bot import create_dispatcher
+from config import Config
+from locations import get_cities, get_regions
+
+# Rows inserted per transaction while seeding
+_SEED_CHUNK = 10_000
+
+
+# ---- Seeding ----
+
+def _places(rng: random.Random) -> list[tuple[str, str]]:
+    """Return ``(region, city)`` pairs seeded rows are spread over."""
+    places = [
+        (region, city) for region in get_regions() for city in get_cities(region)[:5]
+    ]
+    rng.shuffle(places)
+    return places[:300]
+
+
+def seed(users: int, cargo: int, trucks: int, rng: random.Random) -> None:
+    """Insert ``users`` users owning ``cargo`` cargo rows and ``trucks`` trucks.
+
+    Seeded users get Telegram IDs from 10**9 up so they never collide with
+    virtual users.
+    """
+    places = _places(rng)
+    regions = get_regions()
+    today = date.today()
+    created = datetime.now().isoformat()
+    body_types = Config.BODY_TYPES + ["Не важно"]
+
+    with db.get_connection(write=True) as conn:
+        first = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (telegram_id, name, city, phone, created_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [
+                (10**9 + first + i, f"Seed {i}", "Москва", "+79990000000", created)
+                for i in range(users)
+            ],
+        )
+        user_ids = [r[0] for r in conn.execute("SELECT id FROM users")]
+
+    def dates() -> tuple[str, str]:
+        start = today + timedelta(days=rng.randrange(-30, 90))
+        end = start + timedelta(days=rng.randrange(0, 14))
+        return start.isoformat(), end.isoformat()
+
+    def cargo_rows(count: int) -> Iterator[tuple]:
+        for _ in range(count):
+            region_from, city_from = rng.choice(places)
+            region_to, city_to = rng.choice(places)
+            date_from, date_to = dates()
+            yield (
+                rng.choice(user_ids), city_from, region_from, city_to, region_to,
+                date_from, date_to, rng.randint(1, 40), rng.choice(body_types),
+                0, "", created, db.normalize_city(city_from), db.normalize_city(city_to),
+            )
+
+    for done in range(0, cargo, _SEED_CHUNK):
+        with db.get_connection(write=True) as conn:
+            conn.executemany(
+                "INSERT INTO cargo (user_id, city_from, region_from, city_to,"
+                " region_to, date_from, date_to, weight, body_type, is_local,"
+                " comment, created_at, city_from_norm, city_to_norm)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                cargo_rows(min(_SEED_CHUNK, cargo - done)),
+            )
+
+    for done in range(0, trucks, _SEED_CHUNK):
+        with db.get_connection(write=True) as conn:
+            for _ in range(min(_SEED_CHUNK, trucks - done)):
+                region, city = rng.choice(places)
+                date_from, date_to = dates()
+                route = ", ".join(rng.sample(regions, rng.randint(0, 3)))
+                cursor = conn.execute(
+                    "INSERT INTO trucks (user_id, city, region, date_from, date_to,"
+                    " weight, body_type, direction, route_regions, comment,"
+                    " created_at, city_norm)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        rng.choice(user_ids), city, region, date_from, date_to,
+                        rng.randint(1, 40), rng.choice(Config.BODY_TYPES + ["Любой"]),
+                        rng.choice(Config.TRUCK_DIRECTIONS), route, "", created,
+                        db.normalize_city(city),
+                    ),
+                )
+                db._set_route_regions(conn.cursor(), cursor.lastrowid, route)
+
+    # Seeding is not a change other processes need to replay
+    db.prune_change_log(0)
+
+
+# ---- Fake Bot API ----
+
+class FakeBotAPI:
+    """Local HTTP server answering Bot API methods like Telegram would."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._message_ids = itertools.count(10**6)
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    def _result(self, method: str, params: dict[str, Any]) -> Any:
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method.startswith("send") or method.startswith("edit"):
+            chat_id = int(params.get("chat_id") or 0)
+            return {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": str(params.get("text") or ""),
+            }
+        return True
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+# ---- Virtual users ----
+
+class VirtualUser:
+    """Builds the raw updates one Telegram user sends."""
+
+    _update_ids = itertools.count(1)
+
+    def __init__(self, telegram_id: int, rng: random.Random, places, cities) -> None:
+        self.id = telegram_id
+        self.rng = rng
+        self.places = places
+        self.cities = cities
+        self._message_ids = itertools.count(1)
+        self._user = {"id": telegram_id, "is_bot": False, "first_name": f"U{telegram_id}"}
+        self._chat = {"id": telegram_id, "type": "private"}
+
+    def message(self, text: str) -> dict[str, Any]:
+        return {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": self._chat,
+                "from": self._user,
+                "text": text,
+            },
+        }
+
+    def click(self, data: str) -> dict[str, Any]:
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": self._user,
+                "chat_instance": str(self.id),
+                "data": data,
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": self._chat,
+                    "text": "calendar",
+                },
+            },
+        }
+
+    def scenarios(self) -> list[tuple[str, list[dict[str, Any]]]]:
+        """Return ``(scenario, updates)`` in the order the user sends them."""
+        rng = self.rng
+        today = date.today()
+        start = today + timedelta(days=rng.randrange(1, 20))
+        end = start + timedelta(days=rng.randrange(1, 10))
+        (region_from, city_from), (region_to, city_to) = rng.sample(self.places, 2)
+        search_city = rng.choice(self.cities + ["Все"])
+        return [
+            ("registration", [
+                self.message("/start"),
+                self.message(f"User {self.id}"),
+                self.message("Москва"),
+                self.message(f"+7999{self.id % 10**7:07d}"),
+            ]),
+            ("add_cargo", [
+                self.message("➕ Добавить груз"),
+                self.message(region_from),
+                self.message(city_from),
+                self.message(region_to),
+                self.message(city_to),
+                self.click(f"cal:next_m:{today.year}-{today.month}"),
+                self.click(f"cal:{start.isoformat()}"),
+                self.click(f"cal:{end.isoformat()}"),
+                self.message(str(rng.randint(1, 40))),
+                self.message(rng.choice(Config.BODY_TYPES)),
+                self.message("Нет (междугородний)"),
+                self.message("нет"),
+            ]),
+            ("add_truck", [
+                self.message("➕ Добавить ТС"),
+                self.message(region_from),
+                self.message(city_from),
+                self.click(f"cal:{start.isoformat()}"),
+                self.click(f"cal:{end.isoformat()}"),
+                self.message(str(rng.randint(1, 40))),
+                self.message("Любой"),
+                self.message(rng.choice(Config.TRUCK_DIRECTIONS)),
+                self.message(region_to),
+                self.message("нет"),
+            ]),
+            ("search_cargo", [
+                self.message("🔍 Найти груз"),
+                self.message(search_city),
+                self.message("Все"),
+                self.click("cal:skip"),
+                self.click("cal:skip"),
+            ]),
+            ("search_trucks", [
+                self.message("🔍 Найти ТС"),
+                self.message(search_city),
+                self.click(f"cal:{today.isoformat()}"),
+                self.click("cal:skip"),
+            ]),
+        ]
+
+
+# ---- Measurement ----
+
+class LatencyRecorder:
+    """Inner middleware collecting exact handler durations by handler name."""
+
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        name = getattr(getattr(data.get("handler"), "callback", None), "__name__", "?")
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+async def run_load(
+    users: int,
+    concurrency: int,
+    api_latency: float = 0.0,
+    rng: random.Random | None = None,
+) -> dict[str, Any]:
+    """Drive ``users`` virtual users, ``concurrency`` at a time; return stats."""
+    rng = rng or random.Random(0)
+    places = _places(rng)
+    cities = [city for _, city in places[:20]]
+    api = FakeBotAPI(api_latency)
+    await api.start()
+    bot = Bot(
+        "123456:BENCHMARK",
+        session=AiohttpSession(api=TelegramAPIServer.from_base(api.base_url)),
+    )
+    dp = create_dispatcher(resume_broadcasts=False, prune_change_log=False)
+    recorder = LatencyRecorder()
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(recorder)
+
+    updates: list[float] = []
+    scenarios: dict[str, list[float]] = defaultdict(list)
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def walk(telegram_id: int) -> None:
+        nonlocal errors
+        user = VirtualUser(telegram_id, random.Random(rng.random()), places, cities)
+        async with semaphore:
+            for name, steps in user.scenarios():
+                started = time.perf_counter()
+                for update in steps:
+                    begin = time.perf_counter()
+                    try:
+                        await dp.feed_raw_update(bot, update)
+                    except Exception:
+                        errors += 1
+                    updates.append(time.perf_counter() - begin)
+                scenarios[name].append(time.perf_counter() - started)
+
+    workflow = {"bot": bot, "bots": [bot], "dispatcher": dp}
+    await dp.emit_startup(**workflow)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(walk(i) for i in range(1, users + 1)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await dp.emit_shutdown(**workflow)
+        await bot.session.close()
+        await api.close()
+
+    return {
+        "users": users,
+        "concurrency": concurrency,
+        "updates": len(updates),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "updates_per_s": len(updates) / elapsed if elapsed else 0.0,
+        "update_latency": summarize(updates),
+        "scenarios": {name: summarize(s) for name, s in scenarios.items()},
+        "handlers": {name: summarize(s) for name, s in recorder.samples.items()},
+        "api_calls": dict(api.calls),
+    }
+
+
+def print_report(result: dict[str, Any]) -> None:
+    print(
+        f"{result['updates']} updates from {result['users']} users in "
+        f"{result['elapsed_s']:.2f} s: {result['updates_per_s']:,.0f} updates/s, "
+        f"{result['errors']} errors"
+    )
+    print(f"{'':28} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+
+    def row(name: str, s: dict[str, float]) -> None:
+        print(
+            f"{name:28} {s['count']:7} {s['p50_ms']:9.2f} "
+            f"{s['p95_ms']:9.2f} {s['p99_ms']:9.2f}"
+        )
+
+    row("update (end to end)", result["update_latency"])
+    print("-- scenarios")
+    for name, s in result["scenarios"].items():
+        row(name, s)
+    print("-- handlers (slowest p99 first)")
+    for name, s in sorted(result["handlers"].items(), key=lambda i: -i[1]["p99_ms"]):
+        row(name, s)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="virtual users")
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="virtual users active at the same time")
+    parser.add_argument("--cargo-rows", type=int, default=10_000,
+                        help="cargo rows seeded before the run")
+    parser.add_argument("--truck-rows", type=int, default=2_000,
+                        help="trucks seeded before the run")
+    parser.add_argument("--seed-users", type=int, default=1_000,
+                        help="owners of the seeded rows")
+    parser.add_argument("--api-latency", type=float, default=0.0,
+                        help="milliseconds the fake Bot API waits per request")
+    parser.add_argument("--db", help="database file to use (kept); default: temporary")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    from async_db import shutdown
+    from db_pool import close_all
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = args.db or os.path.join(tmp, "bench.sqlite3")
+        Config.FSM_DB_PATH = os.path.join(tmp, "fsm.sqlite3")
+        Config.METRICS_PORT = 0
+        db.init_db()
+
+        started = time.perf_counter()
+        seed(args.seed_users, args.cargo_rows, args.truck_rows, rng)
+        print(
+            f"Seeded {args.cargo_rows} cargo and {args.truck_rows} trucks "
+            f"in {time.perf_counter() - started:.1f} s"
+        )
+
+        result = asyncio.run(
+            run_load(args.users, args.concurrency, args.api_latency / 1000, rng)
+        )
+        shutdown()
+        with db.get_connection() as conn:
+            added = {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("cargo", "trucks")
+            }
+        close_all()
+
+    result["seeded"] = {"cargo": args.cargo_rows, "trucks": args.truck_rows}
+    # Every virtual user should have finished both adding flows
+    result["added"] = {
+        "cargo": added["cargo"] - args.cargo_rows,
+        "trucks": added["trucks"] - args.truck_rows,
+    }
+    print_report(result)
+    if result["added"] != {"cargo": args.users, "trucks": args.users}:
+        print(f"WARNING: expected {args.users} new cargo and trucks, got {result['added']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
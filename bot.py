@@ -6,7 +6,19 @@ import os
 
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+
+import broadcast
+import housekeeping
+import message_cleanup
+from config import Config
+from fsm_storage import SQLiteStorage
+from instrumentation import start_metrics_server
+from outbound import OutboundScheduler
+from middlewares import (
+    HandlerMetricsMiddleware,
+    TelegramApiMetricsMiddleware,
+    UserIdentityMiddleware,
+)
 
 # Регистрируем новые хендлеры
 from handlers import (
@@ -24,7 +36,61 @@ if not API_TOKEN:
     logging.error("API_TOKEN environment variable is required")
     raise RuntimeError("API_TOKEN environment variable is required")
 
+
+def create_bot(rate: float | None = None) -> Bot:
+    """
+    Создаёт бота: исходящие запросы проходят через очередь с ограничением
+    частоты ``rate`` в секунду (по умолчанию ``Config.TELEGRAM_RATE``), их
+    время попадает в метрики.
+    """
+    bot = Bot(token=API_TOKEN)
+    # Очередь первой: метрики видят только время самого запроса
+    bot.session.middleware(OutboundScheduler(rate=rate))
+    bot.session.middleware(TelegramApiMetricsMiddleware())
+    return bot
+
+
+def create_dispatcher(
+    resume_broadcasts: bool = True, prune_change_log: bool = True
+) -> Dispatcher:
+    """Создаёт диспетчер со всеми middleware и хендлерами.
+
+    ``resume_broadcasts`` — продолжать ли незавершённые рассылки при старте,
+    ``prune_change_log`` — очищать ли журнал изменений в фоне (при нескольких
+    процессах это делает только один из них).
+    """
+    # Состояние диалогов переживает перезапуск (сохраняется при остановке)
+    dp = Dispatcher(storage=SQLiteStorage())
+
+    # Один запрос id пользователя на апдейт (через кэш identity)
+    dp.update.outer_middleware(UserIdentityMiddleware())
+    # Время работы каждого хендлера
+    for observer in (dp.message, dp.callback_query, dp.my_chat_member):
+        observer.middleware(HandlerMetricsMiddleware())
+
+    # Незавершённые рассылки продолжаются после перезапуска
+    if resume_broadcasts:
+        dp.startup.register(broadcast.on_startup)
+    dp.shutdown.register(broadcast.on_shutdown)
+    # Журнал изменений (db.change_log) не растёт бесконечно
+    if prune_change_log:
+        dp.startup.register(housekeeping.on_startup)
+        dp.shutdown.register(housekeeping.on_shutdown)
+    # Удаления сообщений из очереди выполняются до остановки
+    dp.shutdown.register(message_cleanup.on_shutdown)
+
+    # Регистрируем хендлеры
+    register_user_handlers(dp)
+    register_cargo_handlers(dp)
+    register_truck_handlers(dp)
+    register_profile_handler(dp)
+    register_common_handlers(dp)
+    register_admin_handlers(dp)
+    return dp
+
+
 async def main():
+    metrics_runner = None
     try:
         if not logging.getLogger().hasHandlers():
             logging.basicConfig(level=logging.INFO)
@@ -43,22 +109,34 @@ async def main():
         )
 
         # Создаём бота и диспетчер
-        bot = Bot(token=API_TOKEN)
-        dp = Dispatcher(storage=MemoryStorage())
-
-        # Регистрируем хендлеры
-        register_user_handlers(dp)
-        register_cargo_handlers(dp)
-        register_truck_handlers(dp)
-        register_profile_handler(dp)
-        register_common_handlers(dp)
-        register_admin_handlers(dp)
-
-        # Запускаем поллинг
-        await dp.start_polling(bot)
+        bot = create_bot()
+        dp = create_dispatcher()
+
+        # Метрики Prometheus: http://METRICS_HOST:METRICS_PORT/metrics
+        if Config.METRICS_PORT:
+            metrics_runner = await start_metrics_server(
+                Config.METRICS_HOST, Config.METRICS_PORT
+            )
+
+        # Получаем апдейты через вебхук или поллингом (по умолчанию)
+        if Config.BOT_MODE == "webhook":
+            from webhook import run_webhook
+            await run_webhook(dp, bot)
+        else:
+            # Вебхук, оставшийся от запуска в режиме webhook, мешает поллингу
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     except Exception as e:
         logging.error(f"Ошибка запуска бота: {e}")
         raise
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        # Дожидаемся фоновых запросов к БД и закрываем пул соединений
+        from async_db import shutdown
+        from db_pool import close_all
+        shutdown()
+        close_all()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,246 @@
+"""Background delivery of admin broadcasts.
+
+A broadcast is stored in the ``broadcasts`` table and sent by an asyncio task
+instead of the admin's handler.  Recipients are read in batches of
+:attr:`Config.BROADCAST_BATCH_SIZE` users ordered by ``users.id``; up to
+:attr:`Config.BROADCAST_CONCURRENCY` messages are in flight while the total
+rate is kept under :attr:`Config.BROADCAST_RATE` messages per second and
+every chat gets at most one message per
+:attr:`Config.BROADCAST_CHAT_INTERVAL` seconds.  ``RetryAfter`` pauses all
+senders for the time Telegram asks for.
+
+Progress is saved after every batch, so broadcasts still running when the
+bot stops are resumed by :meth:`Broadcaster.resume` on the next start (a
+batch interrupted midway may be delivered twice).  Users who blocked the bot
+or deleted their account are marked ``users.is_blocked`` and skipped from
+then on.  Broadcast messages have :data:`outbound.BULK` priority, so
+replies to users are not delayed behind them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+
+import async_db
+import outbound
+from config import Config
+from ratelimit import KeyedRateLimiter, TokenBucket
+
+# Outcomes of a single delivery
+SENT, FAILED, BLOCKED = "sent", "failed", "blocked"
+
+# Statuses stored in broadcasts.status
+RUNNING, DONE, CANCELLED = "running", "done", "cancelled"
+
+# TelegramBadRequest texts meaning the chat no longer exists
+_GONE_ERRORS = ("chat not found", "user is deactivated", "bot was blocked")
+
+
+@dataclass(slots=True)
+class _Progress:
+    last_user_id: int
+    sent: int
+    failed: int
+    blocked: int
+
+
+class Broadcaster:
+    """Runs broadcasts of ``bot`` as background tasks."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        *,
+        rate: float | None = None,
+        concurrency: int | None = None,
+        batch_size: int | None = None,
+        chat_interval: float | None = None,
+        max_attempts: int | None = None,
+    ) -> None:
+        self.bot = bot
+        self.batch_size = batch_size or Config.BROADCAST_BATCH_SIZE
+        self.max_attempts = max_attempts or Config.BROADCAST_MAX_ATTEMPTS
+        self._bucket = TokenBucket(rate or Config.BROADCAST_RATE)
+        self._chats = KeyedRateLimiter(
+            Config.BROADCAST_CHAT_INTERVAL if chat_interval is None else chat_interval
+        )
+        self._slots = asyncio.Semaphore(concurrency or Config.BROADCAST_CONCURRENCY)
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def start(self, text: str, created_by: int) -> int:
+        """Store a broadcast of ``text`` and start sending it; return its ID."""
+        broadcast_id = await async_db.create_broadcast(
+            text, created_by, datetime.now().isoformat()
+        )
+        self._spawn(broadcast_id)
+        return broadcast_id
+
+    async def resume(self) -> list[int]:
+        """Continue broadcasts left unfinished by a previous run."""
+        ids = await async_db.get_running_broadcast_ids()
+        for broadcast_id in ids:
+            self._spawn(broadcast_id)
+        return ids
+
+    def is_running(self, broadcast_id: int) -> bool:
+        task = self._tasks.get(broadcast_id)
+        return task is not None and not task.done()
+
+    async def cancel(self, broadcast_id: int) -> None:
+        """Stop a broadcast for good; already sent messages stay sent."""
+        task = self._tasks.pop(broadcast_id, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await async_db.finish_broadcast(
+            broadcast_id, CANCELLED, datetime.now().isoformat()
+        )
+
+    async def wait(self, broadcast_id: int) -> None:
+        """Wait until broadcast ``broadcast_id`` stops."""
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Interrupt running broadcasts; they resume after restart."""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, broadcast_id: int) -> None:
+        if not self.is_running(broadcast_id):
+            self._tasks[broadcast_id] = asyncio.create_task(
+                self._run(broadcast_id), name=f"broadcast-{broadcast_id}"
+            )
+
+    async def _run(self, broadcast_id: int) -> None:
+        # Replies to users are sent before broadcast messages
+        outbound.set_priority(outbound.BULK)
+        row = await async_db.get_broadcast(broadcast_id)
+        if row is None or row["status"] != RUNNING:
+            return
+        text = row["text"]
+        progress = _Progress(
+            row["last_user_id"], row["sent"], row["failed"], row["blocked"]
+        )
+        try:
+            while True:
+                # Another process (see supervisor.py) may have cancelled it
+                current = await async_db.get_broadcast(broadcast_id)
+                if current is None or current["status"] != RUNNING:
+                    self._tasks.pop(broadcast_id, None)
+                    return
+                recipients = await async_db.get_broadcast_recipients(
+                    progress.last_user_id, self.batch_size
+                )
+                if not recipients:
+                    break
+                outcomes = await asyncio.gather(
+                    *(self._deliver(r["telegram_id"], text) for r in recipients)
+                )
+                gone = [
+                    r["telegram_id"]
+                    for r, outcome in zip(recipients, outcomes)
+                    if outcome == BLOCKED
+                ]
+                if gone:
+                    await async_db.set_users_blocked(gone)
+                progress.last_user_id = recipients[-1]["id"]
+                progress.sent += outcomes.count(SENT)
+                progress.failed += outcomes.count(FAILED)
+                progress.blocked += len(gone)
+                await async_db.update_broadcast_progress(
+                    broadcast_id,
+                    progress.last_user_id,
+                    progress.sent,
+                    progress.failed,
+                    progress.blocked,
+                )
+        except Exception:
+            # Left "running": resumed from the last saved batch after restart
+            logging.exception("Broadcast %s stopped", broadcast_id)
+            return
+
+        await async_db.finish_broadcast(
+            broadcast_id, DONE, datetime.now().isoformat()
+        )
+        self._tasks.pop(broadcast_id, None)
+        await self._report(row["created_by"], broadcast_id, progress)
+
+    async def _deliver(self, chat_id: int, text: str) -> str:
+        for attempt in range(1, self.max_attempts + 1):
+            async with self._slots:
+                await self._bucket.acquire()
+                await self._chats.acquire(chat_id)
+                try:
+                    await self.bot.send_message(chat_id, text)
+                    return SENT
+                except TelegramRetryAfter as e:
+                    # Flood limits apply to the whole bot
+                    self._bucket.pause(e.retry_after)
+                    continue
+                except TelegramForbiddenError:
+                    return BLOCKED
+                except TelegramBadRequest as e:
+                    if any(err in e.message.lower() for err in _GONE_ERRORS):
+                        return BLOCKED
+                    logging.warning("Broadcast to %s failed: %s", chat_id, e.message)
+                    return FAILED
+                except TelegramNetworkError:
+                    delay = min(30.0, 2.0 ** attempt)
+                except Exception:
+                    logging.exception("Broadcast to %s failed", chat_id)
+                    return FAILED
+            await asyncio.sleep(delay)
+        return FAILED
+
+    async def _report(self, admin_id: int | None, broadcast_id: int, progress: _Progress) -> None:
+        if not admin_id:
+            return
+        try:
+            await self.bot.send_message(
+                admin_id,
+                f"Рассылка #{broadcast_id} завершена.\n"
+                f"Доставлено: {progress.sent}, ошибок: {progress.failed}, "
+                f"заблокировали бота: {progress.blocked}.",
+            )
+        except Exception:
+            logging.exception("Failed to report broadcast %s", broadcast_id)
+
+
+_broadcaster: Broadcaster | None = None
+
+
+def get_broadcaster(bot: Bot) -> Broadcaster:
+    """Return the broadcaster of ``bot``, creating it on first use."""
+    global _broadcaster
+    if _broadcaster is None or _broadcaster.bot is not bot:
+        _broadcaster = Broadcaster(bot)
+    return _broadcaster
+
+
+async def on_startup(bot: Bot) -> None:
+    """Dispatcher startup hook: resume unfinished broadcasts."""
+    resumed = await get_broadcaster(bot).resume()
+    if resumed:
+        logging.info("Resumed broadcasts: %s", resumed)
+
+
+async def on_shutdown() -> None:
+    """Dispatcher shutdown hook: stop broadcasts until the next start."""
+    if _broadcaster is not None:
+        await _broadcaster.close()
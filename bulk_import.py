@@ -0,0 +1,291 @@
+"""Bulk import of cargo and truck listings from CSV files.
+
+Partners send listings as spreadsheets; saved as CSV (comma or semicolon
+separated, UTF-8 or Windows-1251 as Excel writes it) they are imported with
+``/import`` in the admin panel (see :mod:`handlers.admin`) or on the server::
+
+    python bulk_import.py cargo listings.csv --owner 123456789
+
+The first line names the columns, the same as in exports (see
+:mod:`export`):
+
+* cargo: ``region_from, city_from, region_to, city_to, date_from, date_to,
+  weight, body_type, is_local, comment``;
+* trucks: ``region, city, date_from, date_to, weight, body_type, direction,
+  route_regions, comment``.
+
+``owner_telegram_id`` may name a registered user owning the row; otherwise
+the owner given to the import is used.  Rows are read one at a time and
+checked like the answers in the add wizards (:func:`utils.validate_weight`,
+:func:`utils.parse_date`, regions and cities from :mod:`locations`).  Valid
+rows are inserted :data:`CHUNK_SIZE` at a time, one transaction each;
+invalid ones are listed in the :class:`ImportReport` with their line numbers.
+Inserts go through the writer thread of :mod:`async_db`, so an import never
+competes with the bot's own writes for the database lock.
+"""
+
+from __future__ import annotations
+
+import argparse
+import codecs
+import csv
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Iterable, Iterator
+
+import async_db
+import db
+from city_lookup import resolve_city
+from config import Config
+from locations import normalize_region, parse_regions
+from utils import parse_date, validate_weight
+
+# Valid rows inserted per transaction
+CHUNK_SIZE = 500
+# Bytes looked at to tell UTF-8 from Windows-1251
+_SAMPLE_SIZE = 64 * 1024
+
+KINDS = ("cargo", "trucks")
+
+_YES = {"да", "1", "true", "yes", "да (внутригородской)"}
+_NO = {"", "нет", "0", "false", "no", "нет (междугородний)"}
+
+
+class RowError(ValueError):
+    """A listing row that cannot be imported."""
+
+
+@dataclass(slots=True)
+class ImportReport:
+    imported: int = 0
+    # (line number, message) of every rejected row
+    errors: list[tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    def write_errors(self, path: str) -> None:
+        """Save the rejected rows as a CSV file."""
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("line", "error"))
+            writer.writerows(self.errors)
+
+
+def detect_encoding(path: str) -> str:
+    """Return ``"utf-8-sig"`` or ``"cp1251"`` for the CSV file at ``path``."""
+    with open(path, "rb") as f:
+        sample = f.read(_SAMPLE_SIZE)
+    try:
+        # A multibyte character may be cut at the end of the sample
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return "cp1251"
+    return "utf-8-sig"
+
+
+def read_rows(lines: Iterable[str]) -> Iterator[tuple[int, dict[str, str]]]:
+    """Yield ``(line number, row)`` of CSV ``lines``; keys are lowercase."""
+    lines = iter(lines)
+    header = next(lines, "")
+    # Excel with Russian settings separates columns with semicolons
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    names = [n.strip().lower() for n in next(csv.reader([header], delimiter=delimiter), [])]
+    reader = csv.reader(lines, delimiter=delimiter)
+    for values in reader:
+        if not any(v.strip() for v in values):
+            continue
+        # Header is line 1; quoted values may span several lines
+        yield reader.line_num + 1, dict(zip(names, (v.strip() for v in values)))
+
+
+def _region(row: dict[str, str], column: str) -> str:
+    value = row.get(column, "")
+    region = normalize_region(value) if value else None
+    if region is None:
+        raise RowError(f"{column}: неизвестный регион «{value}»")
+    return region
+
+
+def _city(row: dict[str, str], column: str, region: str) -> str:
+    value = row.get(column, "")
+    city, _ = resolve_city(value, region) if value else (None, [])
+    if city is None:
+        raise RowError(f"{column}: город «{value}» не найден в регионе {region}")
+    return city
+
+
+def _dates(row: dict[str, str]) -> tuple[str, str]:
+    dates = []
+    for column in ("date_from", "date_to"):
+        value = row.get(column, "")
+        iso = parse_date(value) or db.normalize_date(value)
+        try:
+            datetime.strptime(iso or "", "%Y-%m-%d")
+        except ValueError:
+            raise RowError(f"{column}: неверная дата «{value}» (ДД.ММ.ГГГГ)") from None
+        dates.append(iso)
+    if dates[1] < dates[0]:
+        raise RowError("date_to раньше date_from")
+    return dates[0], dates[1]
+
+
+def _weight(row: dict[str, str]) -> int:
+    ok, weight = validate_weight(row.get("weight", ""))
+    if not ok:
+        raise RowError(f"weight: «{row.get('weight', '')}» — нужно число от 1 до 1000")
+    return weight
+
+
+def _choice(row: dict[str, str], column: str, options: list[str], default: str | None) -> str:
+    value = row.get(column, "")
+    if not value and default is not None:
+        return default
+    for option in options:
+        if option.casefold() == value.casefold():
+            return option
+    raise RowError(f"{column}: «{value}» — допустимо: {', '.join(options)}")
+
+
+def _comment(row: dict[str, str]) -> str:
+    comment = row.get("comment", "")
+    return "" if comment.lower() == "нет" else comment
+
+
+def parse_cargo(row: dict[str, str], user_id: int, created_at: str) -> tuple:
+    """Return :func:`db.add_cargo` arguments for ``row`` or raise :class:`RowError`."""
+    region_from = _region(row, "region_from")
+    city_from = _city(row, "city_from", region_from)
+    region_to = _region(row, "region_to")
+    city_to = _city(row, "city_to", region_to)
+    date_from, date_to = _dates(row)
+    weight = _weight(row)
+    body_type = _choice(row, "body_type", Config.BODY_TYPES + ["Не важно"], "Не важно")
+    is_local = row.get("is_local", "").lower()
+    if is_local not in _YES | _NO:
+        raise RowError(f"is_local: «{row['is_local']}» — да или нет")
+    return (
+        user_id, city_from, region_from, city_to, region_to, date_from, date_to,
+        weight, body_type, int(is_local in _YES), _comment(row), created_at,
+    )
+
+
+def parse_truck(row: dict[str, str], user_id: int, created_at: str) -> tuple:
+    """Return :func:`db.add_truck` arguments for ``row`` or raise :class:`RowError`."""
+    region = _region(row, "region")
+    city = _city(row, "city", region)
+    date_from, date_to = _dates(row)
+    weight = _weight(row)
+    body_type = _choice(row, "body_type", Config.BODY_TYPES + ["Любой"], "Любой")
+    direction = _choice(row, "direction", Config.TRUCK_DIRECTIONS, None)
+    route = row.get("route_regions", "")
+    regions: list[str] = []
+    if route.lower() not in ("", "нет"):
+        regions, unknown = parse_regions(route)
+        if unknown:
+            raise RowError(f"route_regions: неизвестные регионы {', '.join(unknown)}")
+    return (
+        user_id, city, region, date_from, date_to, weight, body_type,
+        direction, ", ".join(regions), _comment(row), created_at,
+    )
+
+
+# Row parser and :mod:`db` function inserting a chunk of parsed rows
+_IMPORTERS: dict[str, tuple[Callable[..., tuple], str]] = {
+    "cargo": (parse_cargo, "add_cargo_many"),
+    "trucks": (parse_truck, "add_trucks_many"),
+}
+
+
+def import_listings(
+    kind: str,
+    lines: Iterable[str],
+    owner_telegram_id: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> ImportReport:
+    """Import ``kind`` ("cargo" or "trucks") listings from CSV ``lines``.
+
+    Rows without ``owner_telegram_id`` belong to ``owner_telegram_id``.
+    """
+    parse, insert_many = _IMPORTERS[kind]
+    created_at = datetime.now().isoformat()
+    report = ImportReport()
+    owners: dict[int, int | None] = {}
+    chunk: list[tuple[int, tuple]] = []
+
+    def owner_id(row: dict[str, str]) -> int:
+        value = row.get("owner_telegram_id") or owner_telegram_id
+        try:
+            telegram_id = int(value)
+        except (TypeError, ValueError):
+            raise RowError(f"owner_telegram_id: «{value or ''}» — нужен Telegram ID") from None
+        if telegram_id not in owners:
+            owners[telegram_id] = db.get_user_id(telegram_id)
+        if owners[telegram_id] is None:
+            raise RowError(f"владелец {telegram_id} не зарегистрирован в боте")
+        return owners[telegram_id]
+
+    def insert(rows: list[tuple]) -> list[int]:
+        return async_db.write_and_wait(insert_many, rows)
+
+    def flush() -> None:
+        try:
+            report.imported += len(insert([args for _, args in chunk]))
+        except sqlite3.IntegrityError:
+            # Find the offending rows one by one
+            for line, args in chunk:
+                try:
+                    report.imported += len(insert([args]))
+                except sqlite3.IntegrityError as e:
+                    report.errors.append((line, f"отклонено базой: {e}"))
+        chunk.clear()
+
+    for line, row in read_rows(lines):
+        try:
+            chunk.append((line, parse(row, owner_id(row), created_at)))
+        except RowError as e:
+            report.errors.append((line, str(e)))
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return report
+
+
+def import_file(
+    kind: str, path: str, owner_telegram_id: int | None = None
+) -> ImportReport:
+    """Import listings from the CSV file at ``path`` (see :func:`import_listings`)."""
+    with open(path, encoding=detect_encoding(path), newline="") as f:
+        return import_listings(kind, f, owner_telegram_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("path", help="CSV file")
+    parser.add_argument("--owner", type=int,
+                        help="Telegram ID of the user owning rows without owner_telegram_id")
+    parser.add_argument("--errors", help="write rejected rows to this CSV file")
+    args = parser.parse_args()
+
+    db.init_db()
+    started = datetime.now()
+    try:
+        report = import_file(args.kind, args.path, args.owner)
+    finally:
+        async_db.shutdown()
+    seconds = (datetime.now() - started).total_seconds()
+    print(f"Imported {report.imported} rows in {seconds:.1f} s, rejected {report.failed}")
+    for line, message in report.errors[:20]:
+        print(f"  line {line}: {message}")
+    if args.errors and report.errors:
+        report.write_errors(args.errors)
+        print(f"All rejected rows: {args.errors}")
+
+
+if __name__ == "__main__":
+    main()
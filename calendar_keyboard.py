@@ -1,18 +1,31 @@
 """Inline calendar keyboard helpers."""
 
 import calendar
-from datetime import datetime
+from datetime import MAXYEAR, MINYEAR, datetime
+from functools import lru_cache
 
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 
-from db import (
-    get_connection,
+from config import Config
+
+from async_db import (
     update_cargo_dates,
     update_truck_dates,
 )
-from handlers.common import get_main_menu, show_search_results
-from utils import get_current_user_id, log_user_action
+from conversation import (
+    NO_DATE,
+    CargoDraft,
+    CargoEdit,
+    CargoSearch,
+    Flow,
+    TruckDraft,
+    TruckEdit,
+    TruckSearch,
+)
+import message_cleanup
+from handlers.common import get_main_menu, show_card, start_search
+from utils import log_user_action
 
 MONTHS_RU = [
     "",
@@ -32,19 +45,45 @@ MONTHS_RU = [
 
 DAYS_RU = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
 
+# Buttons identical in every month are created once
+_WEEKDAY_ROW = [types.InlineKeyboardButton(text=d, callback_data="ignore") for d in DAYS_RU]
+_EMPTY_DAY = types.InlineKeyboardButton(text=" ", callback_data="ignore")
+_SKIP_ROW = [types.InlineKeyboardButton(text="Нет", callback_data="cal:skip")]
+
+
+def current_month() -> tuple[int, int]:
+    """Return ``(year, month)`` of today."""
+    now = datetime.now()
+    return now.year, now.month
+
+
+@lru_cache(maxsize=Config.CALENDAR_CACHE_SIZE)
+def _month_grid(year: int, month: int) -> tuple[tuple[int, ...], ...]:
+    """Weeks of the month as produced by :func:`calendar.monthcalendar`."""
+    return tuple(tuple(week) for week in calendar.monthcalendar(year, month))
+
 
 def generate_calendar(
     year: int | None = None,
     month: int | None = None,
     include_skip: bool = False,
 ) -> types.InlineKeyboardMarkup:
-    """Return an inline calendar for the given month."""
+    """Return an inline calendar for the given month (current by default).
+
+    Markups are cached per ``(year, month, include_skip)`` and shared between
+    calls, so they must not be modified.
+    """
+    if not year or not month:
+        now_year, now_month = current_month()
+        year = year or now_year
+        month = month or now_month
+    return _build_calendar(year, month, include_skip)
 
-    now = datetime.now()
-    year = year or now.year
-    month = month or now.month
-    cal = calendar.monthcalendar(year, month)
 
+@lru_cache(maxsize=Config.CALENDAR_CACHE_SIZE)
+def _build_calendar(
+    year: int, month: int, include_skip: bool
+) -> types.InlineKeyboardMarkup:
     rows: list[list[types.InlineKeyboardButton]] = []
 
     # Navigation row: prev year/month and next year/month
@@ -74,16 +113,14 @@ def generate_calendar(
     )
 
     # Days of week row
-    rows.append(
-        [types.InlineKeyboardButton(text=d, callback_data="ignore") for d in DAYS_RU]
-    )
+    rows.append(_WEEKDAY_ROW)
 
     # Weeks with day numbers
-    for week in cal:
+    for week in _month_grid(year, month):
         row = []
         for day in week:
             if day == 0:
-                row.append(types.InlineKeyboardButton(text=" ", callback_data="ignore"))
+                row.append(_EMPTY_DAY)
             else:
                 date_str = f"{year}-{month:02d}-{day:02d}"
                 row.append(
@@ -92,19 +129,39 @@ def generate_calendar(
         rows.append(row)
 
     if include_skip:
-        rows.append([types.InlineKeyboardButton(text="Нет", callback_data="cal:skip")])
+        rows.append(_SKIP_ROW)
 
     return types.InlineKeyboardMarkup(inline_keyboard=rows)
 
 
-async def handle_calendar_callback(callback: types.CallbackQuery, state: FSMContext) -> None:
+def calendar_cache_stats() -> dict[str, int]:
+    """Return hit/miss counters and size of the calendar markup cache."""
+    info = _build_calendar.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+    }
+
+
+async def handle_calendar_callback(
+    callback: types.CallbackQuery, state: FSMContext, user_id: int | None = None
+) -> None:
     """Handle inline calendar selection for all scenarios."""
     data_str = callback.data
 
     # Handle calendar navigation buttons
     if data_str.startswith("cal:prev_") or data_str.startswith("cal:next_"):
-        _, action, ym = data_str.split(":", 2)
-        year, month = map(int, ym.split("-"))
+        # callback_data приходит от клиента: месяц вне календаря игнорируем
+        try:
+            _, action, ym = data_str.split(":", 2)
+            year, month = map(int, ym.split("-"))
+        except ValueError:
+            month = 0
+        if not 1 <= month <= 12:
+            await callback.answer()
+            return
 
         if action == "prev_m":
             month -= 1
@@ -120,266 +177,159 @@ async def handle_calendar_callback(callback: types.CallbackQuery, state: FSMCont
             year -= 1
         elif action == "next_y":
             year += 1
+        if not MINYEAR <= year <= MAXYEAR:
+            await callback.answer()
+            return
 
-        data = await state.get_data()
-        include_skip = data.get("calendar_include_skip", False)
-        markup = generate_calendar(year, month, include_skip=include_skip)
+        flow = await Flow.load(state)
+        markup = generate_calendar(year, month, include_skip=flow.calendar_include_skip)
         await callback.message.edit_reply_markup(reply_markup=markup)
         await callback.answer()
         return
 
-    value = "нет" if data_str == "cal:skip" else data_str.split(":", 1)[1]
-    current_state = await state.get_state()
-
-    await callback.message.delete()
-
-    if current_state == "CargoAddStates:date_from":
-        await state.update_data(date_from=value)
-        bot = await callback.message.answer(
-            "Дата прибытия:", reply_markup=generate_calendar()
-        )
-        await state.update_data(
-            last_bot_message_id=bot.message_id,
-            calendar_field="date_to",
-            calendar_include_skip=False,
-        )
-        await state.set_state("CargoAddStates:date_to")
-        await callback.answer()
-        return
-
-    if current_state == "CargoAddStates:date_to":
-        data = await state.get_data()
-        df = data.get("date_from")
-        dt_from = datetime.strptime(df, "%Y-%m-%d") if df else None
-        dt_to = datetime.strptime(value, "%Y-%m-%d")
-        if dt_from and dt_to < dt_from:
-            await callback.answer("Неверная дата", show_alert=True)
-            return
-        await state.update_data(date_to=value, calendar_field=None)
-        bot = await callback.message.answer("Вес (в тоннах, цифрой):")
-        await state.update_data(last_bot_message_id=bot.message_id)
-        await state.set_state("CargoAddStates:weight")
-        await callback.answer()
-        return
-
-    if current_state == "CargoSearchStates:date_from":
-        key = "нет" if callback.data == "cal:skip" else value
-        await state.update_data(filter_date_from=key)
-        bot = await callback.message.answer(
-            "Максимальная дата отправления:",
-            reply_markup=generate_calendar(include_skip=True),
-        )
-        await state.update_data(
-            last_bot_message_id=bot.message_id,
-            calendar_field="filter_date_to",
-            calendar_include_skip=True,
-        )
-        await state.set_state("CargoSearchStates:date_to")
+    value = NO_DATE if data_str == "cal:skip" else data_str.split(":", 1)[1]
+    flow = await Flow.load(state)
+    # Принимаем только дату календаря и «Нет» там, где календарь её показывает
+    if value == NO_DATE:
+        valid = flow.calendar_include_skip
+    else:
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+            valid = True
+        except ValueError:
+            valid = False
+    if not valid:
         await callback.answer()
         return
+    current_state = await state.get_state()
+    # Сообщение с календарём — карточка сценария: следующий вопрос
+    # показывается в нём же (см. handlers.common.show_card)
+    card = callback.message
 
-    if current_state == "CargoSearchStates:date_to":
-        key = "нет" if callback.data == "cal:skip" else value
-        await state.update_data(filter_date_to=key, calendar_field=None)
-
-        data = await state.get_data()
-        user_id = await get_current_user_id(callback.message)
-        fc_from = data.get("filter_city_from", "")
-        fc_to = data.get("filter_city_to", "")
-        fd_from = data.get("filter_date_from", "")
-        fd_to = data.get("filter_date_to", "")
-
-        query = """
-        SELECT c.id, u.name, c.city_from, c.region_from, c.city_to, c.region_to, c.date_from, c.weight, c.body_type
-        FROM cargo c
-        JOIN users u ON c.user_id = u.id
-        WHERE 1=1
-        """
-        params = []
-        if fc_from != "все":
-            query += " AND lower(c.city_from) = ?"
-            params.append(fc_from)
-        if fc_to != "все":
-            query += " AND lower(c.city_to) = ?"
-            params.append(fc_to)
-        if fd_from != "нет":
-            query += " AND date(c.date_from) >= date(?)"
-            params.append(fd_from)
-        if fd_to != "нет":
-            query += " AND date(c.date_from) <= date(?)"
-            params.append(fd_to)
-
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, tuple(params))
-        rows = cursor.fetchall()
-        conn.close()
-
-        prev_bot = data.get("last_bot_message_id")
-        if prev_bot:
-            try:
-                await callback.message.chat.delete_message(prev_bot)
-            except Exception:
-                pass
-
-        if not rows:
-            await callback.message.answer("📬 По вашему запросу ничего не найдено.", reply_markup=get_main_menu())
-        else:
-            await show_search_results(callback.message, rows)
-
-        log_user_action(user_id, "cargo_search", f"results={len(rows)}")
-        await state.clear()
-        await callback.answer()
-        return
+    def drop_card() -> None:
+        message_cleanup.get_cleaner(card.bot).delete(card.chat.id, card.message_id)
 
-    if current_state == "TruckAddStates:date_from":
-        await state.update_data(date_from=value)
-        bot = await callback.message.answer(
-            "Дата доступности (по):", reply_markup=generate_calendar()
-        )
-        await state.update_data(
-            last_bot_message_id=bot.message_id,
-            calendar_field="date_to",
-            calendar_include_skip=False,
-        )
-        await state.set_state("TruckAddStates:date_to")
+    if current_state in ("CargoAddStates:date_from", "TruckAddStates:date_from"):
+        draft_cls, next_text, next_state = {
+            "CargoAddStates:date_from": (
+                CargoDraft, "Дата прибытия:", "CargoAddStates:date_to"
+            ),
+            "TruckAddStates:date_from": (
+                TruckDraft, "Дата доступности (по):", "TruckAddStates:date_to"
+            ),
+        }[current_state]
+        draft = await draft_cls.load(state)
+        draft.date_from = value
+        draft.last_bot_message_id = card.message_id
+        await show_card(card, draft, next_text, generate_calendar())
+        draft.use_calendar("date_to")
+        await draft.save(state)
+        await state.set_state(next_state)
         await callback.answer()
         return
 
-    if current_state == "TruckAddStates:date_to":
-        data = await state.get_data()
-        df = data.get("date_from")
-        dt_from = datetime.strptime(df, "%Y-%m-%d") if df else None
+    if current_state in ("CargoAddStates:date_to", "TruckAddStates:date_to"):
+        draft_cls, next_text, next_state = {
+            "CargoAddStates:date_to": (
+                CargoDraft, "Вес (в тоннах, цифрой):", "CargoAddStates:weight"
+            ),
+            "TruckAddStates:date_to": (
+                TruckDraft, "Грузоподъёмность (в тоннах):", "TruckAddStates:weight"
+            ),
+        }[current_state]
+        draft = await draft_cls.load(state)
+        dt_from = datetime.strptime(draft.date_from, "%Y-%m-%d") if draft.date_from else None
         dt_to = datetime.strptime(value, "%Y-%m-%d")
         if dt_from and dt_to < dt_from:
             await callback.answer("Неверная дата", show_alert=True)
             return
-        await state.update_data(date_to=value, calendar_field=None)
-        bot = await callback.message.answer("Грузоподъёмность (в тоннах):")
-        await state.update_data(last_bot_message_id=bot.message_id)
-        await state.set_state("TruckAddStates:weight")
+        draft.date_to = value
+        draft.last_bot_message_id = card.message_id
+        await show_card(card, draft, next_text)
+        draft.use_calendar(None)
+        await draft.save(state)
+        await state.set_state(next_state)
         await callback.answer()
         return
 
-    if current_state == "TruckSearchStates:date_from":
-        key = "нет" if callback.data == "cal:skip" else value
-        await state.update_data(filter_date_from=key)
-        bot = await callback.message.answer(
-            "Максимальная дата начала:",
-            reply_markup=generate_calendar(include_skip=True),
-        )
-        await state.update_data(
-            last_bot_message_id=bot.message_id,
-            calendar_field="filter_date_to",
-            calendar_include_skip=True,
-        )
-        await state.set_state("TruckSearchStates:date_to")
+    if current_state in ("CargoSearchStates:date_from", "TruckSearchStates:date_from"):
+        search_cls, next_text, next_state = {
+            "CargoSearchStates:date_from": (
+                CargoSearch, "Максимальная дата отправления:", "CargoSearchStates:date_to"
+            ),
+            "TruckSearchStates:date_from": (
+                TruckSearch, "Максимальная дата начала:", "TruckSearchStates:date_to"
+            ),
+        }[current_state]
+        search = await search_cls.load(state)
+        search.filter_date_from = value
+        search.last_bot_message_id = card.message_id
+        await show_card(card, search, next_text, generate_calendar(include_skip=True))
+        search.use_calendar("filter_date_to", include_skip=True)
+        await search.save(state)
+        await state.set_state(next_state)
         await callback.answer()
         return
 
-    if current_state == "TruckSearchStates:date_to":
-        key = "нет" if callback.data == "cal:skip" else value
-        await state.update_data(filter_date_to=key, calendar_field=None)
-
-        data = await state.get_data()
-        user_id = await get_current_user_id(callback.message)
-        fc = data.get("filter_city", "")
-        fd_from = data.get("filter_date_from", "")
-        fd_to = data.get("filter_date_to", "")
-
-        query = """
-        SELECT t.id, u.name, t.city, t.region, t.date_from, t.weight, t.body_type, t.direction
-        FROM trucks t
-        JOIN users u ON t.user_id = u.id
-        WHERE 1=1
-        """
-        params = []
-        if fc != "все":
-            query += " AND lower(t.city) = ?"
-            params.append(fc)
-        if fd_from != "нет":
-            query += " AND date(t.date_from) >= date(?)"
-            params.append(fd_from)
-        if fd_to != "нет":
-            query += " AND date(t.date_from) <= date(?)"
-            params.append(fd_to)
-
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, tuple(params))
-        rows = cursor.fetchall()
-        conn.close()
-
-        prev_bot = data.get("last_bot_message_id")
-        if prev_bot:
-            try:
-                await callback.message.chat.delete_message(prev_bot)
-            except Exception:
-                pass
-
-        if not rows:
-            await callback.message.answer("📬 По вашему запросу ТС не найдено.", reply_markup=get_main_menu())
-        else:
-            await show_search_results(callback.message, rows)
-
-        log_user_action(user_id, "truck_search", f"results={len(rows)}")
-        await state.clear()
+    if current_state in ("CargoSearchStates:date_to", "TruckSearchStates:date_to"):
+        kind, search_cls, empty_text = {
+            "CargoSearchStates:date_to": (
+                "cargo", CargoSearch, "📬 По вашему запросу ничего не найдено."
+            ),
+            "TruckSearchStates:date_to": (
+                "truck", TruckSearch, "📬 По вашему запросу ТС не найдено."
+            ),
+        }[current_state]
+        search = await search_cls.load(state)
+        search.filter_date_to = value
+
+        shown = await start_search(card, state, kind, search.filters(), empty_text)
+        drop_card()
+        log_user_action(user_id, f"{kind}_search", f"results={shown}")
         await callback.answer()
         return
 
-    if current_state == "CargoEditStates:date_from":
-        await state.update_data(new_date_from=value, calendar_field="date_to")
-        bot = await callback.message.answer(
-            "Новая дата прибытия:", reply_markup=generate_calendar()
-        )
-        await state.update_data(last_bot_message_id=bot.message_id)
-        await state.set_state("CargoEditStates:date_to")
+    if current_state in ("CargoEditStates:date_from", "TruckEditStates:date_from"):
+        edit_cls, next_text, next_state = {
+            "CargoEditStates:date_from": (
+                CargoEdit, "Новая дата прибытия:", "CargoEditStates:date_to"
+            ),
+            "TruckEditStates:date_from": (
+                TruckEdit, "Новая дата окончания:", "TruckEditStates:date_to"
+            ),
+        }[current_state]
+        edit = await edit_cls.load(state)
+        edit.new_date_from = value
+        edit.last_bot_message_id = card.message_id
+        await show_card(card, edit, next_text, generate_calendar())
+        edit.use_calendar("date_to")
+        await edit.save(state)
+        await state.set_state(next_state)
         await callback.answer()
         return
 
     if current_state == "CargoEditStates:date_to":
-        data = await state.get_data()
-        cid = data.get("edit_cargo_id")
-        df = data.get("new_date_from")
-        if cid and df:
-            update_cargo_dates(cid, df, value)
-        await callback.message.answer("Даты обновлены.", reply_markup=get_main_menu())
+        edit = await CargoEdit.load(state)
+        if edit.edit_cargo_id and edit.new_date_from:
+            await update_cargo_dates(edit.edit_cargo_id, edit.new_date_from, value)
+        await card.answer("Даты обновлены.", reply_markup=get_main_menu())
+        drop_card()
         await state.clear()
         await callback.answer()
         return
 
-    if current_state == "TruckEditStates:date_from":
-        await state.update_data(new_date_from=value, calendar_field="date_to")
-        bot = await callback.message.answer(
-            "Новая дата окончания:", reply_markup=generate_calendar()
-        )
-        await state.update_data(last_bot_message_id=bot.message_id)
-        await state.set_state("TruckEditStates:date_to")
-        await callback.answer()
-        return
-
     if current_state == "TruckEditStates:date_to":
-        data = await state.get_data()
-        tid = data.get("edit_truck_id")
-        df = data.get("new_date_from")
-        if tid and df:
-            update_truck_dates(tid, df, value)
-        await callback.message.answer("Даты обновлены.", reply_markup=get_main_menu())
+        edit = await TruckEdit.load(state)
+        if edit.edit_truck_id and edit.new_date_from:
+            await update_truck_dates(edit.edit_truck_id, edit.new_date_from, value)
+        await card.answer("Даты обновлены.", reply_markup=get_main_menu())
+        drop_card()
         await state.clear()
         await callback.answer()
         return
 
-    # Generic fallback for other cases
-    data = await state.get_data()
-    field = data.get("calendar_field")
-    next_state = data.get("calendar_next_state")
-    next_text = data.get("calendar_next_text")
-    next_markup = data.get("calendar_next_markup")
-
-    if field:
-        await state.update_data(**{field: value})
-
-    bot = await callback.message.answer(next_text, reply_markup=next_markup)
-    await state.update_data(last_bot_message_id=bot.message_id)
-    await state.set_state(next_state)
+    # Calendar in a state without its own branch: just remember the date
+    drop_card()
+    if flow.calendar_field:
+        await state.update_data(**{flow.calendar_field: value})
     await callback.answer()
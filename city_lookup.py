@@ -0,0 +1,165 @@
+"""Type-ahead lookup of cities and regions from :mod:`locations`.
+
+Instead of sending a keyboard with every city of a region, the add flows let
+the user type the first letters and answer with a handful of suggestions.
+Names are kept in prefix tries (one per region plus a global one) whose nodes
+remember their first completions, so a prefix lookup costs one step per typed
+character.  When nothing starts with the typed text, a typo-tolerant scan of
+the same names is used instead.
+"""
+
+from __future__ import annotations
+
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+from locations import get_index, get_regions
+
+# Number of suggestions shown to the user
+SUGGESTIONS_LIMIT = 8
+
+# Minimal similarity for typo-tolerant matches
+_FUZZY_CUTOFF = 0.7
+
+
+def _fold(text: str) -> str:
+    return " ".join(text.casefold().replace("ё", "е").split())
+
+
+class PrefixTrie:
+    """Prefix tree mapping folded keys to values.
+
+    Every node stores up to ``keep`` values of the keys passing through it in
+    insertion order, so inserting keys in the desired ranking order makes
+    :meth:`search` a walk down ``len(prefix)`` nodes.
+    """
+
+    __slots__ = ("keep", "_root")
+
+    def __init__(self, keep: int = SUGGESTIONS_LIMIT) -> None:
+        self.keep = keep
+        self._root: tuple[dict, list] = ({}, [])
+
+    def insert(self, key: str, value: str) -> None:
+        node = self._root
+        self._remember(node, value)
+        for char in key:
+            node = node[0].setdefault(char, ({}, []))
+            self._remember(node, value)
+
+    def _remember(self, node: tuple[dict, list], value: str) -> None:
+        top = node[1]
+        if len(top) < self.keep and value not in top:
+            top.append(value)
+
+    def search(self, prefix: str, limit: int = SUGGESTIONS_LIMIT) -> list[str]:
+        node = self._root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return node[1][:limit]
+
+
+def _build_trie(names: tuple[str, ...]) -> PrefixTrie:
+    trie = PrefixTrie()
+    # Whole names rank before matches on a later word ("Нижний Новгород"
+    # is also found by "новг")
+    for name in names:
+        trie.insert(_fold(name), name)
+    for name in names:
+        for word in _fold(name).split(" ")[1:]:
+            trie.insert(word, name)
+    return trie
+
+
+@lru_cache(maxsize=None)
+def _city_trie(region: str | None) -> PrefixTrie:
+    return _build_trie(_city_names(region))
+
+
+@lru_cache(maxsize=None)
+def _city_names(region: str | None) -> tuple[str, ...]:
+    index = get_index()
+    if region is None:
+        return tuple(sorted(set(index.cities)))
+    if region not in index.regions:
+        return ()
+    i = index.regions.index(region)
+    return index.cities[index.offsets[i]:index.offsets[i + 1]]
+
+
+@lru_cache(maxsize=1)
+def _region_trie() -> PrefixTrie:
+    return _build_trie(get_regions())
+
+
+@lru_cache(maxsize=1)
+def _city_regions() -> dict[str, tuple[str, ...]]:
+    index = get_index()
+    found: dict[str, list[str]] = {}
+    for city, region_id in zip(index.cities, index.city_region):
+        found.setdefault(_fold(city), []).append(index.regions[region_id])
+    return {city: tuple(regions) for city, regions in found.items()}
+
+
+def _fuzzy(query: str, names: tuple[str, ...], limit: int) -> list[str]:
+    """Return ``names`` whose beginning resembles ``query``, best first."""
+    # SequenceMatcher caches analysis of its second sequence
+    matcher = SequenceMatcher(None, "", query)
+    scored = []
+    for name in names:
+        matcher.set_seq1(_fold(name)[: len(query) + 1])
+        if (
+            matcher.real_quick_ratio() >= _FUZZY_CUTOFF
+            and matcher.quick_ratio() >= _FUZZY_CUTOFF
+        ):
+            ratio = matcher.ratio()
+            if ratio >= _FUZZY_CUTOFF:
+                scored.append((-ratio, name))
+    scored.sort()
+    return [name for _, name in scored[:limit]]
+
+
+def suggest_cities(
+    query: str, region: str | None = None, limit: int = SUGGESTIONS_LIMIT
+) -> list[str]:
+    """Return up to ``limit`` city names starting with or resembling ``query``.
+
+    Only cities of ``region`` are considered when it is given.
+    """
+    key = _fold(query)
+    if not key:
+        return []
+    found = _city_trie(region).search(key, limit)
+    if found:
+        return found
+    return _fuzzy(key, _city_names(region), limit)
+
+
+def suggest_regions(query: str, limit: int = SUGGESTIONS_LIMIT) -> list[str]:
+    """Return up to ``limit`` region names starting with or resembling ``query``."""
+    key = _fold(query)
+    if not key:
+        return []
+    return _region_trie().search(key, limit) or _fuzzy(key, get_regions(), limit)
+
+
+def regions_of_city(city: str) -> tuple[str, ...]:
+    """Return every region that has a city named ``city`` (case-insensitive)."""
+    return _city_regions().get(_fold(city), ())
+
+
+def resolve_city(query: str, region: str) -> tuple[str | None, list[str]]:
+    """Match user input against the cities of ``region``.
+
+    Returns ``(city, suggestions)``: ``city`` is the canonical name when the
+    input names exactly one city (ignoring case and "ё"), otherwise ``None``
+    and ``suggestions`` lists candidates to offer.
+    """
+    key = _fold(query)
+    suggestions = suggest_cities(query, region)
+    exact = [name for name in suggestions if _fold(name) == key]
+    if len(exact) == 1:
+        return exact[0], []
+    return None, suggestions
@@ -13,6 +13,97 @@ class Config:
     # Database file path relative to this file
     DB_PATH = os.path.join(os.path.dirname(__file__), "bot_database.sqlite3")
 
+    # Maximum number of pooled SQLite connections kept open per database file
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+    # Seconds to wait for a free pooled connection before giving up
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+    # Idle connections older than this many seconds are pinged before reuse
+    DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "60"))
+
+    # SQLite tuning applied by db.init_db and to every pooled connection
+    DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+    DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+    DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+    # Negative values are KiB, positive values are pages (SQLite semantics)
+    DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-20000"))
+    DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+    # Maximum number of queued writes committed together in one transaction
+    DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))
+
+    # Worker threads that run database calls off the event loop
+    DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+
+    # Cached telegram_id -> user_id lookups: capacity and lifetime in seconds
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "600"))
+
+    # Separate SQLite file keeping unfinished conversations (FSM state)
+    FSM_DB_PATH = os.getenv(
+        "FSM_DB_PATH", os.path.join(os.path.dirname(__file__), "fsm_storage.sqlite3")
+    )
+    # Seconds between writes of changed conversations to FSM_DB_PATH
+    FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))
+    # Conversations unchanged for this many seconds are dropped as abandoned
+    FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", str(7 * 24 * 3600)))
+    # Seconds an unused conversation is kept in memory after being saved
+    FSM_CACHE_IDLE = float(os.getenv("FSM_CACHE_IDLE", "900"))
+
+    # Days ahead of today covered by the cargo/truck matching index
+    MATCH_HORIZON_DAYS = int(os.getenv("MATCH_HORIZON_DAYS", "180"))
+
+    # Number of rendered calendar months kept in memory
+    CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "256"))
+
+    # Outgoing Bot API requests (see outbound.py): messages per second per
+    # process, seconds between bulk messages to one chat and repeats of a
+    # request after RetryAfter
+    TELEGRAM_RATE = float(os.getenv("TELEGRAM_RATE", "30"))
+    TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1"))
+    TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+
+    # Admin broadcasts: messages per second in total, messages in flight,
+    # users read per batch (progress is saved after each batch), seconds
+    # between messages to one chat and delivery attempts per user
+    BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+    BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+    BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "100"))
+    BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", "1"))
+    BROADCAST_MAX_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", "5"))
+
+    # Seconds queued message deletions are collected before one
+    # deleteMessages request per chat (see message_cleanup.py)
+    MESSAGE_CLEANUP_DELAY = float(os.getenv("MESSAGE_CLEANUP_DELAY", "0.1"))
+
+    # Local HTTP endpoint serving Prometheus metrics at /metrics.  Off unless
+    # METRICS_PORT is set; supervisor.py workers also take the next BOT_WORKERS
+    # ports after it
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+    # How updates are received: "polling" (default) or "webhook"
+    BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+    # Webhook mode: public HTTPS base URL registered with Telegram (leave
+    # empty when the webhook is set elsewhere), path, secret token checked
+    # on every request, listening address and seconds given to in-flight
+    # updates at shutdown
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "10"))
+
+    # Worker processes started by supervisor.py (updates are sharded by chat)
+    BOT_WORKERS = int(os.getenv("BOT_WORKERS", str(os.cpu_count() or 1)))
+
+    # Seconds between prunings of the shared change log (see housekeeping.py)
+    # and the number of newest entries kept
+    CHANGE_LOG_PRUNE_INTERVAL = float(os.getenv("CHANGE_LOG_PRUNE_INTERVAL", "600"))
+    CHANGE_LOG_KEEP = int(os.getenv("CHANGE_LOG_KEEP", "100000"))
+
     # Maximum weight allowed for cargo/truck entries (tons)
     MAX_WEIGHT = 1000
 
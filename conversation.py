@@ -0,0 +1,168 @@
+"""Typed FSM data of the cargo and truck conversations.
+
+Each wizard keeps its answers in FSM data.  The classes here list those
+fields per flow as slotted dataclasses holding only primitive values, so the
+data stays small in ``MemoryStorage`` and cheap to serialise for
+:class:`fsm_storage.SQLiteStorage`; keyboards and ``State`` objects are never
+stored.  A handler step reads its flow once with :meth:`Flow.load`, changes
+attributes and writes them back once with :meth:`Flow.save` (usually through
+:func:`handlers.common.ask_and_store`).
+
+Field names are the flat keys of the FSM data, so ``state.get_data()`` still
+returns e.g. ``{"weight": 5, ...}``.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Any, Mapping, TypeVar
+
+F = TypeVar("F", bound="Flow")
+
+# Answers meaning "no filter" in the search flows
+ANY_CITY = "все"
+NO_DATE = "нет"
+
+
+@lru_cache(maxsize=None)
+def _field_names(cls: type) -> tuple[str, ...]:
+    return tuple(f.name for f in fields(cls))
+
+
+@dataclass(slots=True)
+class Flow:
+    """Fields shared by all flows."""
+
+    # Question the bot asked last; deleted when the next one is sent
+    last_bot_message_id: int | None = None
+    # Field filled by a date picked in the inline calendar
+    calendar_field: str | None = None
+    # Whether the calendar shows the «Нет» (no date) button
+    calendar_include_skip: bool = False
+
+    @classmethod
+    def from_data(cls: type[F], data: Mapping[str, Any]) -> F:
+        """Build the flow from FSM ``data``, ignoring keys of other flows."""
+        return cls(**{name: data[name] for name in _field_names(cls) if name in data})
+
+    def to_data(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in _field_names(type(self))}
+
+    @classmethod
+    async def load(cls: type[F], state) -> F:
+        """Read the flow from ``FSMContext`` ``state``."""
+        return cls.from_data(await state.get_data())
+
+    async def save(self, state) -> None:
+        """Write every field of the flow to ``state`` in one update."""
+        await state.update_data(**self.to_data())
+
+    def use_calendar(self, field: str | None, include_skip: bool = False) -> None:
+        """Remember which field a date picked in the calendar belongs to."""
+        self.calendar_field = field
+        self.calendar_include_skip = include_skip
+
+
+@dataclass(slots=True)
+class CargoDraft(Flow):
+    """Answers of the «➕ Добавить груз» wizard."""
+
+    region_from: str | None = None
+    city_from: str | None = None
+    region_to: str | None = None
+    city_to: str | None = None
+    date_from: str | None = None
+    date_to: str | None = None
+    weight: int | None = None
+    body_type: str | None = None
+    is_local: int | None = None
+
+    def is_complete(self) -> bool:
+        return None not in (
+            self.region_from, self.city_from, self.region_to, self.city_to,
+            self.date_from, self.date_to, self.weight, self.body_type,
+            self.is_local,
+        )
+
+
+@dataclass(slots=True)
+class TruckDraft(Flow):
+    """Answers of the «➕ Добавить ТС» wizard."""
+
+    region: str | None = None
+    city: str | None = None
+    date_from: str | None = None
+    date_to: str | None = None
+    weight: int | None = None
+    body_type: str | None = None
+    direction: str | None = None
+    route_regions: str | None = None
+
+    def is_complete(self) -> bool:
+        return None not in (
+            self.region, self.city, self.date_from, self.date_to,
+            self.weight, self.body_type, self.direction, self.route_regions,
+        )
+
+
+def _filter(value: str | None, any_value: str) -> str | None:
+    return None if not value or value == any_value else value
+
+
+@dataclass(slots=True)
+class CargoSearch(Flow):
+    """Filters of the «🔍 Найти груз» wizard ("все"/"нет" mean no filter)."""
+
+    filter_city_from: str | None = None
+    filter_city_to: str | None = None
+    filter_date_from: str | None = None
+    filter_date_to: str | None = None
+
+    def filters(self) -> dict[str, str | None]:
+        """Keyword arguments for :func:`db.search_cargo`."""
+        return {
+            "city_from": _filter(self.filter_city_from, ANY_CITY),
+            "city_to": _filter(self.filter_city_to, ANY_CITY),
+            "date_from": _filter(self.filter_date_from, NO_DATE),
+            "date_to": _filter(self.filter_date_to, NO_DATE),
+        }
+
+
+@dataclass(slots=True)
+class TruckSearch(Flow):
+    """Filters of the «🔍 Найти ТС» wizard ("все"/"нет" mean no filter)."""
+
+    filter_city: str | None = None
+    filter_route_region: str | None = None
+    filter_date_from: str | None = None
+    filter_date_to: str | None = None
+
+    def filters(self) -> dict[str, str | None]:
+        """Keyword arguments for :func:`db.search_trucks`."""
+        return {
+            "city": _filter(self.filter_city, ANY_CITY),
+            "date_from": _filter(self.filter_date_from, NO_DATE),
+            "date_to": _filter(self.filter_date_to, NO_DATE),
+            "route_region": self.filter_route_region,
+        }
+
+
+@dataclass(slots=True)
+class CargoEdit(Flow):
+    """Cargo being edited and its new values."""
+
+    edit_cargo_id: int | None = None
+    new_region_from: str | None = None
+    new_city_from: str | None = None
+    new_region_to: str | None = None
+    new_date_from: str | None = None
+
+
+@dataclass(slots=True)
+class TruckEdit(Flow):
+    """Truck being edited and its new values."""
+
+    edit_truck_id: int | None = None
+    new_region: str | None = None
+    new_date_from: str | None = None
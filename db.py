@@ -1,23 +1,176 @@
 """SQLite database helpers used by the bot."""
 
+import logging
 import sqlite3
+import threading
+from contextlib import AbstractContextManager
+from datetime import datetime, timezone
+from typing import Callable, Iterator
 
 from config import Config
+from db_pool import get_pool
+from locations import parse_regions
 
 # Database file path can be overridden in tests via monkeypatching
 DB_PATH = Config.DB_PATH
 # Always use path relative to this file so running the bot from any working
 # directory works correctly. Path is now defined in Config.
 
-def get_connection():
-    """Return a new SQLite connection using :data:`DB_PATH`."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Accepted spellings of dates written to the database; everything is stored
+# as ISO ``YYYY-MM-DD`` so plain string comparison orders and filters dates.
+_DATE_INPUT_FORMATS = ("%Y-%m-%d", Config.DATE_FORMAT)
+_ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+
+def normalize_city(city: str | None) -> str | None:
+    """Return the search key stored alongside ``city`` (trimmed, casefolded).
+
+    SQLite's ``lower()`` only folds ASCII, so Cyrillic city names must be
+    normalised in Python before they are written and before they are queried.
+    """
+    if city is None:
+        return None
+    return city.strip().casefold()
+
+
+def normalize_date(value: str | None) -> str | None:
+    """Return ``value`` as ISO ``YYYY-MM-DD`` if it can be parsed.
+
+    ISO timestamps are truncated to their date part.  Unparseable values are
+    returned unchanged so that no data is lost.
+    """
+    if not value:
+        return value
+    text = value.strip().split("T")[0].split(" ")[0]
+    for fmt in _DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return value
+
+
+def get_connection(write: bool = False) -> AbstractContextManager[sqlite3.Connection]:
+    """Borrow a pooled connection to :data:`DB_PATH`.
+
+    Must be used as a context manager: the transaction is committed when the
+    block exits and the connection is returned to the pool instead of being
+    closed.  Nested blocks on the same thread share the outer transaction
+    (see :meth:`db_pool.ConnectionPool.connection`), so helpers never call
+    ``commit`` themselves.  Helpers that modify data pass ``write=True`` so
+    the transaction takes the write lock when it begins (see
+    :meth:`db_pool.ConnectionPool.connection`).
+    """
+    return get_pool(DB_PATH).connection(immediate=write)
+
+
+# Callables ``func(table, row_id)`` told about committed data changes
+_change_listeners: list[Callable[[str, int], None]] = []
+
+
+def add_change_listener(func: Callable[[str, int], None]) -> None:
+    """Subscribe ``func`` to inserts, updates and deletes of cargo and trucks.
+
+    ``func`` receives the table name (``"cargo"`` or ``"trucks"``) and the row
+    ID after the transaction that changed the row has been committed, so it
+    may re-read the row from any thread.  Registered and deleted users are
+    reported as ``"users"``; listeners ignore tables they do not track.
+    """
+    if func not in _change_listeners:
+        _change_listeners.append(func)
+
+
+def remove_change_listener(func: Callable[[str, int], None]) -> None:
+    """Undo :func:`add_change_listener`."""
+    if func in _change_listeners:
+        _change_listeners.remove(func)
+
+
+# Last change_log entry delivered to this process, per database path
+_change_seqs: dict[str, int] = {}
+_change_seqs_lock = threading.Lock()
+# Tables whose changes are logged, with the events that are logged
+_LOGGED_CHANGES = {
+    "users": ("insert", "delete"),
+    "cargo": ("insert", "update", "delete"),
+    "trucks": ("insert", "update", "delete"),
+}
+
+
+def sync_changes() -> bool:
+    """Deliver changes committed by other processes to the change listeners.
+
+    Listeners normally hear only about writes made by this process.  When
+    several processes share the database (see :mod:`supervisor`) triggers
+    append every change to ``change_log`` and this function replays the
+    entries written since its previous call; changes of this process are
+    delivered a second time, which listeners tolerate.  The first call only
+    records the current position.  Returns ``False`` if entries were pruned
+    before they could be read, in which case callers must rebuild caches.
+    """
+    with get_connection() as conn:
+        with _change_seqs_lock:
+            last = _change_seqs.get(DB_PATH)
+        if last is None:
+            row = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()
+            with _change_seqs_lock:
+                _change_seqs.setdefault(DB_PATH, row[0] or 0)
+            return True
+        rows = conn.execute(
+            "SELECT seq, tbl, row_id FROM change_log WHERE seq > ? ORDER BY seq",
+            (last,),
+        ).fetchall()
+        oldest = None
+        if rows and rows[0]["seq"] != last + 1:
+            oldest = conn.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+    if not rows:
+        return True
+    with _change_seqs_lock:
+        _change_seqs[DB_PATH] = max(_change_seqs.get(DB_PATH, 0), rows[-1]["seq"])
+    for row in rows:
+        for func in list(_change_listeners):
+            try:
+                func(row["tbl"], row["row_id"])
+            except Exception:
+                logging.exception("Change listener %r failed", func)
+    return oldest is None or oldest <= last + 1
+
+
+def prune_change_log(keep: int) -> None:
+    """Delete all but the newest ``keep`` entries of ``change_log``."""
+    with get_connection(write=True) as conn:
+        conn.execute(
+            "DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?",
+            (keep,),
+        )
+
+
+def _notify_change(table: str, row_id: int) -> None:
+    def deliver() -> None:
+        for func in list(_change_listeners):
+            try:
+                func(table, row_id)
+            except Exception:
+                logging.exception("Change listener %r failed", func)
+
+    if _change_listeners:
+        get_pool(DB_PATH).on_commit(deliver)
 
 def init_db():
-    conn = get_connection()
-    cursor = conn.cursor()
+    pool = get_pool(DB_PATH)
+    conn = pool.acquire()
+    try:
+        # journal_mode is persistent and cannot change inside a transaction
+        conn.execute(f"PRAGMA journal_mode={Config.DB_JOURNAL_MODE}")
+    finally:
+        pool.release(conn)
+
+    with get_connection(write=True) as conn:
+        _create_schema(conn.cursor())
+
+
+def _create_schema(cursor: sqlite3.Cursor) -> None:
+    """Create tables and indexes that do not exist yet."""
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY,
@@ -43,6 +196,8 @@ def init_db():
         is_local INTEGER,
         comment TEXT,
         created_at TEXT,
+        city_from_norm TEXT,  -- normalize_city(city_from)
+        city_to_norm TEXT,  -- normalize_city(city_to)
         FOREIGN KEY (user_id) REFERENCES users(id)
     );
     """)
@@ -57,24 +212,602 @@ def init_db():
         weight INTEGER CHECK(weight > 0 AND weight <= {Config.MAX_WEIGHT}),
         body_type TEXT,
         direction TEXT,  -- 'ищу заказ' / 'попутный'
-        route_regions TEXT,  -- список регионов в текстовом виде
+        route_regions TEXT,  -- список регионов в текстовом виде (см. truck_route_regions)
         comment TEXT,
         created_at TEXT,
+        city_norm TEXT,  -- normalize_city(city)
         FOREIGN KEY (user_id) REFERENCES users(id)
     );
     """)
-    # Create indexes if they do not exist
+    # One row per region a truck is ready to go to; ``region`` is the
+    # canonical name from locations.get_regions(). Keyed by region first so
+    # "trucks going to X" is a primary key range lookup.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS truck_route_regions (
+        truck_id INTEGER NOT NULL,
+        region TEXT NOT NULL,
+        PRIMARY KEY (region, truck_id),
+        FOREIGN KEY (truck_id) REFERENCES trucks(id)
+    ) WITHOUT ROWID;
+    """)
+    # Admin broadcasts; ``last_user_id`` is the users.id up to which the
+    # text has been delivered, so an interrupted broadcast can resume
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY,
+        text TEXT NOT NULL,
+        created_by INTEGER,  -- telegram_id of the admin
+        created_at TEXT,
+        finished_at TEXT,
+        status TEXT NOT NULL DEFAULT 'running',  -- running / done / cancelled
+        total INTEGER NOT NULL DEFAULT 0,
+        last_user_id INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        blocked INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    _migrate_search_columns(cursor)
+    _migrate_route_regions(cursor)
+    _migrate_user_columns(cursor)
+    _create_stats(cursor)
+    _create_change_log(cursor)
+
+    # Create indexes if they do not exist. They mirror the predicates of
+    # search_cargo/search_trucks: equality on normalised cities followed by a
+    # range on date_from. Each index ends with date_from (plus the implicit
+    # rowid), so the (date_from, id) keyset ordering needs no extra sort.
+    cursor.execute("DROP INDEX IF EXISTS idx_cargo_cities")
+    cursor.execute("DROP INDEX IF EXISTS idx_trucks_city_date")
+    cursor.execute("DROP INDEX IF EXISTS idx_cargo_dates")
     cursor.execute(
-        "CREATE INDEX IF NOT EXISTS idx_cargo_dates ON cargo(date_from, date_to)"
+        "CREATE INDEX IF NOT EXISTS idx_cargo_date ON cargo(date_from)"
     )
     cursor.execute(
-        "CREATE INDEX IF NOT EXISTS idx_cargo_cities ON cargo(city_from, city_to)"
+        "CREATE INDEX IF NOT EXISTS idx_cargo_route_date"
+        " ON cargo(city_from_norm, city_to_norm, date_from)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cargo_from_date"
+        " ON cargo(city_from_norm, date_from)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cargo_to_date"
+        " ON cargo(city_to_norm, date_from)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_trucks_city_norm_date"
+        " ON trucks(city_norm, date_from)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_trucks_date ON trucks(date_from)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_truck_route_regions_truck"
+        " ON truck_route_regions(truck_id)"
+    )
+
+
+def _migrate_search_columns(cursor: sqlite3.Cursor) -> None:
+    """Add and backfill normalised search columns on older databases."""
+    columns = {
+        "cargo": ("city_from_norm", "city_to_norm"),
+        "trucks": ("city_norm",),
+    }
+    for table, names in columns.items():
+        existing = {r[1] for r in cursor.execute(f"PRAGMA table_info({table})")}
+        for name in names:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} TEXT")
+
+    rows = cursor.execute(
+        "SELECT id, city_from, city_to, date_from, date_to FROM cargo"
+        " WHERE (city_from_norm IS NULL AND city_from IS NOT NULL)"
+        " OR (city_to_norm IS NULL AND city_to IS NOT NULL)"
+        " OR date_from NOT GLOB ?"
+        " OR date_to NOT GLOB ?",
+        (_ISO_DATE_GLOB, _ISO_DATE_GLOB),
+    ).fetchall()
+    cursor.executemany(
+        "UPDATE cargo SET city_from_norm = ?, city_to_norm = ?,"
+        " date_from = ?, date_to = ? WHERE id = ?",
+        [
+            (
+                normalize_city(r[1]), normalize_city(r[2]),
+                normalize_date(r[3]), normalize_date(r[4]), r[0],
+            )
+            for r in rows
+        ],
+    )
+
+    rows = cursor.execute(
+        "SELECT id, city, date_from, date_to FROM trucks"
+        " WHERE (city_norm IS NULL AND city IS NOT NULL)"
+        " OR date_from NOT GLOB ?"
+        " OR date_to NOT GLOB ?",
+        (_ISO_DATE_GLOB, _ISO_DATE_GLOB),
+    ).fetchall()
+    cursor.executemany(
+        "UPDATE trucks SET city_norm = ?, date_from = ?, date_to = ? WHERE id = ?",
+        [
+            (normalize_city(r[1]), normalize_date(r[2]), normalize_date(r[3]), r[0])
+            for r in rows
+        ],
     )
+
+
+def _migrate_user_columns(cursor: sqlite3.Cursor) -> None:
+    """Add ``users.is_blocked`` (1 = the user blocked the bot)."""
+    existing = {r[1] for r in cursor.execute("PRAGMA table_info(users)")}
+    if "is_blocked" not in existing:
+        cursor.execute(
+            "ALTER TABLE users ADD COLUMN is_blocked INTEGER NOT NULL DEFAULT 0"
+        )
+
+
+def _migrate_route_regions(cursor: sqlite3.Cursor) -> None:
+    """Fill ``truck_route_regions`` for trucks stored before it existed."""
+    rows = cursor.execute(
+        "SELECT id, route_regions FROM trucks"
+        " WHERE route_regions <> ''"
+        " AND id NOT IN (SELECT truck_id FROM truck_route_regions)"
+    ).fetchall()
+    for row in rows:
+        _set_route_regions(cursor, row[0], row[1])
+
+
+def _set_route_regions(
+    cursor: sqlite3.Cursor, truck_id: int, route_regions: str | None
+) -> None:
+    """Replace link rows of ``truck_id`` with regions parsed from text."""
     cursor.execute(
-        "CREATE INDEX IF NOT EXISTS idx_trucks_city_date ON trucks(city, date_from)"
+        "DELETE FROM truck_route_regions WHERE truck_id = ?", (truck_id,)
+    )
+    regions, _ = parse_regions(route_regions or "")
+    cursor.executemany(
+        "INSERT OR IGNORE INTO truck_route_regions (truck_id, region)"
+        " VALUES (?, ?)",
+        [(truck_id, region) for region in regions],
+    )
+
+
+def _create_change_log(cursor: sqlite3.Cursor) -> None:
+    """Create ``change_log`` and the triggers filling it (see :func:`sync_changes`)."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        row_id INTEGER NOT NULL
+    );
+    """)
+    for table, events in _LOGGED_CHANGES.items():
+        for event in events:
+            row = "OLD" if event == "delete" else "NEW"
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS changes_{table}_{event}
+            AFTER {event.upper()} ON {table}
+            BEGIN
+                INSERT INTO change_log (tbl, row_id) VALUES ('{table}', {row}.id);
+            END;
+            """)
+
+
+# ==== Statistics ====
+
+# Tables whose rows are counted by triggers, under their own names as kinds
+STATS_TABLES = ("users", "cargo", "trucks")
+# Kinds of events counted only in hourly buckets
+STATS_EVENTS = ("cargo_search", "truck_search")
+# Hour bucket of rows whose created_at cannot be parsed; older than any window
+_UNKNOWN_HOUR = "0000-00-00 00:00"
+
+
+def _stats_hour(value: str) -> str:
+    """SQL expression for the UTC hour bucket (``YYYY-MM-DD HH:00``) of ``value``.
+
+    ``created_at`` columns hold the server's local time
+    (``datetime.now().isoformat()``); buckets are in UTC like those of
+    :func:`record_event`.
+    """
+    return f"COALESCE(strftime('%Y-%m-%d %H:00', {value}, 'utc'), '{_UNKNOWN_HOUR}')"
+
+
+def _create_stats(cursor: sqlite3.Cursor) -> None:
+    """Create counter tables and the triggers that keep them up to date.
+
+    ``stats_totals`` holds the current number of rows of every table in
+    :data:`STATS_TABLES`; ``stats_hourly`` holds how many of them were
+    created in each UTC hour (by ``created_at``), plus :data:`STATS_EVENTS`
+    recorded by :func:`record_event`.  Deleting a row decrements both, so
+    the counters always describe the rows that exist.  Counters are rebuilt
+    from the tables once, when the triggers are created; triggers of older
+    versions bucketing by local time are replaced.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats_totals (
+        kind TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats_hourly (
+        kind TEXT NOT NULL,
+        hour TEXT NOT NULL,  -- 'YYYY-MM-DD HH:00'
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (kind, hour)
+    ) WITHOUT ROWID;
+    """)
+    existing = dict(
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+    )
+    for table in STATS_TABLES:
+        triggers = (f"stats_{table}_insert", f"stats_{table}_delete")
+        if all("'utc'" in existing.get(name, "") for name in triggers):
+            continue
+        for name in triggers:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for event, row, delta in (("insert", "NEW", "+ 1"), ("delete", "OLD", "- 1")):
+            hour = _stats_hour(f"{row}.created_at")
+            cursor.execute(f"""
+            CREATE TRIGGER stats_{table}_{event} AFTER {event.upper()} ON {table}
+            BEGIN
+                INSERT OR IGNORE INTO stats_totals (kind) VALUES ('{table}');
+                UPDATE stats_totals SET value = value {delta} WHERE kind = '{table}';
+                INSERT OR IGNORE INTO stats_hourly (kind, hour) VALUES ('{table}', {hour});
+                UPDATE stats_hourly SET count = count {delta}
+                    WHERE kind = '{table}' AND hour = {hour};
+            END;
+            """)
+        cursor.execute("DELETE FROM stats_totals WHERE kind = ?", (table,))
+        cursor.execute("DELETE FROM stats_hourly WHERE kind = ?", (table,))
+        cursor.execute(
+            f"INSERT INTO stats_totals (kind, value)"
+            f" SELECT '{table}', COUNT(*) FROM {table}"
+        )
+        cursor.execute(
+            f"INSERT INTO stats_hourly (kind, hour, count)"
+            f" SELECT '{table}', {_stats_hour('created_at')}, COUNT(*)"
+            f" FROM {table} GROUP BY 2"
+        )
+
+
+def record_event(kind: str, count: int = 1) -> None:
+    """Add ``count`` events of ``kind`` to the current (UTC) hour."""
+    hour = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:00")
+    with get_connection(write=True) as conn:
+        conn.execute(
+            "INSERT INTO stats_hourly (kind, hour, count) VALUES (?, ?, ?)"
+            " ON CONFLICT(kind, hour) DO UPDATE SET count = count + excluded.count",
+            (kind, hour, count),
+        )
+
+
+def get_stats_totals() -> dict[str, int]:
+    """Return the current row count of every table in :data:`STATS_TABLES`."""
+    with get_connection() as conn:
+        rows = conn.execute("SELECT kind, value FROM stats_totals").fetchall()
+    totals = dict.fromkeys(STATS_TABLES, 0)
+    totals.update((r["kind"], r["value"]) for r in rows)
+    return totals
+
+
+def get_stats_since(since_hour: str) -> dict[str, int]:
+    """Return per-kind counts of hour buckets starting at ``since_hour`` or later.
+
+    ``since_hour`` uses the bucket format ``YYYY-MM-DD HH:00``.
+    """
+    kinds = STATS_TABLES + STATS_EVENTS
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT kind, SUM(count) AS total FROM stats_hourly"
+            f" WHERE kind IN ({', '.join('?' * len(kinds))}) AND hour >= ?"
+            " GROUP BY kind",
+            (*kinds, since_hour),
+        ).fetchall()
+    counts = dict.fromkeys(kinds, 0)
+    counts.update((r["kind"], r["total"]) for r in rows)
+    return counts
+
+
+def get_user_by_telegram_id(telegram_id: int) -> sqlite3.Row | None:
+    """Return the user registered with ``telegram_id``."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, name, city, phone, created_at FROM users"
+            " WHERE telegram_id = ?",
+            (telegram_id,),
+        )
+        row = cursor.fetchone()
+    return row
+
+
+def get_user_id(telegram_id: int) -> int | None:
+    """Return internal user ID for ``telegram_id`` or ``None``."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,))
+        row = cursor.fetchone()
+    return row["id"] if row else None
+
+
+def add_user(
+    telegram_id: int, name: str, city: str, phone: str, created_at: str
+) -> int | None:
+    """Insert a new user and return its ID.
+
+    The call is ignored and ``None`` returned if ``telegram_id`` exists.
+    """
+    with get_connection(write=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR IGNORE INTO users (telegram_id, name, city, phone, created_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (telegram_id, name, city, phone, created_at),
+        )
+        if not cursor.rowcount:
+            return None
+        _notify_change("users", cursor.lastrowid)
+    return cursor.lastrowid
+
+
+def get_latest_users(limit: int) -> list[sqlite3.Row]:
+    """Return the ``limit`` most recently registered users."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT name, city, phone, created_at FROM users"
+            " ORDER BY created_at DESC LIMIT ?",
+            (limit,),
+        )
+        rows = cursor.fetchall()
+    return rows
+
+
+def get_all_telegram_ids() -> list[int]:
+    """Return Telegram IDs of all users who have not blocked the bot."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT telegram_id FROM users WHERE is_blocked = 0")
+        rows = cursor.fetchall()
+    return [r["telegram_id"] for r in rows]
+
+
+def set_users_blocked(telegram_ids: list[int], blocked: bool = True) -> None:
+    """Mark users who blocked (or unblocked) the bot."""
+    with get_connection(write=True) as conn:
+        conn.executemany(
+            "UPDATE users SET is_blocked = ? WHERE telegram_id = ?",
+            [(int(blocked), tid) for tid in telegram_ids],
+        )
+
+
+# ==== Broadcasts ====
+
+def create_broadcast(text: str, created_by: int, created_at: str) -> int:
+    """Store a new running broadcast to all reachable users; return its ID."""
+    with get_connection(write=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO broadcasts (text, created_by, created_at, total)"
+            " SELECT ?, ?, ?, COUNT(*) FROM users WHERE is_blocked = 0",
+            (text, created_by, created_at),
+        )
+        return cursor.lastrowid
+
+
+def get_broadcast(broadcast_id: int) -> sqlite3.Row | None:
+    """Return broadcast ``broadcast_id``."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+        row = cursor.fetchone()
+    return row
+
+
+def get_latest_broadcasts(limit: int) -> list[sqlite3.Row]:
+    """Return the ``limit`` most recent broadcasts, newest first."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM broadcasts ORDER BY id DESC LIMIT ?", (limit,)
+        )
+        rows = cursor.fetchall()
+    return rows
+
+
+def get_running_broadcast_ids() -> list[int]:
+    """Return IDs of broadcasts that have not finished yet."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id"
+        )
+        rows = cursor.fetchall()
+    return [r["id"] for r in rows]
+
+
+def get_broadcast_recipients(after_user_id: int, limit: int) -> list[sqlite3.Row]:
+    """Return ``id`` and ``telegram_id`` of the next reachable users.
+
+    Users are ordered by ``id`` starting after ``after_user_id``.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, telegram_id FROM users"
+            " WHERE id > ? AND is_blocked = 0 ORDER BY id LIMIT ?",
+            (after_user_id, limit),
+        )
+        rows = cursor.fetchall()
+    return rows
+
+
+def update_broadcast_progress(
+    broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked: int
+) -> None:
+    """Save delivery counters of a broadcast processed up to ``last_user_id``."""
+    with get_connection(write=True) as conn:
+        conn.execute(
+            "UPDATE broadcasts SET last_user_id = ?, sent = ?, failed = ?,"
+            " blocked = ? WHERE id = ?",
+            (last_user_id, sent, failed, blocked, broadcast_id),
+        )
+
+
+def finish_broadcast(broadcast_id: int, status: str, finished_at: str) -> None:
+    """Set the final ``status`` (``done`` or ``cancelled``) of a broadcast."""
+    with get_connection(write=True) as conn:
+        conn.execute(
+            "UPDATE broadcasts SET status = ?, finished_at = ?"
+            " WHERE id = ? AND status = 'running'",
+            (status, finished_at, broadcast_id),
+        )
+
+
+# Shared by add_cargo and add_cargo_many; values come from _cargo_values
+_INSERT_CARGO = """
+    INSERT INTO cargo (
+        user_id,
+        city_from, region_from,
+        city_to, region_to,
+        date_from, date_to,
+        weight, body_type,
+        is_local, comment, created_at,
+        city_from_norm, city_to_norm
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _cargo_values(args: tuple) -> tuple:
+    """Return :data:`_INSERT_CARGO` parameters for :func:`add_cargo` ``args``."""
+    return (
+        *args[:5],
+        normalize_date(args[5]), normalize_date(args[6]),
+        *args[7:],
+        normalize_city(args[1]), normalize_city(args[3]),
     )
-    conn.commit()
-    conn.close()
+
+
+def add_cargo(
+    user_id: int,
+    city_from: str,
+    region_from: str,
+    city_to: str,
+    region_to: str,
+    date_from: str,
+    date_to: str,
+    weight: int,
+    body_type: str,
+    is_local: int,
+    comment: str,
+    created_at: str,
+) -> int:
+    """Insert a cargo entry and return its ID."""
+    return add_cargo_many([(
+        user_id,
+        city_from, region_from,
+        city_to, region_to,
+        date_from, date_to,
+        weight, body_type,
+        is_local, comment, created_at,
+    )])[0]
+
+
+def add_cargo_many(rows: list[tuple]) -> list[int]:
+    """Insert cargo entries in one transaction and return their IDs.
+
+    Every row holds the arguments of :func:`add_cargo` in the same order.
+    Rows are inserted one ``execute`` at a time rather than with
+    ``executemany``, which does not report the ID of each row; inside one
+    transaction the difference is small.
+    """
+    ids = []
+    with get_connection(write=True) as conn:
+        cursor = conn.cursor()
+        for row in rows:
+            cursor.execute(_INSERT_CARGO, _cargo_values(row))
+            ids.append(cursor.lastrowid)
+            _notify_change("cargo", cursor.lastrowid)
+    return ids
+
+
+def _paginate(
+    query: str,
+    params: list,
+    alias: str,
+    after: tuple[str, int] | None,
+    limit: int | None,
+) -> tuple[str, list]:
+    """Append keyset condition, ``(date_from, id)`` ordering and ``LIMIT``."""
+    if after is not None:
+        query += f" AND ({alias}.date_from, {alias}.id) > (?, ?)"
+        params.extend(after)
+    query += f" ORDER BY {alias}.date_from, {alias}.id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, params
+
+
+def search_cargo(
+    city_from: str | None = None,
+    city_to: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    *,
+    after: tuple[str, int] | None = None,
+    limit: int | None = None,
+) -> list[sqlite3.Row]:
+    """Return cargo entries matching the given filters.
+
+    Cities are compared case-insensitively through the normalised columns,
+    dates bound ``date_from`` of the entry.  ``None`` disables the
+    corresponding filter.  Every predicate can be served by an index.
+
+    Results are ordered by ``(date_from, id)``; pass the key of the last row
+    already shown as ``after`` together with ``limit`` to fetch the next page
+    without scanning the previous ones.
+    """
+    query = """
+    SELECT c.id, u.name, c.city_from, c.region_from, c.city_to, c.region_to, c.date_from, c.weight, c.body_type
+    FROM cargo c
+    JOIN users u ON c.user_id = u.id
+    WHERE 1=1
+    """
+    params: list[str] = []
+    if city_from is not None:
+        query += " AND c.city_from_norm = ?"
+        params.append(normalize_city(city_from))
+    if city_to is not None:
+        query += " AND c.city_to_norm = ?"
+        params.append(normalize_city(city_to))
+    if date_from is not None:
+        query += " AND c.date_from >= ?"
+        params.append(normalize_date(date_from))
+    if date_to is not None:
+        query += " AND c.date_from <= ?"
+        params.append(normalize_date(date_to))
+    query, params = _paginate(query, params, "c", after, limit)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+    return rows
+
+
+def get_latest_cargo(limit: int) -> list[sqlite3.Row]:
+    """Return the ``limit`` most recently added cargo entries."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, city_from, city_to, date_from, weight FROM cargo"
+            " ORDER BY created_at DESC LIMIT ?",
+            (limit,),
+        )
+        rows = cursor.fetchall()
+    return rows
 
 
 def get_cargo_by_user(user_id: int) -> list[sqlite3.Row]:
@@ -115,6 +848,129 @@ def get_trucks_by_user(user_id: int) -> list[sqlite3.Row]:
     return rows
 
 
+# Shared by add_truck and add_trucks_many; values come from _truck_values
+_INSERT_TRUCK = """
+    INSERT INTO trucks (
+        user_id, city, region,
+        date_from, date_to,
+        weight, body_type,
+        direction, route_regions,
+        comment, created_at, city_norm
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _truck_values(args: tuple) -> tuple:
+    """Return :data:`_INSERT_TRUCK` parameters for :func:`add_truck` ``args``."""
+    return (
+        *args[:3],
+        normalize_date(args[3]), normalize_date(args[4]),
+        *args[5:],
+        normalize_city(args[1]),
+    )
+
+
+def add_truck(
+    user_id: int,
+    city: str,
+    region: str,
+    date_from: str,
+    date_to: str,
+    weight: int,
+    body_type: str,
+    direction: str,
+    route_regions: str,
+    comment: str,
+    created_at: str,
+) -> int:
+    """Insert a truck entry and return its ID."""
+    return add_trucks_many([(
+        user_id, city, region,
+        date_from, date_to,
+        weight, body_type,
+        direction, route_regions,
+        comment, created_at,
+    )])[0]
+
+
+def add_trucks_many(rows: list[tuple]) -> list[int]:
+    """Insert trucks in one transaction and return their IDs.
+
+    Every row holds the arguments of :func:`add_truck` in the same order.
+    Like :func:`add_cargo_many` rows are inserted one ``execute`` at a time,
+    since the ID of each truck is needed for its route region links.
+    """
+    ids = []
+    with get_connection(write=True) as conn:
+        cursor = conn.cursor()
+        for row in rows:
+            cursor.execute(_INSERT_TRUCK, _truck_values(row))
+            truck_id = cursor.lastrowid
+            _set_route_regions(cursor, truck_id, row[8])
+            ids.append(truck_id)
+            _notify_change("trucks", truck_id)
+    return ids
+
+
+def search_trucks(
+    city: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    route_region: str | None = None,
+    *,
+    after: tuple[str, int] | None = None,
+    limit: int | None = None,
+) -> list[sqlite3.Row]:
+    """Return trucks matching the given filters (``None`` disables one).
+
+    ``route_region`` is a canonical region name; only trucks ready to go
+    there are returned, looked up through ``truck_route_regions``.
+    Ordering and keyset pagination work as in :func:`search_cargo`.
+    """
+    query = """
+    SELECT t.id, u.name, t.city, t.region, t.date_from, t.weight, t.body_type, t.direction
+    FROM trucks t
+    JOIN users u ON t.user_id = u.id
+    WHERE 1=1
+    """
+    params: list[str] = []
+    if city is not None:
+        query += " AND t.city_norm = ?"
+        params.append(normalize_city(city))
+    if date_from is not None:
+        query += " AND t.date_from >= ?"
+        params.append(normalize_date(date_from))
+    if date_to is not None:
+        query += " AND t.date_from <= ?"
+        params.append(normalize_date(date_to))
+    if route_region is not None:
+        query += (
+            " AND t.id IN (SELECT truck_id FROM truck_route_regions"
+            " WHERE region = ?)"
+        )
+        params.append(route_region)
+    query, params = _paginate(query, params, "t", after, limit)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+    return rows
+
+
+def get_latest_trucks(limit: int) -> list[sqlite3.Row]:
+    """Return the ``limit`` most recently added trucks."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, city, date_from, weight FROM trucks"
+            " ORDER BY created_at DESC LIMIT ?",
+            (limit,),
+        )
+        rows = cursor.fetchall()
+    return rows
+
+
 def get_truck(truck_id: int) -> sqlite3.Row | None:
     """Return truck entry by ID."""
     with get_connection() as conn:
@@ -124,15 +980,44 @@ def get_truck(truck_id: int) -> sqlite3.Row | None:
     return row
 
 
+def _rows_with_owner(table: str, ids: list[int] | None) -> list[sqlite3.Row]:
+    query = f"SELECT x.*, u.name FROM {table} x JOIN users u ON x.user_id = u.id"
+    params: list[int] = []
+    if ids is not None:
+        if not ids:
+            return []
+        query += f" WHERE x.id IN ({','.join('?' * len(ids))})"
+        params = list(ids)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    return rows
+
+
+def get_cargo_with_owner(ids: list[int] | None = None) -> list[sqlite3.Row]:
+    """Return cargo entries joined with the owner's ``name``.
+
+    All entries are returned when ``ids`` is ``None``; used to build and
+    refresh in-memory indexes.
+    """
+    return _rows_with_owner("cargo", ids)
+
+
+def get_trucks_with_owner(ids: list[int] | None = None) -> list[sqlite3.Row]:
+    """Return truck entries joined with the owner's ``name`` (see above)."""
+    return _rows_with_owner("trucks", ids)
+
+
 def update_cargo_weight(cargo_id: int, weight: int) -> None:
     """Update ``weight`` for cargo entry with given ``cargo_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE cargo SET weight = ? WHERE id = ?",
             (weight, cargo_id),
         )
-        conn.commit()
+        _notify_change("cargo", cargo_id)
 
 
 def update_cargo_route(
@@ -143,108 +1028,182 @@ def update_cargo_route(
     region_to: str,
 ) -> None:
     """Update route cities and regions for cargo entry ``cargo_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE cargo SET city_from = ?, region_from = ?,"
-            " city_to = ?, region_to = ? WHERE id = ?",
-            (city_from, region_from, city_to, region_to, cargo_id),
+            " city_to = ?, region_to = ?,"
+            " city_from_norm = ?, city_to_norm = ? WHERE id = ?",
+            (
+                city_from, region_from, city_to, region_to,
+                normalize_city(city_from), normalize_city(city_to), cargo_id,
+            ),
         )
-        conn.commit()
+        _notify_change("cargo", cargo_id)
 
 
 def update_cargo_dates(cargo_id: int, date_from: str, date_to: str) -> None:
     """Update dates for cargo entry ``cargo_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE cargo SET date_from = ?, date_to = ? WHERE id = ?",
-            (date_from, date_to, cargo_id),
+            (normalize_date(date_from), normalize_date(date_to), cargo_id),
         )
-        conn.commit()
+        _notify_change("cargo", cargo_id)
 
 
 def delete_cargo(cargo_id: int) -> None:
     """Remove cargo entry identified by ``cargo_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM cargo WHERE id = ?", (cargo_id,))
-        conn.commit()
+        _notify_change("cargo", cargo_id)
 
 
 def update_truck_weight(truck_id: int, weight: int) -> None:
     """Update ``weight`` for truck entry with given ``truck_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE trucks SET weight = ? WHERE id = ?",
             (weight, truck_id),
         )
-        conn.commit()
+        _notify_change("trucks", truck_id)
 
 
 def update_truck_route(truck_id: int, city: str, region: str) -> None:
     """Update location city and region for truck entry ``truck_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "UPDATE trucks SET city = ?, region = ? WHERE id = ?",
-            (city, region, truck_id),
+            "UPDATE trucks SET city = ?, region = ?, city_norm = ? WHERE id = ?",
+            (city, region, normalize_city(city), truck_id),
         )
-        conn.commit()
+        _notify_change("trucks", truck_id)
 
 
 def update_truck_dates(truck_id: int, date_from: str, date_to: str) -> None:
     """Update dates for truck entry ``truck_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE trucks SET date_from = ?, date_to = ? WHERE id = ?",
-            (date_from, date_to, truck_id),
+            (normalize_date(date_from), normalize_date(date_to), truck_id),
         )
-        conn.commit()
+        _notify_change("trucks", truck_id)
 
 
 def delete_truck(truck_id: int) -> None:
     """Remove truck entry identified by ``truck_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM truck_route_regions WHERE truck_id = ?", (truck_id,)
+        )
         cursor.execute("DELETE FROM trucks WHERE id = ?", (truck_id,))
-        conn.commit()
+        _notify_change("trucks", truck_id)
 
 
 def update_user_name(user_id: int, name: str) -> None:
     """Update ``name`` for user with ``user_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET name = ? WHERE id = ?", (name, user_id))
-        conn.commit()
 
 
 def update_user_city(user_id: int, city: str) -> None:
     """Update ``city`` for user with ``user_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET city = ? WHERE id = ?", (city, user_id))
-        conn.commit()
 
 
 def update_user_phone(user_id: int, phone: str) -> None:
     """Update ``phone`` for user with ``user_id``."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
         cursor.execute("UPDATE users SET phone = ? WHERE id = ?", (phone, user_id))
-        conn.commit()
 
 
 def delete_user(user_id: int) -> None:
     """Remove user and associated cargo and trucks."""
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         cursor = conn.cursor()
+        for table in ("cargo", "trucks"):
+            cursor.execute(f"SELECT id FROM {table} WHERE user_id = ?", (user_id,))
+            for row in cursor.fetchall():
+                _notify_change(table, row["id"])
         cursor.execute("DELETE FROM cargo WHERE user_id = ?", (user_id,))
+        cursor.execute(
+            "DELETE FROM truck_route_regions WHERE truck_id IN"
+            " (SELECT id FROM trucks WHERE user_id = ?)",
+            (user_id,),
+        )
         cursor.execute("DELETE FROM trucks WHERE user_id = ?", (user_id,))
         cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        conn.commit()
+        _notify_change("users", user_id)
+
+
+# Columns of admin exports (see export.py); cargo and trucks also get the
+# owner's contacts
+EXPORT_COLUMNS = {
+    "users": (
+        "id", "telegram_id", "name", "city", "phone", "created_at", "is_blocked",
+    ),
+    "cargo": (
+        "id", "user_id", "city_from", "region_from", "city_to", "region_to",
+        "date_from", "date_to", "weight", "body_type", "is_local", "comment",
+        "created_at", "owner_telegram_id", "owner_name", "owner_phone",
+    ),
+    "trucks": (
+        "id", "user_id", "city", "region", "date_from", "date_to", "weight",
+        "body_type", "direction", "route_regions", "comment", "created_at",
+        "owner_telegram_id", "owner_name", "owner_phone",
+    ),
+}
+_OWNER_COLUMNS = {
+    "owner_telegram_id": "u.telegram_id",
+    "owner_name": "u.name",
+    "owner_phone": "u.phone",
+}
+
+
+def iter_export_rows(
+    table: str,
+    created_from: str | None = None,
+    created_before: str | None = None,
+    batch_size: int = 1000,
+) -> Iterator[tuple]:
+    """Yield :data:`EXPORT_COLUMNS` of ``table`` rows in ``id`` order.
+
+    Only rows with ``created_from <= created_at < created_before`` are
+    returned (ISO strings, either bound may be ``None``).  Rows are read
+    ``batch_size`` at a time from one cursor, so memory use does not depend
+    on the table size.
+    """
+    columns = ", ".join(
+        _OWNER_COLUMNS.get(c, f"t.{c}") for c in EXPORT_COLUMNS[table]
+    )
+    sql = f"SELECT {columns} FROM {table} t"
+    if table != "users":
+        sql += " LEFT JOIN users u ON u.id = t.user_id"
+    conditions, params = [], []
+    if created_from:
+        conditions.append("t.created_at >= ?")
+        params.append(created_from)
+    if created_before:
+        conditions.append("t.created_at < ?")
+        params.append(created_before)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY t.id"
+
+    with get_connection() as conn:
+        cursor = conn.execute(sql, params)
+        while rows := cursor.fetchmany(batch_size):
+            for row in rows:
+                yield tuple(row)
 
 
 if __name__ == "__main__":
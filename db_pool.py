@@ -0,0 +1,241 @@
+"""Pool of long-lived SQLite connections shared by all database helpers."""
+
+from __future__ import annotations
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from config import Config
+
+
+class PoolClosedError(RuntimeError):
+    """Raised when a connection is requested from a closed pool."""
+
+
+class ConnectionPool:
+    """A bounded pool of reusable connections to a single SQLite file.
+
+    Connections are created lazily up to ``size`` and handed out one caller
+    at a time.  They are opened with ``check_same_thread=False`` so that a
+    connection may be released by one thread and picked up by another, and
+    the per-connection PRAGMAs from :class:`Config` are applied once when a
+    connection is opened.  Idle connections are pinged before reuse when they
+    have not been used for ``health_check_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int = Config.DB_POOL_SIZE,
+        timeout: float = Config.DB_POOL_TIMEOUT,
+        health_check_interval: float = Config.DB_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle: queue.LifoQueue[tuple[sqlite3.Connection, float]] = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._local = threading.local()
+
+    @property
+    def created(self) -> int:
+        """Number of connections currently owned by the pool."""
+        return self._created
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are managed explicitly in :meth:`connection`
+        conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={Config.DB_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA synchronous={Config.DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size={Config.DB_CACHE_SIZE}")
+        conn.execute(f"PRAGMA mmap_size={Config.DB_MMAP_SIZE}")
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take a connection from the pool, opening a new one if allowed."""
+        while True:
+            if self._closed:
+                raise PoolClosedError(f"Connection pool for {self.path} is closed")
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    conn, last_used = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"No free database connection within {self.timeout}s"
+                    ) from None
+
+            idle_for = time.monotonic() - last_used
+            if idle_for >= self.health_check_interval and not self._is_healthy(conn):
+                logging.warning("Dropping broken SQLite connection to %s", self.path)
+                self._discard(conn)
+                continue
+            return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return ``conn`` to the pool, rolling back any unfinished work."""
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                self._discard(conn)
+                return
+        if self._closed:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """Context manager yielding a pooled connection inside a transaction.
+
+        The transaction is committed when the block exits normally and rolled
+        back on error, then the connection goes back to the pool.  A nested
+        ``connection()`` block on the same thread reuses the outer connection
+        and runs inside a savepoint, so several helpers can be grouped into a
+        single transaction while each of them stays atomic.
+
+        Transactions that write must pass ``immediate=True``.  A deferred
+        transaction takes the write lock only at its first write, and in WAL
+        mode that upgrade fails at once with "database is locked" (without
+        waiting for ``busy_timeout``) if another connection committed since
+        the transaction's first read.  ``BEGIN IMMEDIATE`` takes the lock up
+        front, waiting for other writers instead.  The flag of a nested block
+        is ignored: it joins the outer transaction.
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            with self._savepoint(held):
+                yield held
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        self._local.depth = 0
+        self._local.on_commit = []
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            callbacks = self._local.on_commit
+        finally:
+            self._local.conn = None
+            self._local.on_commit = []
+            self.release(conn)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logging.exception("on_commit callback %r failed", callback)
+
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` once the current thread's transaction commits.
+
+        Callbacks registered inside a savepoint that is rolled back, or inside
+        a transaction that is rolled back, are dropped.  Outside of a
+        ``connection()`` block the callback runs immediately.
+        """
+        if getattr(self._local, "conn", None) is None:
+            callback()
+        else:
+            self._local.on_commit.append(callback)
+
+    @contextmanager
+    def _savepoint(self, conn: sqlite3.Connection) -> Iterator[None]:
+        self._local.depth += 1
+        name = f"sp{self._local.depth}"
+        pending = len(self._local.on_commit)
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            del self._local.on_commit[pending:]
+            raise
+        else:
+            conn.execute(f"RELEASE {name}")
+        finally:
+            self._local.depth -= 1
+
+    def close(self) -> None:
+        """Close idle connections and refuse further acquisitions.
+
+        Connections that are checked out at this moment are closed as soon as
+        they are released.
+        """
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: str) -> ConnectionPool:
+    """Return the shared pool for ``path``, creating it on first use."""
+    pool = _pools.get(path)
+    if pool is None or pool._closed:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None or pool._closed:
+                pool = ConnectionPool(path)
+                _pools[path] = pool
+    return pool
+
+
+def close_all() -> None:
+    """Close every pool; called once on bot shutdown."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
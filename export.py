@@ -0,0 +1,113 @@
+"""Streaming export of users, cargo and trucks to gzip-compressed files.
+
+:func:`write_export` reads a table through :func:`db.iter_export_rows` (one
+cursor, a batch of rows at a time) and writes each row straight into a
+gzip-compressed CSV or JSON Lines file, so memory use stays constant however
+large the table is.  Rows can be limited to a range of ``created_at`` dates.
+
+Admins get the file as a document with ``/export`` (see
+:mod:`handlers.admin`); on the server run::
+
+    python export.py cargo --format jsonl --from 2024-01-01 --to 2024-01-31
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import db
+from config import Config
+
+FORMATS = ("csv", "jsonl")
+TABLES = tuple(db.EXPORT_COLUMNS)
+
+
+def parse_export_date(text: str) -> str:
+    """Return ``text`` (``YYYY-MM-DD`` or ``ДД.ММ.ГГГГ``) as an ISO date.
+
+    Raises ``ValueError`` if it is neither.
+    """
+    for fmt in ("%Y-%m-%d", Config.DATE_FORMAT):
+        try:
+            return datetime.strptime(text.strip(), fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {text!r}")
+
+
+def export_filename(
+    table: str, fmt: str, date_from: str | None = None, date_to: str | None = None
+) -> str:
+    """Return a descriptive file name such as ``cargo_2024-01-01_2024-01-31.csv.gz``."""
+    parts = [table]
+    if date_from or date_to:
+        parts += [date_from or "start", date_to or "now"]
+    return "_".join(parts) + f".{fmt}.gz"
+
+
+def write_export(
+    path: str,
+    table: str,
+    fmt: str = "csv",
+    date_from: str | None = None,
+    date_to: str | None = None,
+) -> int:
+    """Write rows of ``table`` created from ``date_from`` to ``date_to``
+    (ISO dates, inclusive, ``None`` for no bound) to ``path``.
+
+    Returns the number of exported rows.
+    """
+    if table not in db.EXPORT_COLUMNS:
+        raise ValueError(f"Unknown table: {table!r}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt!r}")
+    created_before = None
+    if date_to:
+        created_before = (
+            datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+        ).strftime("%Y-%m-%d")
+    columns = db.EXPORT_COLUMNS[table]
+    rows = db.iter_export_rows(table, date_from, created_before)
+
+    count = 0
+    # BOM in CSV files so Excel detects UTF-8 (Cyrillic names and cities)
+    encoding = "utf-8-sig" if fmt == "csv" else "utf-8"
+    with gzip.open(path, "wt", encoding=encoding, newline="") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                f.write("\n")
+                count += 1
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--from", dest="date_from", type=parse_export_date,
+                        help="first creation date (YYYY-MM-DD or ДД.ММ.ГГГГ)")
+    parser.add_argument("--to", dest="date_to", type=parse_export_date,
+                        help="last creation date, inclusive")
+    parser.add_argument("-o", "--output", help="file to write (default: derived from the arguments)")
+    args = parser.parse_args()
+
+    path = args.output or export_filename(
+        args.table, args.format, args.date_from, args.date_to
+    )
+    count = write_export(path, args.table, args.format, args.date_from, args.date_to)
+    print(f"Exported {count} rows to {path}")
+
+
+if __name__ == "__main__":
+    main()
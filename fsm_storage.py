@@ -0,0 +1,266 @@
+"""Persistent FSM storage backed by a local SQLite file.
+
+aiogram's ``MemoryStorage`` loses every unfinished cargo/truck wizard on
+restart.  :class:`SQLiteStorage` keeps conversations in a small database of
+their own (:attr:`Config.FSM_DB_PATH`, separate from the bot database) while
+serving reads from memory: handlers call ``get_data``/``update_data`` several
+times per step, and only the first access to a conversation touches SQLite.
+
+Changes are written behind: modified conversations are collected and
+committed together every :attr:`Config.FSM_FLUSH_INTERVAL` seconds and on
+:meth:`~SQLiteStorage.close`, which aiogram calls at shutdown.  Finished
+conversations (no state and no data) are deleted, and conversations without
+changes for :attr:`Config.FSM_STATE_TTL` seconds are dropped as abandoned.
+Data is stored as compact JSON, so values must be JSON serialisable (tuples
+come back as lists).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from copy import copy
+from typing import Any
+
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StorageKey
+
+import async_db
+from config import Config
+from db_pool import get_pool
+from instrumentation import FSM_CACHE, FSM_SECONDS
+
+# Minimal number of seconds between removals of abandoned conversations
+_SWEEP_INTERVAL = 600.0
+
+
+def _dumps(data: dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class _Record:
+    """Cached conversation: state, data and modification/access times."""
+
+    __slots__ = ("state", "data", "updated", "used")
+
+    def __init__(
+        self,
+        state: str | None = None,
+        data: dict[str, Any] | None = None,
+        updated: float = 0.0,
+    ) -> None:
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated = updated
+        self.used = time.monotonic()
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage caching conversations in memory and saving them to SQLite.
+
+    ``flush_interval``, ``ttl`` and ``idle`` default to
+    :attr:`Config.FSM_FLUSH_INTERVAL`, :attr:`Config.FSM_STATE_TTL` and
+    :attr:`Config.FSM_CACHE_IDLE`; ``idle`` is how long an unchanged
+    conversation stays in memory after it was last used.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        *,
+        flush_interval: float | None = None,
+        ttl: float | None = None,
+        idle: float | None = None,
+    ) -> None:
+        self.path = path or Config.FSM_DB_PATH
+        self.flush_interval = (
+            Config.FSM_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        )
+        self.ttl = Config.FSM_STATE_TTL if ttl is None else ttl
+        self.idle = Config.FSM_CACHE_IDLE if idle is None else idle
+        self._key_builder = DefaultKeyBuilder(
+            with_bot_id=True, with_business_connection_id=True, with_destiny=True
+        )
+        self._records: dict[str, _Record] = {}
+        self._dirty: set[str] = set()
+        self._flusher: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self._last_sweep = 0.0
+        self._pool = get_pool(self.path)
+        conn = self._pool.acquire()
+        try:
+            # WAL lets several bot processes (see supervisor.py) share the file
+            conn.execute(f"PRAGMA journal_mode={Config.DB_JOURNAL_MODE}")
+        finally:
+            self._pool.release(conn)
+        with self._pool.connection(immediate=True) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fsm ("
+                " key TEXT PRIMARY KEY,"
+                " state TEXT,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_fsm_updated_at ON fsm(updated_at)"
+            )
+
+    # ---- Database access (runs on the async_db executor) ----
+
+    def _load(self, name: str) -> _Record:
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT state, data, updated_at FROM fsm WHERE key = ?", (name,)
+            ).fetchone()
+        if row is None or row["updated_at"] < time.time() - self.ttl:
+            return _Record()
+        return _Record(row["state"], json.loads(row["data"]), row["updated_at"])
+
+    def _write(
+        self,
+        upserts: list[tuple[str, str | None, str, float]],
+        deletes: list[tuple[str]],
+        expired_before: float | None,
+    ) -> None:
+        with self._pool.connection(immediate=True) as conn:
+            if upserts:
+                conn.executemany(
+                    "INSERT INTO fsm (key, state, data, updated_at)"
+                    " VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET state = excluded.state,"
+                    " data = excluded.data, updated_at = excluded.updated_at",
+                    upserts,
+                )
+            if deletes:
+                conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+            if expired_before is not None:
+                conn.execute(
+                    "DELETE FROM fsm WHERE updated_at < ?", (expired_before,)
+                )
+
+    # ---- Cache ----
+
+    async def _get(self, key: StorageKey) -> tuple[str, _Record]:
+        name = self._key_builder.build(key)
+        record = self._records.get(name)
+        if record is None:
+            FSM_CACHE.inc(result="miss")
+            with FSM_SECONDS.time(operation="load"):
+                loaded = await async_db.run(self._load, name)
+            # Another task may have loaded or changed it in the meantime
+            record = self._records.setdefault(name, loaded)
+        else:
+            FSM_CACHE.inc(result="hit")
+        record.used = time.monotonic()
+        return name, record
+
+    def _changed(self, name: str, record: _Record) -> None:
+        record.updated = time.time()
+        self._dirty.add(name)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Failed to save FSM state to %s", self.path)
+
+    async def flush(self) -> None:
+        """Save changed conversations and forget idle or abandoned ones."""
+        async with self._flush_lock:
+            names, self._dirty = self._dirty, set()
+            upserts: list[tuple[str, str | None, str, float]] = []
+            deletes: list[tuple[str]] = []
+            for name in names:
+                record = self._records.get(name)
+                if record is None or record.empty:
+                    deletes.append((name,))
+                    continue
+                try:
+                    upserts.append(
+                        (name, record.state, _dumps(record.data), record.updated)
+                    )
+                except (TypeError, ValueError):
+                    logging.exception("FSM data of %s is not serialisable", name)
+
+            now = time.time()
+            expired_before = None
+            if now - self._last_sweep >= _SWEEP_INTERVAL:
+                expired_before = now - self.ttl
+
+            if upserts or deletes or expired_before is not None:
+                try:
+                    with FSM_SECONDS.time(operation="flush"):
+                        await async_db.run(
+                            self._write, upserts, deletes, expired_before
+                        )
+                except Exception:
+                    self._dirty |= names
+                    raise
+                if expired_before is not None:
+                    self._last_sweep = now
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        unused_before = time.monotonic() - self.idle
+        expired_before = now - self.ttl
+        for name, record in list(self._records.items()):
+            if name in self._dirty:
+                continue
+            if record.used < unused_before or (
+                not record.empty and record.updated < expired_before
+            ):
+                del self._records[name]
+
+    # ---- BaseStorage API ----
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        name, record = await self._get(key)
+        # State objects from StatesGroup carry their name in ``state``
+        record.state = getattr(state, "state", state)
+        self._changed(name, record)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        _, record = await self._get(key)
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        name, record = await self._get(key)
+        record.data = data.copy()
+        self._changed(name, record)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, record = await self._get(key)
+        return record.data.copy()
+
+    async def update_data(self, key: StorageKey, data: dict[str, Any]) -> dict[str, Any]:
+        name, record = await self._get(key)
+        record.data.update(data)
+        self._changed(name, record)
+        return record.data.copy()
+
+    async def get_value(
+        self, storage_key: StorageKey, dict_key: str, default: Any | None = None
+    ) -> Any | None:
+        _, record = await self._get(storage_key)
+        return copy(record.data.get(dict_key, default))
+
+    async def close(self) -> None:
+        """Stop the background flusher and save pending changes."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
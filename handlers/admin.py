@@ -1,15 +1,30 @@
 """Handlers for admin functionality."""
 
+import os
+import shutil
+import tempfile
+
 from aiogram import Dispatcher, types
+from aiogram.exceptions import TelegramEntityTooLarge
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
+import async_db
+import keyboards
 from config import Config
-from db import get_connection
-from metrics import get_bot_statistics
+from async_db import (
+    get_latest_broadcasts,
+    get_latest_cargo,
+    get_latest_trucks,
+    get_latest_users,
+)
+from broadcast import CANCELLED, DONE, RUNNING, get_broadcaster
+from bulk_import import KINDS, import_file
+from export import FORMATS, TABLES, export_filename, parse_export_date, write_export
+from metrics import get_statistics
 from .common import get_main_menu
-from utils import format_date_for_display
+from utils import clear_city_cache, format_date_for_display
 
 
 def is_admin(user_id: int) -> bool:
@@ -19,19 +34,9 @@ def is_admin(user_id: int) -> bool:
 
 
 def get_admin_menu() -> types.ReplyKeyboardMarkup:
-    """Return keyboard with available admin actions."""
-
-    buttons = [
-        [types.KeyboardButton(text="Статистика")],
-        [types.KeyboardButton(text="Пользователи")],
-        [types.KeyboardButton(text="Активные грузы")],
-        [types.KeyboardButton(text="Активные ТС")],
-        [types.KeyboardButton(text="Рассылка")],
-        [types.KeyboardButton(text="↩️ Выход")],
-    ]
-    return types.ReplyKeyboardMarkup(
-        keyboard=buttons, resize_keyboard=True, one_time_keyboard=False
-    )
+    """Return the shared keyboard with available admin actions."""
+
+    return keyboards.admin_menu()
 
 
 class AdminStates(StatesGroup):
@@ -55,12 +60,19 @@ async def show_statistics(message: types.Message) -> None:
     if not is_admin(message.from_user.id):
         return
 
-    total, new = get_bot_statistics()
-    text = (
-        f"Всего пользователей: {total}\n"
-        f"Зарегистрировано за 24ч: {new}"
-    )
-    await message.answer(text)
+    totals, windows = await async_db.run(get_statistics)
+    lines = [
+        f"Всего пользователей: {totals['users']}",
+        f"Грузов: {totals['cargo']}, ТС: {totals['trucks']}",
+    ]
+    for title, w in windows:
+        lines.append(
+            f"\nЗа {title}:\n"
+            f"Зарегистрировано: {w.users}\n"
+            f"Добавлено грузов: {w.cargo}, ТС: {w.trucks}\n"
+            f"Поисков грузов: {w.cargo_search}, ТС: {w.truck_search}"
+        )
+    await message.answer("\n".join(lines))
 
 
 async def list_users(message: types.Message) -> None:
@@ -69,13 +81,7 @@ async def list_users(message: types.Message) -> None:
     if not is_admin(message.from_user.id):
         return
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT name, city, phone, created_at FROM users ORDER BY created_at DESC LIMIT 20"
-    )
-    rows = cur.fetchall()
-    conn.close()
+    rows = await get_latest_users(20)
 
     if not rows:
         await message.answer("Пользователи не найдены.")
@@ -96,13 +102,7 @@ async def list_cargo(message: types.Message) -> None:
     if not is_admin(message.from_user.id):
         return
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, city_from, city_to, date_from, weight FROM cargo ORDER BY created_at DESC LIMIT 10"
-    )
-    rows = cur.fetchall()
-    conn.close()
+    rows = await get_latest_cargo(10)
 
     if not rows:
         await message.answer("Активных грузов нет.")
@@ -125,13 +125,7 @@ async def list_trucks(message: types.Message) -> None:
     if not is_admin(message.from_user.id):
         return
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, city, date_from, weight FROM trucks ORDER BY created_at DESC LIMIT 10"
-    )
-    rows = cur.fetchall()
-    conn.close()
+    rows = await get_latest_trucks(10)
 
     if not rows:
         await message.answer("Активных ТС нет.")
@@ -147,6 +141,143 @@ async def list_trucks(message: types.Message) -> None:
     await message.answer(text)
 
 
+EXPORT_USAGE = (
+    "Выгрузка в файл (.gz):\n"
+    "/export <таблица> [csv|jsonl] [с ДД.ММ.ГГГГ] [по ДД.ММ.ГГГГ]\n\n"
+    f"Таблицы: {', '.join(TABLES)}. Даты — по дате создания записи.\n"
+    "Например: /export cargo jsonl 01.01.2024 31.01.2024"
+)
+
+
+def parse_export_args(
+    args: list[str],
+) -> tuple[str, str, str | None, str | None] | None:
+    """Return ``(table, format, date_from, date_to)`` or ``None`` if invalid."""
+
+    if not args or args[0].lower() not in TABLES:
+        return None
+    table, fmt, dates = args[0].lower(), "csv", []
+    for arg in args[1:]:
+        if arg.lower() in FORMATS:
+            fmt = arg.lower()
+            continue
+        try:
+            dates.append(parse_export_date(arg))
+        except ValueError:
+            return None
+    if len(dates) > 2:
+        return None
+    date_from, date_to = (dates + [None, None])[:2]
+    return table, fmt, date_from, date_to
+
+
+async def show_export_help(message: types.Message) -> None:
+    """Explain the /export command."""
+
+    if not is_admin(message.from_user.id):
+        return
+
+    await message.answer(EXPORT_USAGE)
+
+
+async def cmd_export(message: types.Message) -> None:
+    """Send a table as a gzip-compressed CSV/JSONL document."""
+
+    if not is_admin(message.from_user.id):
+        return
+
+    parsed = parse_export_args(message.text.split()[1:])
+    if parsed is None:
+        await message.answer(EXPORT_USAGE)
+        return
+    table, fmt, date_from, date_to = parsed
+
+    filename = export_filename(table, fmt, date_from, date_to)
+    tmp_dir = tempfile.mkdtemp(prefix="export-")
+    path = os.path.join(tmp_dir, filename)
+    try:
+        # Строки пишутся в файл потоком на потоке БД, не занимая память
+        count = await async_db.run(write_export, path, table, fmt, date_from, date_to)
+        try:
+            await message.answer_document(
+                types.FSInputFile(path, filename=filename),
+                caption=f"{table}: {count} строк",
+            )
+        except TelegramEntityTooLarge:
+            await message.answer(
+                "Файл больше лимита Telegram. Сузьте диапазон дат или "
+                "выгрузите на сервере: python export.py " + table
+            )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+IMPORT_USAGE = (
+    "Загрузка объявлений из CSV (из Excel: «Сохранить как» → CSV):\n"
+    "пришлите файл с подписью /import <cargo|trucks> [Telegram ID владельца]\n\n"
+    "Колонки грузов: region_from, city_from, region_to, city_to, date_from, "
+    "date_to, weight, body_type, is_local, comment.\n"
+    "Колонки ТС: region, city, date_from, date_to, weight, body_type, "
+    "direction, route_regions, comment.\n"
+    "Колонка owner_telegram_id задаёт владельца строки, иначе — указанный "
+    "в подписи или вы."
+)
+# Ошибки, которые показываются в сообщении; полный список — файлом
+IMPORT_ERRORS_SHOWN = 10
+
+
+async def show_import_help(message: types.Message) -> None:
+    """Explain how to upload listings."""
+
+    if not is_admin(message.from_user.id):
+        return
+
+    await message.answer(IMPORT_USAGE)
+
+
+async def cmd_import(message: types.Message) -> None:
+    """Import cargo or truck listings from an uploaded CSV document."""
+
+    if not is_admin(message.from_user.id):
+        return
+
+    args = (message.caption or message.text or "").split()[1:]
+    if not message.document or not args or args[0].lower() not in KINDS:
+        await message.answer(IMPORT_USAGE)
+        return
+    kind = args[0].lower()
+    owner = message.from_user.id
+    if len(args) > 1:
+        if not args[1].isdigit():
+            await message.answer(IMPORT_USAGE)
+            return
+        owner = int(args[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix="import-")
+    try:
+        path = os.path.join(tmp_dir, "listings.csv")
+        await message.bot.download(message.document, destination=path)
+        # Файл читается построчно, строки вставляются пачками на потоке БД
+        report = await async_db.run(import_file, kind, path, owner)
+        if report.imported:
+            clear_city_cache()
+
+        lines = [f"Импортировано: {report.imported}, с ошибками: {report.failed}."]
+        for line, error in report.errors[:IMPORT_ERRORS_SHOWN]:
+            lines.append(f"Строка {line}: {error}")
+        await message.answer("\n".join(lines))
+
+        if report.failed > IMPORT_ERRORS_SHOWN:
+            errors_path = os.path.join(tmp_dir, "errors.csv")
+            report.write_errors(errors_path)
+            await message.answer_document(
+                types.FSInputFile(errors_path, filename=f"{kind}_import_errors.csv"),
+                caption="Все строки с ошибками",
+            )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
 async def start_broadcast(message: types.Message, state: FSMContext) -> None:
     """Ask admin for broadcast text."""
 
@@ -158,27 +289,75 @@ async def start_broadcast(message: types.Message, state: FSMContext) -> None:
 
 
 async def process_broadcast(message: types.Message, state: FSMContext) -> None:
-    """Send broadcast message to all users."""
+    """Start a background broadcast of the message to all users."""
 
     if not is_admin(message.from_user.id):
         await state.clear()
         return
 
-    text = message.text
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT telegram_id FROM users")
-    rows = cur.fetchall()
-    conn.close()
+    broadcast_id = await get_broadcaster(message.bot).start(
+        message.text, message.from_user.id
+    )
+
+    await state.clear()
+    await message.answer(
+        f"Рассылка #{broadcast_id} запущена. Ход выполнения — "
+        "в «Статус рассылок», по окончании придёт отчёт.",
+        reply_markup=get_admin_menu(),
+    )
+
+
+BROADCAST_STATUS_NAMES = {
+    RUNNING: "идёт",
+    DONE: "завершена",
+    CANCELLED: "отменена",
+}
+
+
+async def show_broadcasts(message: types.Message) -> None:
+    """Show progress of the latest broadcasts."""
+
+    if not is_admin(message.from_user.id):
+        return
+
+    rows = await get_latest_broadcasts(5)
+
+    if not rows:
+        await message.answer("Рассылок ещё не было.")
+        return
 
+    lines = ["Рассылки:\n"]
+    kb: list[list[types.InlineKeyboardButton]] = []
     for r in rows:
-        try:
-            await message.bot.send_message(r["telegram_id"], text)
-        except Exception:
-            pass
+        done = r["sent"] + r["failed"] + r["blocked"]
+        status = BROADCAST_STATUS_NAMES.get(r["status"], r["status"])
+        preview = r["text"] if len(r["text"]) <= 30 else r["text"][:29] + "…"
+        lines.append(
+            f"#{r['id']} «{preview}» — {status}: {done}/{r['total']}, "
+            f"доставлено {r['sent']}, ошибок {r['failed']}, "
+            f"заблокировали {r['blocked']}"
+        )
+        if r["status"] == RUNNING:
+            kb.append([
+                types.InlineKeyboardButton(
+                    text=f"⏹ Остановить #{r['id']}",
+                    callback_data=f"bc_cancel:{r['id']}",
+                )
+            ])
+    markup = types.InlineKeyboardMarkup(inline_keyboard=kb) if kb else None
+    await message.answer("\n".join(lines), reply_markup=markup)
+
+
+async def cancel_broadcast(callback: types.CallbackQuery) -> None:
+    """Stop the selected broadcast."""
+
+    if not is_admin(callback.from_user.id):
+        await callback.answer()
+        return
 
-    await state.clear()
-    await message.answer("Рассылка завершена.", reply_markup=get_admin_menu())
+    broadcast_id = int(callback.data.split(":")[1])
+    await get_broadcaster(callback.bot).cancel(broadcast_id)
+    await callback.answer(f"Рассылка #{broadcast_id} остановлена")
 
 
 async def exit_admin(message: types.Message, state: FSMContext) -> None:
@@ -192,10 +371,19 @@ def register_admin_handlers(dp: Dispatcher) -> None:
     """Register admin command handlers."""
 
     dp.message.register(cmd_admin, Command(commands=["admin"]))
+    dp.message.register(cmd_export, Command(commands=["export"]))
+    dp.message.register(cmd_import, Command(commands=["import"]))
     dp.message.register(process_broadcast, StateFilter(AdminStates.broadcast))
     dp.message.register(show_statistics, lambda m: m.text == "Статистика")
     dp.message.register(list_users, lambda m: m.text == "Пользователи")
     dp.message.register(list_cargo, lambda m: m.text == "Активные грузы")
     dp.message.register(list_trucks, lambda m: m.text == "Активные ТС")
     dp.message.register(start_broadcast, lambda m: m.text == "Рассылка")
+    dp.message.register(show_broadcasts, lambda m: m.text == "Статус рассылок")
+    dp.message.register(show_export_help, lambda m: m.text == "Экспорт")
+    dp.message.register(show_import_help, lambda m: m.text == "Импорт")
+    dp.callback_query.register(
+        cancel_broadcast,
+        lambda c: c.data.startswith("bc_cancel:"),
+    )
     dp.message.register(exit_admin, lambda m: m.text == "↩️ Выход")
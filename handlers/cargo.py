@@ -7,8 +7,10 @@ from aiogram.fsm.state import State
 from states import BaseStates, CargoEditStates
 from datetime import datetime
 
-from db import (
-    get_connection,
+import async_db
+import keyboards
+from async_db import (
+    add_cargo,
     update_cargo_weight,
     update_cargo_route,
     update_cargo_dates,
@@ -18,14 +20,20 @@ from db import (
 from .common import (
     get_main_menu,
     ask_and_store,
-    show_search_results,
+    cleanup_messages,
+    start_search,
+    format_search_results,
+    SEARCH_PAGE_SIZE,
+    resolve_city_input,
     process_weight_step,
     parse_and_store_date,
 )
 
+from matching import match_cargo
 from calendar_keyboard import generate_calendar, handle_calendar_callback
+from config import Config
+from conversation import NO_DATE, CargoDraft, CargoEdit, CargoSearch
 from utils import (
-    get_current_user_id,
     format_date_for_display,
     log_user_action,
     get_unique_cities_from,
@@ -34,8 +42,9 @@ from utils import (
     validate_weight,
 )
 from locations import (
-    get_regions,
-    get_cities,
+    is_region,
+    is_city,
+    normalize_region,
 )
 
 
@@ -61,19 +70,13 @@ class CargoSearchStates(BaseStates):
 
 # ========== СЦЕНАРИЙ: ДОБАВЛЕНИЕ ГРУЗА ==========
 
-async def cmd_start_add_cargo(message: types.Message, state: FSMContext):
-    user_id = await get_current_user_id(message)
+async def cmd_start_add_cargo(message: types.Message, state: FSMContext, user_id: int | None = None):
     if not user_id:
         await message.answer("Сначала зарегистрируйся через /start.")
         return
 
     # Сразу показываем все регионы (без пагинации)
-    regions = get_regions()
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[types.KeyboardButton(text=region)] for region in regions],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    kb = keyboards.regions()
     await ask_and_store(
         message,
         state,
@@ -85,100 +88,86 @@ async def cmd_start_add_cargo(message: types.Message, state: FSMContext):
 
 async def process_region_from(message: types.Message, state: FSMContext):
     text = message.text.strip()
-    all_regions = get_regions()
-    if text not in all_regions:
+    region = text if is_region(text) else normalize_region(text)
+    if not region:
         await message.answer("Пожалуйста, выбери регион из списка.")
         return
 
-    await state.update_data(region_from=text)
-    # Показываем все города выбранного региона
-    cities = get_cities(text)
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[types.KeyboardButton(text=city)] for city in cities],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    draft = await CargoDraft.load(state)
+    draft.region_from = region
+    # Вместо списка всех городов региона предлагаем ввести начало названия
     await ask_and_store(
         message,
         state,
-        "Откуда (город):",
+        "Откуда (город)? Введи первые буквы названия:",
         CargoAddStates.city_from,
-        reply_markup=kb,
+        reply_markup=types.ReplyKeyboardRemove(),
+        flow=draft,
     )
 
 
 async def process_city_from(message: types.Message, state: FSMContext):
     text = message.text.strip()
-    data = await state.get_data()
-    region = data.get("region_from")
+    draft = await CargoDraft.load(state)
+    region = draft.region_from
     if not region:
         # На всякий случай, если state потерялся
         await message.answer("Попробуйте снова: выберите регион отправления.")
         await state.clear()
         return
 
-    cities = get_cities(region)
-    if text not in cities:
-        await message.answer("Пожалуйста, выбери город из списка.")
+    city = text if is_city(region, text) else await resolve_city_input(message, region)
+    if not city:
         return
 
-    await state.update_data(city_from=text)
+    draft.city_from = city
 
     # Теперь выбираем регион назначения (опять же, весь список)
-    regions = get_regions()
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[types.KeyboardButton(text=region)] for region in regions],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    kb = keyboards.regions()
     await ask_and_store(
         message,
         state,
         "Регион назначения:",
         CargoAddStates.region_to,
         reply_markup=kb,
+        flow=draft,
     )
 
 
 async def process_region_to(message: types.Message, state: FSMContext):
     text = message.text.strip()
-    all_regions = get_regions()
-    if text not in all_regions:
+    region = text if is_region(text) else normalize_region(text)
+    if not region:
         await message.answer("Пожалуйста, выбери регион из списка.")
         return
 
-    await state.update_data(region_to=text)
-    # Показываем все города выбранного региона назначения
-    cities = get_cities(text)
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[types.KeyboardButton(text=city)] for city in cities],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    draft = await CargoDraft.load(state)
+    draft.region_to = region
     await ask_and_store(
         message,
         state,
-        "Куда (город):",
+        "Куда (город)? Введи первые буквы названия:",
         CargoAddStates.city_to,
-        reply_markup=kb,
+        reply_markup=types.ReplyKeyboardRemove(),
+        flow=draft,
     )
 
 
 async def process_city_to(message: types.Message, state: FSMContext):
     text = message.text.strip()
-    data = await state.get_data()
-    region = data.get("region_to")
+    draft = await CargoDraft.load(state)
+    region = draft.region_to
     if not region:
         await message.answer("Попробуйте снова: выберите регион назначения.")
         await state.clear()
         return
 
-    cities = get_cities(region)
-    if text not in cities:
-        await message.answer("Пожалуйста, выбери город из списка.")
+    city = text if is_city(region, text) else await resolve_city_input(message, region)
+    if not city:
         return
 
-    await state.update_data(city_to=text)
+    draft.city_to = city
+    draft.use_calendar("date_from")
     # Переходим к выбору даты отправления через календарь
     await ask_and_store(
         message,
@@ -186,46 +175,37 @@ async def process_city_to(message: types.Message, state: FSMContext):
         "Дата отправления:",
         CargoAddStates.date_from,
         reply_markup=generate_calendar(),
-    )
-    await state.update_data(
-        calendar_field="date_from",
-        calendar_next_state=CargoAddStates.date_to,
-        calendar_next_text="Дата прибытия:",
-        calendar_next_markup=generate_calendar(),
-        calendar_include_skip=False,
+        flow=draft,
     )
 
 
 async def process_date_from(message: types.Message, state: FSMContext):
+    draft = await CargoDraft.load(state)
     ok = await parse_and_store_date(
         message,
-        state,
+        draft,
         "date_from",
         "Неверный формат даты. Введите ДД.MM.ГГГГ:",
     )
     if not ok:
         return
 
+    draft.use_calendar("date_to")
     await ask_and_store(
         message,
         state,
         "Дата прибытия:",
         CargoAddStates.date_to,
         reply_markup=generate_calendar(),
-    )
-    await state.update_data(
-        calendar_field="date_to",
-        calendar_next_state=CargoAddStates.weight,
-        calendar_next_text="Вес (в тоннах, цифрой):",
-        calendar_next_markup=None,
-        calendar_include_skip=False,
+        flow=draft,
     )
 
 
 async def process_date_to(message: types.Message, state: FSMContext):
+    draft = await CargoDraft.load(state)
     ok = await parse_and_store_date(
         message,
-        state,
+        draft,
         "date_to",
         "Неверный формат даты. Введите ДД.MM.ГГГГ:",
         compare_field="date_from",
@@ -234,13 +214,14 @@ async def process_date_to(message: types.Message, state: FSMContext):
     if not ok:
         return
 
+    draft.use_calendar(None)
     await ask_and_store(
         message,
         state,
         "Вес (в тоннах, цифрой):",
-        CargoAddStates.weight
+        CargoAddStates.weight,
+        flow=draft,
     )
-    await state.update_data(calendar_field=None)
 
 async def process_weight(message: types.Message, state: FSMContext):
     """Store cargo weight after validating the user input."""
@@ -252,6 +233,7 @@ async def process_weight(message: types.Message, state: FSMContext):
         "Не важно",
         "Пожалуйста, введи вес от 1 до 1000 тонн цифрой (например, 12):",
         validate_func=validate_weight,
+        flow_cls=CargoDraft,
     )
 
 
@@ -261,22 +243,17 @@ async def process_body_type(message: types.Message, state: FSMContext):
         await message.answer("Пожалуйста, нажми одну из кнопок:\n«Рефрижератор», «Тент», «Изотерм» или «Не важно».")
         return
 
-    await state.update_data(body_type=text)
+    draft = await CargoDraft.load(state)
+    draft.body_type = text
 
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[
-            [types.KeyboardButton(text="Да (внутригородской)")],
-            [types.KeyboardButton(text="Нет (междугородний)")]
-        ],
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    kb = keyboards.column(("Да (внутригородской)", "Нет (междугородний)"))
     await ask_and_store(
         message,
         state,
         "Внутригородской груз?",
         CargoAddStates.is_local,
-        reply_markup=kb
+        reply_markup=kb,
+        flow=draft,
     )
 
 
@@ -286,114 +263,78 @@ async def process_is_local(message: types.Message, state: FSMContext):
         await message.answer("Пожалуйста, нажми «Да (внутригородской)» или «Нет (междугородний)».")
         return
 
-    is_local = 1 if "да" in text else 0
-    await state.update_data(is_local=is_local)
+    draft = await CargoDraft.load(state)
+    draft.is_local = 1 if "да" in text else 0
     await ask_and_store(
         message,
         state,
         "Добавь комментарий (или напиши 'нет'):",
-        CargoAddStates.comment
+        CargoAddStates.comment,
+        flow=draft,
     )
 
 
-async def process_comment(message: types.Message, state: FSMContext):
+async def process_comment(message: types.Message, state: FSMContext, user_id: int | None = None):
     text = message.text.strip()
     comment = text if text.lower() != "нет" else ""
-    data = await state.get_data()
+    draft = await CargoDraft.load(state)
 
-    required_fields = [
-        "city_from", "region_from", "city_to", "region_to",
-        "date_from", "date_to", "weight", "body_type", "is_local"
-    ]
-    if not all(field in data for field in required_fields):
+    if not draft.is_complete():
         await message.answer("Что-то пошло не так. Попробуй «➕ Добавить груз» ещё раз.")
         await state.clear()
         return
 
-    user_id = await get_current_user_id(message)
     if not user_id:
         await message.answer("Не удалось найти профиль. Сначала /start.")
         await state.clear()
         return
 
-    # Удаляем сообщение пользователя (с комментарием)
-    await message.delete()
-    # Удаляем последний бот-вопрос и прогресс
-    bot_data = await state.get_data()
-    last_bot_msg_id = bot_data.get("last_bot_message_id")
-    if last_bot_msg_id:
-        try:
-            await message.chat.delete_message(last_bot_msg_id)
-        except Exception:
-            pass
-
     # Вставляем запись в БД
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO cargo (
-                user_id,
-                city_from, region_from,
-                city_to, region_to,
-                date_from, date_to,
-                weight, body_type,
-                is_local, comment, created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                user_id,
-                data["city_from"], data["region_from"],
-                data["city_to"], data["region_to"],
-                data["date_from"], data["date_to"],
-                data["weight"], data["body_type"],
-                data["is_local"], comment,
-                datetime.now().isoformat()
-            )
-        )
-        conn.commit()
+    await add_cargo(
+        user_id,
+        draft.city_from, draft.region_from,
+        draft.city_to, draft.region_to,
+        draft.date_from, draft.date_to,
+        draft.weight, draft.body_type,
+        draft.is_local, comment,
+        datetime.now().isoformat(),
+    )
 
     clear_city_cache()
 
     await message.answer("✅ Груз успешно добавлен!", reply_markup=get_main_menu())
+    # Сообщение с комментарием и последний бот-вопрос удаляются в фоне
+    cleanup_messages(message, draft.last_bot_message_id)
     log_user_action(user_id, "cargo_added")
     await state.clear()
 
 
 # ========== СЦЕНАРИЙ: ПОИСК ГРУЗА С КНОПКАМИ ==========
 
-async def cmd_start_find_cargo(message: types.Message, state: FSMContext):
+async def cmd_start_find_cargo(message: types.Message, state: FSMContext, user_id: int | None = None):
     """
     Запускает поиск груза. Вместо свободного текста сразу выдаёт клавиатуру
     со всеми возможными городами-отправлениями + кнопку "Все".
     """
-    user_id = await get_current_user_id(message)
     if not user_id:
         await message.answer("Сначала зарегистрируйся через /start.")
         return
 
-    # Удаляем сообщение-инициатор (нажатие "🔍 Найти груз")
-    await message.delete()
+    # Сообщение-инициатор (нажатие "🔍 Найти груз") удаляется в фоне
+    cleanup_messages(message)
 
     # Получаем список уникальных городов отправления
-    cities = get_unique_cities_from()
+    cities = await async_db.run(get_unique_cities_from)
 
-    # Строим клавиатуру: каждая строка — один город, и внизу кнопка "Все"
-    kb_buttons = [[types.KeyboardButton(text=city)] for city in cities]
-    kb_buttons.append([types.KeyboardButton(text="Все")])
-
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=kb_buttons,
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    # Клавиатура: каждая строка — один город, и внизу кнопка "Все"
+    kb = keyboards.column((*cities, "Все"))
 
     bot_msg = await message.answer(
         "🔍 Поиск груза.\nВыберите город отправления (или нажмите «Все»):",
         reply_markup=kb
     )
-    # Сохраняем ID последнего бот-сообщения, чтобы потом можно было его удалить
-    await state.update_data(last_bot_message_id=bot_msg.message_id)
+    # Начинаем с пустых фильтров и запоминаем вопрос, чтобы потом его удалить
+    await CargoSearch(last_bot_message_id=bot_msg.message_id).save(state)
 
     await state.set_state(CargoSearchStates.city_from)
 
@@ -402,169 +343,95 @@ async def filter_city_from(message: types.Message, state: FSMContext):
     """
     Получаем город отправления (либо "Все"), далее предлагаем выбрать город назначения.
     """
-    selected = message.text.strip()
-    # Сохраняем выбранный фильтр
-    await state.update_data(filter_city_from=selected.lower())
-
-    # Удалим сообщение пользователя (кнопка) и предыдущий вопрос бота
-    await message.delete()
-    data = await state.get_data()
-    prev_bot_id = data.get("last_bot_message_id")
-    if prev_bot_id:
-        try:
-            await message.chat.delete_message(prev_bot_id)
-        except Exception:
-            pass
+    search = await CargoSearch.load(state)
+    search.filter_city_from = message.text.strip().lower()
 
     # Теперь предлагаем выбрать город назначения
-    to_cities = get_unique_cities_to()
-    kb_buttons = [[types.KeyboardButton(text=city)] for city in to_cities]
-    kb_buttons.append([types.KeyboardButton(text="Все")])
-
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=kb_buttons,
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    to_cities = await async_db.run(get_unique_cities_to)
+    kb = keyboards.column((*to_cities, "Все"))
 
-    bot_msg = await message.answer(
+    # Удалим сообщение пользователя (кнопка) и предыдущий вопрос бота
+    await ask_and_store(
+        message,
+        state,
         "Введите город назначения (или нажмите «Все»):",
-        reply_markup=kb
+        CargoSearchStates.city_to,
+        reply_markup=kb,
+        flow=search,
     )
-    await state.update_data(last_bot_message_id=bot_msg.message_id)
-    await state.set_state(CargoSearchStates.city_to)
 
 
 async def filter_city_to(message: types.Message, state: FSMContext):
     """
     Получаем город назначения (либо "Все"), далее спрашиваем дату отправления (min/max).
     """
-    selected = message.text.strip()
-    await state.update_data(filter_city_to=selected.lower())
-
-    # Удаляем сообщение пользователя и предыдущее бот-сообщение
-    await message.delete()
-    data = await state.get_data()
-    prev_bot_id = data.get("last_bot_message_id")
-    if prev_bot_id:
-        try:
-            await message.chat.delete_message(prev_bot_id)
-        except Exception:
-            pass
+    search = await CargoSearch.load(state)
+    search.filter_city_to = message.text.strip().lower()
+    search.use_calendar("filter_date_from", include_skip=True)
 
     # Спрашиваем минимальную дату отправления
-    bot_msg = await message.answer(
+    await ask_and_store(
+        message,
+        state,
         "Минимальная дата отправления:",
-        reply_markup=generate_calendar(include_skip=True)
+        CargoSearchStates.date_from,
+        reply_markup=generate_calendar(include_skip=True),
+        flow=search,
     )
-    await state.update_data(
-        last_bot_message_id=bot_msg.message_id,
-        calendar_field="filter_date_from",
-        calendar_next_state=CargoSearchStates.date_to,
-        calendar_next_text="Максимальная дата отправления:",
-        calendar_next_markup=generate_calendar(include_skip=True),
-        calendar_include_skip=True,
-    )
-    await state.set_state(CargoSearchStates.date_from)
 
 
 async def filter_date_from(message: types.Message, state: FSMContext):
+    search = await CargoSearch.load(state)
     raw = message.text.strip().lower()
-    if raw != "нет":
+    if raw != NO_DATE:
         ok = await parse_and_store_date(
             message,
-            state,
+            search,
             "filter_date_from",
             "Неверный формат даты. Введите ДД.MM.ГГГГ или «нет».",
         )
         if not ok:
             return
     else:
-        await state.update_data(filter_date_from="нет")
-
-    # Удаляем сообщение пользователя и предыдущий бот-вопрос
-    await message.delete()
-    data = await state.get_data()
-    prev_bot_id = data.get("last_bot_message_id")
-    if prev_bot_id:
-        try:
-            await message.chat.delete_message(prev_bot_id)
-        except Exception:
-            pass
+        search.filter_date_from = NO_DATE
 
     # Спрашиваем максимальную дату отправления
-    bot_msg = await message.answer(
+    search.use_calendar("filter_date_to", include_skip=True)
+    await ask_and_store(
+        message,
+        state,
         "Максимальная дата отправления:",
-        reply_markup=generate_calendar(include_skip=True)
-    )
-    await state.update_data(
-        last_bot_message_id=bot_msg.message_id,
-        calendar_field="filter_date_to",
-        calendar_next_state=CargoSearchStates.date_to,
-        calendar_next_text="",
-        calendar_next_markup=None,
-        calendar_include_skip=True,
+        CargoSearchStates.date_to,
+        reply_markup=generate_calendar(include_skip=True),
+        flow=search,
     )
-    await state.set_state(CargoSearchStates.date_to)
 
 
-async def filter_date_to(message: types.Message, state: FSMContext):
+async def filter_date_to(message: types.Message, state: FSMContext, user_id: int | None = None):
+    search = await CargoSearch.load(state)
     raw = message.text.strip().lower()
-    if raw != "нет":
+    if raw != NO_DATE:
         ok = await parse_and_store_date(
             message,
-            state,
+            search,
             "filter_date_to",
             "Неверный формат даты. Введите ДД.MM.ГГГГ или «нет».",
         )
         if not ok:
             return
     else:
-        await state.update_data(filter_date_to="нет")
-
-    data = await state.get_data()
-    user_id = await get_current_user_id(message)
-    fc_from = data.get("filter_city_from", "")
-    fc_to = data.get("filter_city_to", "")
-    fd_from = data.get("filter_date_from", "")
-    fd_to = data.get("filter_date_to", "")
-
-    base_query = """
-    SELECT c.id, u.name, c.city_from, c.region_from, c.city_to, c.region_to, c.date_from, c.weight, c.body_type
-    FROM cargo c
-    JOIN users u ON c.user_id = u.id
-    WHERE 1=1
-    """
-    filters = [
-        (fc_from if fc_from != "все" else None, " AND lower(c.city_from) = ?"),
-        (fc_to if fc_to != "все" else None, " AND lower(c.city_to) = ?"),
-        (fd_from if fd_from != "нет" else None, " AND date(c.date_from) >= date(?)"),
-        (fd_to if fd_to != "нет" else None, " AND date(c.date_from) <= date(?)"),
-    ]
-    query, params = build_search_query(base_query, filters)
-
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, tuple(params))
-    rows = cursor.fetchall()
-    conn.close()
-
-    # Удаляем последнее сообщение пользователя и предыдущий бот-вопрос
-    await message.delete()
-    prev_bot_id = data.get("last_bot_message_id")
-    if prev_bot_id:
-        try:
-            await message.chat.delete_message(prev_bot_id)
-        except Exception:
-            pass
-
-    if not rows:
-        await message.answer("📬 По вашему запросу ничего не найдено.", reply_markup=get_main_menu())
-    else:
-        await show_search_results(message, rows)
+        search.filter_date_to = NO_DATE
 
-    log_user_action(user_id, "cargo_search", f"results={len(rows)}")
-    await state.clear()
+    shown = await start_search(
+        message,
+        state,
+        "cargo",
+        search.filters(),
+        "📬 По вашему запросу ничего не найдено.",
+    )
+    # Последнее сообщение пользователя и предыдущий бот-вопрос удаляются в фоне
+    cleanup_messages(message, search.last_bot_message_id)
+    log_user_action(user_id, "cargo_search", f"results={shown}")
 
 
 # ========== СЦЕНАРИЙ: РЕДАКТИРОВАНИЕ/УДАЛЕНИЕ ГРУЗА ==========
@@ -572,7 +439,7 @@ async def filter_date_to(message: types.Message, state: FSMContext):
 async def handle_edit_cargo(callback: types.CallbackQuery):
     """Show edit options for selected cargo."""
     cargo_id = int(callback.data.split(":")[1])
-    row = get_cargo(cargo_id)
+    row = await get_cargo(cargo_id)
     if not row:
         await callback.answer()
         return
@@ -588,6 +455,7 @@ async def handle_edit_cargo(callback: types.CallbackQuery):
             [types.InlineKeyboardButton(text="Маршрут", callback_data=f"edit_cargo_route:{row['id']}")],
             [types.InlineKeyboardButton(text="Даты", callback_data=f"edit_cargo_dates:{row['id']}")],
             [types.InlineKeyboardButton(text="Вес", callback_data=f"edit_cargo_weight:{row['id']}")],
+            [types.InlineKeyboardButton(text="🚚 Подходящие ТС", callback_data=f"match_cargo:{row['id']}")],
             [types.InlineKeyboardButton(text="❌ Удалить", callback_data=f"del_cargo:{row['id']}")],
         ]
     )
@@ -595,9 +463,21 @@ async def handle_edit_cargo(callback: types.CallbackQuery):
     await callback.answer()
 
 
+async def show_cargo_matches(callback: types.CallbackQuery):
+    """Show trucks that fit the selected cargo."""
+    cargo_id = int(callback.data.split(":")[1])
+    matches = await async_db.run(match_cargo, cargo_id, SEARCH_PAGE_SIZE)
+    if not matches:
+        await callback.message.answer("🚚 Подходящих ТС пока нет.")
+    else:
+        text, _ = format_search_results([m.row for m in matches], 0, False)
+        await callback.message.answer(text)
+    await callback.answer()
+
+
 async def start_edit_cargo_weight(callback: types.CallbackQuery, state: FSMContext):
     cargo_id = int(callback.data.split(":")[1])
-    await state.update_data(edit_cargo_id=cargo_id)
+    await CargoEdit(edit_cargo_id=cargo_id).save(state)
     await callback.message.answer("Новый вес (тонны):")
     await state.set_state(CargoEditStates.weight)
     await callback.answer()
@@ -605,13 +485,8 @@ async def start_edit_cargo_weight(callback: types.CallbackQuery, state: FSMConte
 
 async def start_edit_cargo_route(callback: types.CallbackQuery, state: FSMContext):
     cargo_id = int(callback.data.split(":")[1])
-    await state.update_data(edit_cargo_id=cargo_id)
-    regions = get_regions()
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[types.KeyboardButton(text=r)] for r in regions],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    await CargoEdit(edit_cargo_id=cargo_id).save(state)
+    kb = keyboards.regions()
     await callback.message.answer("Новый регион отправления:", reply_markup=kb)
     await state.set_state(CargoEditStates.route_region_from)
     await callback.answer()
@@ -619,17 +494,12 @@ async def start_edit_cargo_route(callback: types.CallbackQuery, state: FSMContex
 
 async def start_edit_cargo_dates(callback: types.CallbackQuery, state: FSMContext):
     cargo_id = int(callback.data.split(":")[1])
-    await state.update_data(edit_cargo_id=cargo_id)
+    edit = CargoEdit(edit_cargo_id=cargo_id)
+    edit.use_calendar("date_from")
+    await edit.save(state)
     await callback.message.answer(
         "Новая дата отправления:", reply_markup=generate_calendar()
     )
-    await state.update_data(
-        calendar_field="date_from",
-        calendar_next_state=CargoEditStates.date_to,
-        calendar_next_text="Новая дата прибытия:",
-        calendar_next_markup=generate_calendar(),
-        calendar_include_skip=False,
-    )
     await state.set_state(CargoEditStates.date_from)
     await callback.answer()
 
@@ -640,10 +510,9 @@ async def process_edit_weight(message: types.Message, state: FSMContext):
     if not ok:
         await message.answer("Введите число от 1 до 1000:")
         return
-    data = await state.get_data()
-    cid = data.get("edit_cargo_id")
-    if cid:
-        update_cargo_weight(cid, weight)
+    edit = await CargoEdit.load(state)
+    if edit.edit_cargo_id:
+        await update_cargo_weight(edit.edit_cargo_id, weight)
         clear_city_cache()
     await message.answer("Запись обновлена.", reply_markup=get_main_menu())
     await state.clear()
@@ -651,61 +520,63 @@ async def process_edit_weight(message: types.Message, state: FSMContext):
 
 async def process_edit_route_region_from(message: types.Message, state: FSMContext):
     """Store new origin region and ask for city."""
-    region = message.text.strip()
-    await state.update_data(new_region_from=region)
-    cities = get_cities(region)
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[types.KeyboardButton(text=c)] for c in cities],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
-    await message.answer("Новый город отправления:", reply_markup=kb)
+    edit = await CargoEdit.load(state)
+    edit.new_region_from = message.text.strip()
+    await edit.save(state)
+    await message.answer(
+        "Новый город отправления (первые буквы названия):",
+        reply_markup=types.ReplyKeyboardRemove(),
+    )
     await state.set_state(CargoEditStates.route_city_from)
 
 
 async def process_edit_route_city_from(message: types.Message, state: FSMContext):
     """Store new origin city and ask for destination region."""
-    data = await state.get_data()
-    region = data.get("new_region_from")
+    edit = await CargoEdit.load(state)
+    region = edit.new_region_from
     if not region:
         await message.answer("Попробуйте снова: выберите регион отправления.")
         await state.clear()
         return
-    cities = get_cities(region)
-    await state.update_data(new_city_from=message.text.strip())
-    regions = get_regions()
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[types.KeyboardButton(text=r)] for r in regions],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    city = message.text.strip()
+    # Города известных регионов уточняем по справочнику
+    if is_region(region) and not is_city(region, city):
+        city = await resolve_city_input(message, region)
+        if not city:
+            return
+    edit.new_city_from = city
+    await edit.save(state)
+    kb = keyboards.regions()
     await message.answer("Новый регион назначения:", reply_markup=kb)
     await state.set_state(CargoEditStates.route_region_to)
 
 
 async def process_edit_route_region_to(message: types.Message, state: FSMContext):
     """Store new destination region and ask for city."""
-    region = message.text.strip()
-    await state.update_data(new_region_to=region)
-    cities = get_cities(region)
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[types.KeyboardButton(text=c)] for c in cities],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
-    await message.answer("Новый город назначения:", reply_markup=kb)
+    edit = await CargoEdit.load(state)
+    edit.new_region_to = message.text.strip()
+    await edit.save(state)
+    await message.answer(
+        "Новый город назначения (первые буквы названия):",
+        reply_markup=types.ReplyKeyboardRemove(),
+    )
     await state.set_state(CargoEditStates.route_city_to)
 
 
 async def process_edit_route_city_to(message: types.Message, state: FSMContext):
     """Update route in the database."""
-    data = await state.get_data()
-    cid = data.get("edit_cargo_id")
-    rf = data.get("new_region_from")
-    cf = data.get("new_city_from")
-    rt = data.get("new_region_to")
+    edit = await CargoEdit.load(state)
+    cid = edit.edit_cargo_id
+    rf = edit.new_region_from
+    cf = edit.new_city_from
+    rt = edit.new_region_to
+    ct = message.text.strip()
+    if rt and is_region(rt) and not is_city(rt, ct):
+        ct = await resolve_city_input(message, rt)
+        if not ct:
+            return
     if cid and rf and cf and rt:
-        update_cargo_route(cid, cf, rf, message.text.strip(), rt)
+        await update_cargo_route(cid, cf, rf, ct, rt)
         clear_city_cache()
     await message.answer("Маршрут обновлён.", reply_markup=get_main_menu())
     await state.clear()
@@ -715,18 +586,20 @@ async def process_edit_route_city_to(message: types.Message, state: FSMContext):
 
 async def process_edit_date_from(message: types.Message, state: FSMContext):
     """Store new start date and ask for end date."""
-    await state.update_data(new_date_from=message.text.strip())
+    edit = await CargoEdit.load(state)
+    edit.new_date_from = message.text.strip()
+    await edit.save(state)
     await message.answer("Новая дата прибытия (ГГГГ-ММ-ДД):")
     await state.set_state(CargoEditStates.date_to)
 
 
 async def process_edit_date_to(message: types.Message, state: FSMContext):
     """Update cargo dates in the database."""
-    data = await state.get_data()
-    cid = data.get("edit_cargo_id")
-    df = data.get("new_date_from")
-    if cid and df:
-        update_cargo_dates(cid, df, message.text.strip())
+    edit = await CargoEdit.load(state)
+    if edit.edit_cargo_id and edit.new_date_from:
+        await update_cargo_dates(
+            edit.edit_cargo_id, edit.new_date_from, message.text.strip()
+        )
     await message.answer("Даты обновлены.", reply_markup=get_main_menu())
     await state.clear()
 
@@ -734,7 +607,7 @@ async def process_edit_date_to(message: types.Message, state: FSMContext):
 async def handle_delete_cargo(callback: types.CallbackQuery):
     """Delete cargo entry and notify the user."""
     cargo_id = int(callback.data.split(":")[1])
-    delete_cargo(cargo_id)
+    await delete_cargo(cargo_id)
     clear_city_cache()
     await callback.answer("Удалено")
     await callback.message.delete()
@@ -800,6 +673,10 @@ def register_cargo_handlers(dp: Dispatcher):
         start_edit_cargo_weight,
         lambda c: c.data.startswith("edit_cargo_weight:"),
     )
+    dp.callback_query.register(
+        show_cargo_matches,
+        lambda c: c.data.startswith("match_cargo:"),
+    )
     dp.callback_query.register(
         handle_delete_cargo,
         lambda c: c.data.startswith("del_cargo:"),
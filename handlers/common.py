@@ -16,25 +16,20 @@ from aiogram.exceptions import TelegramBadRequest
 from datetime import datetime
 
 import logging
+import keyboards
+import message_cleanup
+from async_db import record_event, search_cargo, search_trucks, set_users_blocked
+from city_lookup import resolve_city
+from conversation import CargoDraft, Flow, TruckDraft
 from utils import format_date_for_display, parse_date, validate_weight
-from config import Config
 
 def get_main_menu() -> ReplyKeyboardMarkup:
     """
     Возвращает ReplyKeyboardMarkup с основными кнопками:
     Добавить груз, Добавить ТС, Найти груз, Найти ТС, Мой профиль.
+    Клавиатура строится один раз и переиспользуется (см. :mod:`keyboards`).
     """
-    buttons = [
-        [KeyboardButton(text="➕ Добавить груз")],
-        [KeyboardButton(text="➕ Добавить ТС")],
-        [KeyboardButton(text="🔍 Найти груз"), KeyboardButton(text="🔍 Найти ТС")],
-        [KeyboardButton(text="📋 Мой профиль")]
-    ]
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
+    return keyboards.main_menu()
 
 
 def create_paged_keyboard(
@@ -56,42 +51,90 @@ def create_paged_keyboard(
     )
 
 
-async def ask_and_store(
+def cleanup_messages(message: types.Message, *message_ids: int | None) -> None:
+    """
+    Ставит в очередь удаление сообщения пользователя ``message`` и сообщений
+    ``message_ids`` из того же чата (``None`` пропускаются). Не ждёт
+    запросов к Bot API: удаления собираются пачками (см. :mod:`message_cleanup`).
+    """
+    message_cleanup.get_cleaner(message.bot).delete(
+        message.chat.id, message.message_id, *message_ids
+    )
+
+
+async def show_card(
     message: types.Message,
-    state: FSMContext,
+    flow: Flow,
     text: str,
-    next_state: State,
-    reply_markup: types.ReplyKeyboardMarkup | types.InlineKeyboardMarkup | None = None,
-):
+    reply_markup: (
+        types.ReplyKeyboardMarkup
+        | types.InlineKeyboardMarkup
+        | types.ReplyKeyboardRemove
+        | None
+    ) = None,
+) -> None:
     """
-    Удаляет сообщение пользователя и предыдущее сообщение бота (если оно было
-    сохранено в ``FSMContext``), отправляет новый вопрос ``text`` с
-    необязательной клавиатурой и сохраняет его ``message_id``. Затем переводит
-    FSM в ``next_state``.
+    Показывает ``text`` в карточке сценария — сообщении бота
+    ``flow.last_bot_message_id`` в чате ``message``. Карточка редактируется
+    на месте (один запрос вместо удаления и отправки); если это невозможно
+    (reply-клавиатура, сообщение удалено), отправляется новое сообщение, а
+    старое удаляется в фоне. ID карточки запоминается в ``flow``.
     """
-    # Удаляем сообщение пользователя
-    try:
-        await message.delete()
-    except TelegramBadRequest:
-        pass
-
-    # Удаляем предыдущий бот-вопрос
-    data = await state.get_data()
-    prev_bot_msg_id = data.get("last_bot_message_id")
-    if prev_bot_msg_id:
+    card_id = flow.last_bot_message_id
+    # Reply-клавиатуру можно показать только с новым сообщением
+    if card_id and (reply_markup is None or isinstance(reply_markup, InlineKeyboardMarkup)):
         try:
-            await message.chat.delete_message(prev_bot_msg_id)
-        except Exception:
-            pass  # Игнорируем, если уже удалено или нет прав
+            await message.bot.edit_message_text(
+                text=text,
+                chat_id=message.chat.id,
+                message_id=card_id,
+                reply_markup=reply_markup,
+            )
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" in e.message:
+                return
 
-    # Отправляем новый вопрос
     if reply_markup:
         bot_msg = await message.answer(text, reply_markup=reply_markup)
     else:
         bot_msg = await message.answer(text)
+    flow.last_bot_message_id = bot_msg.message_id
+    if card_id:
+        message_cleanup.get_cleaner(message.bot).delete(message.chat.id, card_id)
 
-    # Сохраняем ID только что отправленного сообщения бота
-    await state.update_data(last_bot_message_id=bot_msg.message_id)
+
+async def ask_and_store(
+    message: types.Message,
+    state: FSMContext,
+    text: str,
+    next_state: State,
+    reply_markup: (
+        types.ReplyKeyboardMarkup
+        | types.InlineKeyboardMarkup
+        | types.ReplyKeyboardRemove
+        | None
+    ) = None,
+    *,
+    flow: Flow | None = None,
+):
+    """
+    Показывает новый вопрос ``text`` с необязательной клавиатурой в карточке
+    сценария (см. :func:`show_card`), ставит в очередь удаление сообщения
+    пользователя и переводит FSM в ``next_state``. ``flow`` — данные
+    сценария, уже прочитанные шагом (см. :mod:`conversation`): в них
+    запоминается ``message_id`` карточки и они сохраняются одной записью.
+    Без ``flow`` данные читаются из FSM.
+    """
+    if flow is None:
+        flow = await Flow.load(state)
+
+    # Сначала показываем новый вопрос, ответ пользователя удаляется в фоне
+    await show_card(message, flow, text, reply_markup)
+    cleanup_messages(message)
+
+    # ID карточки сохраняется вместе с ответами
+    await flow.save(state)
 
     # Переходим в следующий статус
     await state.set_state(next_state)
@@ -114,29 +157,47 @@ async def cmd_help(message: types.Message):
     await message.answer(text)
 
 
+async def handle_my_chat_member(update: types.ChatMemberUpdated) -> None:
+    """Отмечает пользователей, заблокировавших или разблокировавших бота."""
+    if update.chat.type != "private":
+        return
+    status = update.new_chat_member.status
+    await set_users_blocked([update.from_user.id], status == "kicked")
+
+
 def register_common_handlers(dp: Dispatcher):
     """Регистрация общих хендлеров."""
     dp.message.register(cmd_cancel, Command(commands=["cancel"]))
     dp.message.register(cmd_help, Command(commands=["help"]))
+    dp.my_chat_member.register(handle_my_chat_member)
+    dp.callback_query.register(
+        handle_search_page,
+        lambda c: c.data.startswith("page:"),
+    )
 
 
-async def show_search_results(message: types.Message, rows, page: int = 0, per_page: int = 5):
-    """Send paginated search results with optional navigation buttons."""
-    total = len(rows)
-    if total == 0:
-        await message.answer("📬 По вашему запросу ничего не найдено.", reply_markup=get_main_menu())
-        return
+# Количество результатов поиска на одной странице
+SEARCH_PAGE_SIZE = 5
+
+_SEARCH_FUNCS = {
+    "cargo": search_cargo,
+    "truck": search_trucks,
+}
 
-    start = page * per_page
-    end = start + per_page
-    page_rows = rows[start:end]
+
+def format_search_results(
+    rows, page: int, has_next: bool
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Return text and navigation keyboard for one page of search results."""
+    if not rows:
+        return "📬 По вашему запросу ничего не найдено.", None
 
     # Determine row type
-    is_cargo = "city_from" in page_rows[0].keys()
+    is_cargo = "city_from" in rows[0].keys()
     header = "📋 Найденные грузы:\n\n" if is_cargo else "📋 Найденные ТС:\n\n"
     text = header
 
-    for r in page_rows:
+    for r in rows:
         date_disp = format_date_for_display(r["date_from"])
         if is_cargo:
             text += (
@@ -156,20 +217,125 @@ async def show_search_results(message: types.Message, rows, page: int = 0, per_p
                 f"\u041d\u0430\u043f\u0440\u0430\u0432\u043b\u0435\u043d\u0438\u0435: {r['direction']}\n\n"
             )
 
-    markup: types.InlineKeyboardMarkup | types.ReplyKeyboardMarkup | None = None
-    if total > per_page:
+    markup: InlineKeyboardMarkup | None = None
+    if page > 0 or has_next:
         buttons = []
         if page > 0:
             buttons.append(InlineKeyboardButton(text="\u041d\u0430\u0437\u0430\u0434", callback_data=f"page:{page-1}"))
-        if end < total:
+        if has_next:
             buttons.append(InlineKeyboardButton(text="\u0412\u043f\u0435\u0440\u0451\u0434", callback_data=f"page:{page+1}"))
         markup = InlineKeyboardMarkup(inline_keyboard=[buttons])
+    return text, markup
+
 
+async def show_search_results(
+    message: types.Message, rows, page: int = 0, has_next: bool = False
+) -> types.Message | None:
+    """Send one page of search results with optional navigation buttons."""
+    text, markup = format_search_results(rows, page, has_next)
     try:
-        await message.answer(text, reply_markup=markup or get_main_menu())
+        return await message.answer(text, reply_markup=markup or get_main_menu())
     except UnicodeEncodeError as e:
         logging.exception("Encoding error with text: %r", text)
         await message.answer("Произошла ошибка при выводе текста.")
+        return None
+
+
+async def _fetch_search_page(search: dict, page: int):
+    """Load ``page`` of ``search`` using its stored keyset cursors.
+
+    ``search["cursors"][n]`` is the ``(date_from, id)`` key of the last row
+    before page ``n``; the cursor for the following page is recorded here.
+    """
+    after = search["cursors"][page]
+    rows = await _SEARCH_FUNCS[search["kind"]](
+        **search["filters"],
+        after=tuple(after) if after else None,
+        limit=SEARCH_PAGE_SIZE + 1,
+    )
+    has_next = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+    del search["cursors"][page + 1:]
+    if has_next:
+        last = rows[-1]
+        search["cursors"].append([last["date_from"], last["id"]])
+    return rows, has_next
+
+
+async def start_search(
+    message: types.Message,
+    state: FSMContext,
+    kind: str,
+    filters: dict,
+    empty_text: str,
+) -> int:
+    """Show the first page of a ``kind`` search and remember it for paging.
+
+    Finishes the search wizard: the FSM is cleared and only the compact
+    search description (filters and page cursors) is kept in its data so
+    that ``page:N`` buttons can fetch further pages.  Returns the number of
+    rows shown.
+    """
+    search = {"kind": kind, "filters": filters, "cursors": [None]}
+    rows, has_next = await _fetch_search_page(search, 0)
+    await state.clear()
+    await record_event(f"{kind}_search")
+    if not rows:
+        await message.answer(empty_text, reply_markup=get_main_menu())
+        return 0
+
+    sent = await show_search_results(message, rows, 0, has_next)
+    if has_next and sent is not None:
+        search["message_id"] = sent.message_id
+        await state.update_data(search=search)
+    return len(rows)
+
+
+async def handle_search_page(callback: types.CallbackQuery, state: FSMContext):
+    """Replace the results message in place with the requested page."""
+    try:
+        page = int(callback.data.split(":")[1])
+    except (IndexError, ValueError):
+        page = -1  # callback_data приходит от клиента
+    data = await state.get_data()
+    search = data.get("search")
+    if (
+        not search
+        or search.get("message_id") != callback.message.message_id
+        or not 0 <= page < len(search["cursors"])
+    ):
+        await callback.answer(
+            "Результаты устарели, выполните поиск заново.", show_alert=True
+        )
+        return
+
+    rows, has_next = await _fetch_search_page(search, page)
+    text, markup = format_search_results(rows, page, has_next)
+    await state.update_data(search=search)
+    try:
+        await callback.message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest:
+        pass  # Сообщение не изменилось
+    await callback.answer()
+
+
+async def resolve_city_input(message: types.Message, region: str) -> str | None:
+    """
+    Возвращает город региона ``region``, введённый пользователем. Если ввод
+    неоднозначен, отправляет короткую клавиатуру с подходящими городами и
+    возвращает ``None``.
+    """
+    city, suggestions = resolve_city(message.text, region)
+    if city:
+        return city
+    if suggestions:
+        await message.answer(
+            "Выбери город из списка или уточни название:",
+            reply_markup=keyboards.grid(tuple(suggestions)),
+        )
+    else:
+        await message.answer("Город не найден в этом регионе. Попробуй ещё раз:")
+    return None
 
 
 async def process_weight_step(
@@ -181,41 +347,41 @@ async def process_weight_step(
     invalid_text: str,
     *,
     validate_func=validate_weight,
+    flow_cls: type[CargoDraft | TruckDraft] = CargoDraft,
 ):
-    """Validate weight input and ask the next question."""
+    """Validate weight input, store it in ``flow_cls`` and ask the next question."""
     raw = message.text.strip()
     ok, weight = validate_func(raw)
     if not ok:
         await message.answer(invalid_text)
         return
 
-    await state.update_data(weight=weight)
-    buttons = [[KeyboardButton(text=bt)] for bt in Config.BODY_TYPES]
-    buttons.append([KeyboardButton(text=any_option)])
-    kb = ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    flow = await flow_cls.load(state)
+    flow.weight = weight
     await ask_and_store(
         message,
         state,
         prompt,
         next_state,
-        reply_markup=kb,
+        reply_markup=keyboards.body_types(any_option),
+        flow=flow,
     )
 
 
 async def parse_and_store_date(
     message: types.Message,
-    state: FSMContext,
+    flow: Flow,
     field_name: str,
     error_text: str,
     *,
     compare_field: str | None = None,
     compare_error: str = "",
 ) -> bool:
-    """Parse date from ``message`` and store under ``field_name`` in state."""
+    """Parse date from ``message`` into attribute ``field_name`` of ``flow``.
+
+    Only ``flow`` is changed; the caller saves it together with the rest of
+    the step.
+    """
     raw = message.text.strip()
     parsed = parse_date(raw)
     if not parsed:
@@ -223,8 +389,7 @@ async def parse_and_store_date(
         return False
 
     if compare_field:
-        data = await state.get_data()
-        prev = data.get(compare_field)
+        prev = getattr(flow, compare_field)
         if prev:
             dt_prev = datetime.strptime(prev, "%Y-%m-%d")
             dt_cur = datetime.strptime(parsed, "%Y-%m-%d")
@@ -232,19 +397,5 @@ async def parse_and_store_date(
                 await message.answer(compare_error)
                 return False
 
-    await state.update_data(**{field_name: parsed})
+    setattr(flow, field_name, parsed)
     return True
-
-
-def build_search_query(base_query: str, filters: list[tuple[str | None, str]]):
-    """Return SQL query and params applying provided filters."""
-    query = base_query
-    params: list[str] = []
-    for value, clause in filters:
-        if value is not None:
-            query += clause
-            params.append(value)
-    return query, params
-
-
-
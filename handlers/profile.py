@@ -3,8 +3,8 @@
 from aiogram import types, Dispatcher
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
-from db import (
-    get_connection,
+from async_db import (
+    get_user_by_telegram_id,
     get_cargo_by_user,
     get_trucks_by_user,
     update_user_name,
@@ -18,14 +18,7 @@ from states import UserEditStates
 
 
 async def show_profile(message: types.Message):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, name, city, phone, created_at FROM users WHERE telegram_id = ?",
-        (message.from_user.id,),
-    )
-    user = cursor.fetchone()
-    conn.close()
+    user = await get_user_by_telegram_id(message.from_user.id)
 
     if not user:
         await message.answer("Сначала зарегистрируйся через /start.")
@@ -42,8 +35,8 @@ async def show_profile(message: types.Message):
         f"Дата регистрации: {created_formatted}\n"
     )
 
-    cargo_rows = get_cargo_by_user(user["id"])
-    truck_rows = get_trucks_by_user(user["id"])
+    cargo_rows = await get_cargo_by_user(user["id"])
+    truck_rows = await get_trucks_by_user(user["id"])
 
     if cargo_rows:
         text += "\n📦 Ваши грузы:\n"
@@ -102,70 +95,43 @@ async def start_edit_phone(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-async def process_new_name(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE telegram_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        update_user_name(row["id"], message.text.strip())
+async def process_new_name(message: types.Message, state: FSMContext, user_id: int | None = None):
+    if user_id:
+        await update_user_name(user_id, message.text.strip())
     await message.answer("Имя обновлено.", reply_markup=get_main_menu())
     await state.clear()
 
 
-async def process_new_city(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE telegram_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        update_user_city(row["id"], message.text.strip())
+async def process_new_city(message: types.Message, state: FSMContext, user_id: int | None = None):
+    if user_id:
+        await update_user_city(user_id, message.text.strip())
     await message.answer("Город обновлён.", reply_markup=get_main_menu())
     await state.clear()
 
 
-async def process_new_phone(message: types.Message, state: FSMContext):
+async def process_new_phone(message: types.Message, state: FSMContext, user_id: int | None = None):
     phone = message.text.strip()
     if not validate_phone(phone):
         await message.answer("Введите телефон в формате +79991234567:")
         return
-    user_id = message.from_user.id
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE telegram_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        update_user_phone(row["id"], phone)
+    if user_id:
+        await update_user_phone(user_id, phone)
     await message.answer("Телефон обновлён.", reply_markup=get_main_menu())
     await state.clear()
 
 
-async def handle_delete_profile(callback: types.CallbackQuery):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE telegram_id = ?", (callback.from_user.id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        delete_user(row["id"])
+async def handle_delete_profile(callback: types.CallbackQuery, user_id: int | None = None):
+    if user_id:
+        await delete_user(user_id)
     await callback.message.answer("Профиль удалён.", reply_markup=get_main_menu())
     await callback.answer()
 
 
-async def show_manage_cargo(callback: types.CallbackQuery):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE telegram_id = ?", (callback.from_user.id,))
-    row = cursor.fetchone()
-    if not row:
+async def show_manage_cargo(callback: types.CallbackQuery, user_id: int | None = None):
+    if not user_id:
         await callback.answer()
         return
-    cargo_rows = get_cargo_by_user(row["id"])
+    cargo_rows = await get_cargo_by_user(user_id)
     text = "\n📦 Ваши грузы:\n"
     kb: list[list[types.InlineKeyboardButton]] = []
     for r in cargo_rows:
@@ -182,15 +148,11 @@ async def show_manage_cargo(callback: types.CallbackQuery):
     await callback.answer()
 
 
-async def show_manage_truck(callback: types.CallbackQuery):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE telegram_id = ?", (callback.from_user.id,))
-    row = cursor.fetchone()
-    if not row:
+async def show_manage_truck(callback: types.CallbackQuery, user_id: int | None = None):
+    if not user_id:
         await callback.answer()
         return
-    truck_rows = get_trucks_by_user(row["id"])
+    truck_rows = await get_trucks_by_user(user_id)
     text = "\n🚛 Ваши ТС:\n"
     kb: list[list[types.InlineKeyboardButton]] = []
     for r in truck_rows:
@@ -6,11 +6,10 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import ReplyKeyboardRemove, ContentType
 
-from db import get_connection
+from async_db import add_user, get_user_by_telegram_id
 from datetime import datetime
 from .common import get_main_menu
 from utils import (
-    get_current_user_id,
     log_user_action,
     validate_phone,
 )
@@ -24,11 +23,7 @@ class Registration(StatesGroup):
 
 async def cmd_start(message: types.Message, state: FSMContext):
     # Проверяем, зарегистрирован ли уже пользователь
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE telegram_id = ?", (message.from_user.id,))
-    user = cursor.fetchone()
-    conn.close()
+    user = await get_user_by_telegram_id(message.from_user.id)
 
     if user:
         # Приветствуем возвращённого пользователя
@@ -65,7 +60,7 @@ async def process_city(message: types.Message, state: FSMContext):
     await state.set_state(Registration.phone)
 
 
-async def process_phone(message: types.Message, state: FSMContext):
+async def process_phone(message: types.Message, state: FSMContext, user_id: int | None = None):
     # Пришёл контакт либо текст
     if message.content_type == ContentType.CONTACT:
         phone = message.contact.phone_number
@@ -87,14 +82,7 @@ async def process_phone(message: types.Message, state: FSMContext):
     created_at = datetime.now().isoformat()
 
     # Вставляем или игнорируем, если уже есть
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT OR IGNORE INTO users (telegram_id, name, city, phone, created_at) VALUES (?, ?, ?, ?, ?)",
-        (telegram_id, name, city, phone, created_at)
-    )
-    conn.commit()
-    conn.close()
+    new_user_id = await add_user(telegram_id, name, city, phone, created_at)
 
     # Удаляем сообщение с телефоном (контакт или текст)
     await message.delete()
@@ -103,7 +91,8 @@ async def process_phone(message: types.Message, state: FSMContext):
         f"Регистрация завершена! Приятно познакомиться, {name}.",
         reply_markup=get_main_menu()
     )
-    user_id = await get_current_user_id(message)
+    # user_id из middleware определён до регистрации
+    user_id = user_id or new_user_id
     if user_id:
         log_user_action(user_id, "registration")
     await state.clear()
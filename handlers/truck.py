@@ -1,15 +1,16 @@
 """Handlers for truck addition and search workflows."""
 
 from aiogram import types, Dispatcher
-from aiogram.types import KeyboardButton
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State
 from states import BaseStates, TruckEditStates
 from datetime import datetime
 
-from db import (
-    get_connection,
+import async_db
+import keyboards
+from async_db import (
+    add_truck,
     update_truck_weight,
     update_truck_route,
     update_truck_dates,
@@ -19,14 +20,20 @@ from db import (
 from .common import (
     get_main_menu,
     ask_and_store,
-    show_search_results,
+    cleanup_messages,
+    start_search,
+    format_search_results,
+    SEARCH_PAGE_SIZE,
+    resolve_city_input,
     process_weight_step,
     parse_and_store_date,
 )
 
+from matching import match_truck
 from calendar_keyboard import generate_calendar, handle_calendar_callback
+from config import Config
+from conversation import ANY_CITY, NO_DATE, TruckDraft, TruckEdit, TruckSearch
 from utils import (
-    get_current_user_id,
     format_date_for_display,
     log_user_action,
     get_unique_truck_cities,
@@ -34,8 +41,10 @@ from utils import (
     validate_weight,
 )
 from locations import (
-    get_regions,
-    get_cities,
+    is_region,
+    is_city,
+    normalize_region,
+    parse_regions,
 )
 
 
@@ -53,25 +62,20 @@ class TruckAddStates(BaseStates):
 
 class TruckSearchStates(BaseStates):
     city          = State()
+    route_region  = State()
     date_from     = State()
     date_to       = State()
 
 
 # ========== СЦЕНАРИЙ: ДОБАВЛЕНИЕ ТС ==========
 
-async def cmd_start_add_truck(message: types.Message, state: FSMContext):
-    user_id = await get_current_user_id(message)
+async def cmd_start_add_truck(message: types.Message, state: FSMContext, user_id: int | None = None):
     if not user_id:
         await message.answer("Сначала зарегистрируйся через /start.")
         return
 
     # Сразу показываем все регионы (без пагинации)
-    regions = get_regions()
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=region)] for region in regions],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    kb = keyboards.regions()
     await ask_and_store(
         message,
         state,
@@ -83,44 +87,41 @@ async def cmd_start_add_truck(message: types.Message, state: FSMContext):
 
 async def process_region(message: types.Message, state: FSMContext):
     text = message.text.strip()
-    all_regions = get_regions()
-    if text not in all_regions:
+    region = text if is_region(text) else normalize_region(text)
+    if not region:
         await message.answer("Пожалуйста, выбери регион из списка.")
         return
 
-    await state.update_data(region=text)
-    # Показываем все города выбранного региона
-    cities = get_cities(text)
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=city)] for city in cities],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    draft = await TruckDraft.load(state)
+    draft.region = region
+    # Вместо списка всех городов региона предлагаем ввести начало названия
     await ask_and_store(
         message,
         state,
-        "В каком городе стоит ТС?",
+        "В каком городе стоит ТС? Введи первые буквы названия:",
         TruckAddStates.city,
-        reply_markup=kb,
+        reply_markup=types.ReplyKeyboardRemove(),
+        flow=draft,
     )
 
 
 async def process_city(message: types.Message, state: FSMContext):
     text = message.text.strip()
-    data = await state.get_data()
-    region = data.get("region")
+    draft = await TruckDraft.load(state)
+    region = draft.region
     if not region:
         # Если state потерялся, просим начать заново
         await message.answer("Попробуйте снова: выберите регион стоянки.")
         await state.clear()
         return
 
-    cities = get_cities(region)
-    if text not in cities:
-        await message.answer("Пожалуйста, выбери город из списка.")
+    city = text if is_city(region, text) else await resolve_city_input(message, region)
+    if not city:
         return
 
-    await state.update_data(city=text)
+    draft.city = city
+    draft.use_calendar("date_from")
+
     # Переходим к выбору даты доступности "с"
     await ask_and_store(
         message,
@@ -128,46 +129,38 @@ async def process_city(message: types.Message, state: FSMContext):
         "Дата доступности (с):",
         TruckAddStates.date_from,
         reply_markup=generate_calendar(),
-    )
-    await state.update_data(
-        calendar_field="date_from",
-        calendar_next_state=TruckAddStates.date_to,
-        calendar_next_text="Дата доступности (по):",
-        calendar_next_markup=generate_calendar(),
-        calendar_include_skip=False,
+        flow=draft,
     )
 
 
 async def process_date_from(message: types.Message, state: FSMContext):
+    draft = await TruckDraft.load(state)
     ok = await parse_and_store_date(
         message,
-        state,
+        draft,
         "date_from",
         "Неверный формат даты. Введите ДД.MM.ГГГГ:",
     )
     if not ok:
         return
+
     # Запрашиваем дату доступности "по"
+    draft.use_calendar("date_to")
     await ask_and_store(
         message,
         state,
         "Дата доступности (по):",
         TruckAddStates.date_to,
         reply_markup=generate_calendar(),
-    )
-    await state.update_data(
-        calendar_field="date_to",
-        calendar_next_state=TruckAddStates.weight,
-        calendar_next_text="Грузоподъёмность (в тоннах):",
-        calendar_next_markup=None,
-        calendar_include_skip=False,
+        flow=draft,
     )
 
 
 async def process_date_to(message: types.Message, state: FSMContext):
+    draft = await TruckDraft.load(state)
     ok = await parse_and_store_date(
         message,
-        state,
+        draft,
         "date_to",
         "Неверный формат даты. Введите ДД.MM.ГГГГ:",
         compare_field="date_from",
@@ -175,14 +168,17 @@ async def process_date_to(message: types.Message, state: FSMContext):
     )
     if not ok:
         return
+
     # Запрашиваем грузоподъёмность
+    draft.use_calendar(None)
     await ask_and_store(
         message,
         state,
         "Грузоподъёмность (в тоннах):",
-        TruckAddStates.weight
+        TruckAddStates.weight,
+        flow=draft,
     )
-    await state.update_data(calendar_field=None)
+
 
 async def process_weight(message: types.Message, state: FSMContext):
     """Store truck weight after validating the input."""
@@ -194,6 +190,7 @@ async def process_weight(message: types.Message, state: FSMContext):
         "Любой",
         "Введи грузоподъёмность от 1 до 1000 тонн цифрой (например, 15):",
         validate_func=validate_weight,
+        flow_cls=TruckDraft,
     )
 
 
@@ -203,19 +200,17 @@ async def process_body_type(message: types.Message, state: FSMContext):
         await message.answer("Пожалуйста, нажми одну из кнопок: «Рефрижератор», «Тент», «Изотерм» или «Любой».")
         return
 
-    await state.update_data(body_type=text)
+    draft = await TruckDraft.load(state)
+    draft.body_type = text
 
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=opt)] for opt in Config.TRUCK_DIRECTIONS],
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    kb = keyboards.directions()
     await ask_and_store(
         message,
         state,
         "Выбери направление:",
         TruckAddStates.direction,
-        reply_markup=kb
+        reply_markup=kb,
+        flow=draft,
     )
 
 
@@ -225,118 +220,104 @@ async def process_direction(message: types.Message, state: FSMContext):
         await message.answer("Пожалуйста, нажми «Ищу заказ» или «Попутный путь».")
         return
 
-    await state.update_data(direction=text)
+    draft = await TruckDraft.load(state)
+    draft.direction = text
     await ask_and_store(
         message,
         state,
         "Перечисли через запятую регионы, где готов ехать (или 'нет'):",
-        TruckAddStates.route_regions
+        TruckAddStates.route_regions,
+        flow=draft,
     )
 
 
 async def process_route_regions(message: types.Message, state: FSMContext):
     text = message.text.strip()
-    regions = text if text.lower() != "нет" else ""
-    await state.update_data(route_regions=regions)
+    if text.lower() == "нет":
+        regions = ""
+    else:
+        found, unknown = parse_regions(text)
+        if unknown:
+            await message.answer(
+                f"Не удалось распознать регионы: {', '.join(unknown)}.\n"
+                "Перечисли регионы ещё раз через запятую (или 'нет'):"
+            )
+            return
+        regions = ", ".join(found)
+
+    draft = await TruckDraft.load(state)
+    draft.route_regions = regions
     await ask_and_store(
         message,
         state,
         "Добавь комментарий (или напиши 'нет'):",
-        TruckAddStates.comment
+        TruckAddStates.comment,
+        flow=draft,
     )
 
 
-async def process_truck_comment(message: types.Message, state: FSMContext):
+async def process_truck_comment(message: types.Message, state: FSMContext, user_id: int | None = None):
     text = message.text.strip()
     comment = text if text.lower() != "нет" else ""
-    data = await state.get_data()
+    draft = await TruckDraft.load(state)
 
-    required = ["city", "region", "date_from", "date_to", "weight", "body_type", "direction", "route_regions"]
-    if not all(k in data for k in required):
+    if not draft.is_complete():
         await message.answer("Что-то пошло не так. Попробуй «➕ Добавить ТС» ещё раз.")
         await state.clear()
         return
 
-    user_id = await get_current_user_id(message)
     if not user_id:
         await message.answer("Не удалось найти профиль. Сначала /start.")
         await state.clear()
         return
 
-    # Удаляем сообщение пользователя с комментарием
-    await message.delete()
-    # Удаляем последний бот-вопрос
-    bot_data = await state.get_data()
-    last_bot_msg_id = bot_data.get("last_bot_message_id")
-    if last_bot_msg_id:
-        try:
-            await message.chat.delete_message(last_bot_msg_id)
-        except Exception:
-            pass
-
     # Вставляем запись в БД
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO trucks (
-                user_id, city, region,
-                date_from, date_to,
-                weight, body_type,
-                direction, route_regions,
-                comment, created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                user_id,
-                data["city"], data["region"],
-                data["date_from"], data["date_to"],
-                data["weight"], data["body_type"],
-                data["direction"], data["route_regions"],
-                comment, datetime.now().isoformat()
-            )
-        )
-        conn.commit()
+    await add_truck(
+        user_id,
+        draft.city, draft.region,
+        draft.date_from, draft.date_to,
+        draft.weight, draft.body_type,
+        draft.direction, draft.route_regions,
+        comment, datetime.now().isoformat(),
+    )
 
     clear_city_cache()
 
     await message.answer("✅ ТС успешно добавлено!", reply_markup=get_main_menu())
+    # Сообщение с комментарием и последний бот-вопрос удаляются в фоне
+    cleanup_messages(message, draft.last_bot_message_id)
     log_user_action(user_id, "truck_added")
     await state.clear()
 
 
 # ========== СЦЕНАРИЙ: ПОИСК ТС С КНОПКАМИ ==========
 
-async def cmd_start_find_trucks(message: types.Message, state: FSMContext):
+# Кнопка поиска ТС по региону, куда они готовы ехать
+ROUTE_SEARCH_BUTTON = "🧭 По региону маршрута"
+
+
+async def cmd_start_find_trucks(message: types.Message, state: FSMContext, user_id: int | None = None):
     """
     Запускает поиск ТС. Вместо свободного текста выдаёт клавиатуру
     со всеми возможными городами стоянки (из таблицы trucks) + кнопку "Все".
     """
-    user_id = await get_current_user_id(message)
     if not user_id:
         await message.answer("Сначала зарегистрируйся через /start.")
         return
 
-    # Удаляем сообщение-инициатор (нажатие "🔍 Найти ТС")
-    await message.delete()
+    # Сообщение-инициатор (нажатие "🔍 Найти ТС") удаляется в фоне
+    cleanup_messages(message)
 
     # Получаем уникальные города стоянки
-    cities = get_unique_truck_cities()
-
-    kb_buttons = [[types.KeyboardButton(text=city)] for city in cities]
-    kb_buttons.append([types.KeyboardButton(text="Все")])
-
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=kb_buttons,
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    cities = await async_db.run(get_unique_truck_cities)
+    kb = keyboards.column((*cities, "Все", ROUTE_SEARCH_BUTTON))
 
     bot_msg = await message.answer(
         "🔍 Поиск ТС.\nВыберите город (или нажмите «Все»):",
         reply_markup=kb
     )
-    await state.update_data(last_bot_message_id=bot_msg.message_id)
+    # Начинаем с пустых фильтров и запоминаем вопрос, чтобы потом его удалить
+    await TruckSearch(last_bot_message_id=bot_msg.message_id).save(state)
     await state.set_state(TruckSearchStates.city)
 
 
@@ -346,130 +327,105 @@ async def filter_city(message: types.Message, state: FSMContext):
     Затем спрашивает минимальную дату начала.
     """
     selected = message.text.strip()
-    await state.update_data(filter_city=selected.lower())
-
-    # Удаляем сообщение пользователя и предыдущее сообщение бота
-    await message.delete()
-    data = await state.get_data()
-    prev_bot_id = data.get("last_bot_message_id")
-    if prev_bot_id:
-        try:
-            await message.chat.delete_message(prev_bot_id)
-        except Exception:
-            pass
-
-    # Спрашиваем минимальную дату начала
-    bot_msg = await message.answer(
+    search = await TruckSearch.load(state)
+
+    if selected == ROUTE_SEARCH_BUTTON:
+        kb = keyboards.regions()
+        await ask_and_store(
+            message,
+            state,
+            "В какой регион должно поехать ТС?",
+            TruckSearchStates.route_region,
+            reply_markup=kb,
+            flow=search,
+        )
+        return
+
+    search.filter_city = selected.lower()
+    search.filter_route_region = None
+    await ask_truck_search_date_from(message, state, search)
+
+
+async def filter_route_region(message: types.Message, state: FSMContext):
+    """Обработчик выбора региона маршрута для поиска ТС."""
+    region = normalize_region(message.text)
+    if region is None:
+        await message.answer("Не удалось распознать регион. Выберите его из списка:")
+        return
+
+    search = await TruckSearch.load(state)
+    search.filter_city = ANY_CITY
+    search.filter_route_region = region
+    await ask_truck_search_date_from(message, state, search)
+
+
+async def ask_truck_search_date_from(
+    message: types.Message, state: FSMContext, search: TruckSearch
+):
+    """Спрашивает минимальную дату начала для поиска ТС."""
+    search.use_calendar("filter_date_from", include_skip=True)
+    await ask_and_store(
+        message,
+        state,
         "Минимальная дата начала:",
-        reply_markup=generate_calendar(include_skip=True)
+        TruckSearchStates.date_from,
+        reply_markup=generate_calendar(include_skip=True),
+        flow=search,
     )
-    await state.update_data(
-        last_bot_message_id=bot_msg.message_id,
-        calendar_field="filter_date_from",
-        calendar_next_state=TruckSearchStates.date_to,
-        calendar_next_text="Максимальная дата начала:",
-        calendar_next_markup=generate_calendar(include_skip=True),
-        calendar_include_skip=True,
-    )
-    await state.set_state(TruckSearchStates.date_from)
 
 
 async def filter_date_from_truck(message: types.Message, state: FSMContext):
+    search = await TruckSearch.load(state)
     raw = message.text.strip().lower()
-    if raw != "нет":
+    if raw != NO_DATE:
         ok = await parse_and_store_date(
             message,
-            state,
+            search,
             "filter_date_from",
             "Неверный формат. Введите ДД.MM.ГГГГ или «нет».",
         )
         if not ok:
             return
     else:
-        await state.update_data(filter_date_from="нет")
-
-    # Удаляем сообщение пользователя и предыдущий бот-вопрос
-    await message.delete()
-    data = await state.get_data()
-    prev_bot_id = data.get("last_bot_message_id")
-    if prev_bot_id:
-        try:
-            await message.chat.delete_message(prev_bot_id)
-        except Exception:
-            pass
+        search.filter_date_from = NO_DATE
 
     # Спрашиваем максимальную дату начала
-    bot_msg = await message.answer(
+    search.use_calendar("filter_date_to", include_skip=True)
+    await ask_and_store(
+        message,
+        state,
         "Максимальная дата начала:",
-        reply_markup=generate_calendar(include_skip=True)
-    )
-    await state.update_data(
-        last_bot_message_id=bot_msg.message_id,
-        calendar_field="filter_date_to",
-        calendar_next_state=TruckSearchStates.date_to,
-        calendar_next_text="",
-        calendar_next_markup=None,
-        calendar_include_skip=True,
+        TruckSearchStates.date_to,
+        reply_markup=generate_calendar(include_skip=True),
+        flow=search,
     )
-    await state.set_state(TruckSearchStates.date_to)
 
 
-async def filter_date_to_truck(message: types.Message, state: FSMContext):
+async def filter_date_to_truck(message: types.Message, state: FSMContext, user_id: int | None = None):
+    search = await TruckSearch.load(state)
     raw = message.text.strip().lower()
-    if raw != "нет":
+    if raw != NO_DATE:
         ok = await parse_and_store_date(
             message,
-            state,
+            search,
             "filter_date_to",
             "Неверный формат. Введите ДД.MM.ГГГГ или «нет».",
         )
         if not ok:
             return
     else:
-        await state.update_data(filter_date_to="нет")
-
-    data = await state.get_data()
-    user_id = await get_current_user_id(message)
-    fc = data.get("filter_city", "")
-    fd_from = data.get("filter_date_from", "")
-    fd_to = data.get("filter_date_to", "")
-
-    # Составляем SQL-запрос с учётом фильтров
-    base_query = """
-    SELECT t.id, u.name, t.city, t.region, t.date_from, t.weight, t.body_type, t.direction
-    FROM trucks t
-    JOIN users u ON t.user_id = u.id
-    WHERE 1=1
-    """
-    filters = [
-        (fc if fc != "все" else None, " AND lower(t.city) = ?"),
-        (fd_from if fd_from != "нет" else None, " AND date(t.date_from) >= date(?)"),
-        (fd_to if fd_to != "нет" else None, " AND date(t.date_from) <= date(?)"),
-    ]
-    query, params = build_search_query(base_query, filters)
-
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, tuple(params))
-    rows = cursor.fetchall()
-    conn.close()
-
-    # Удаляем последнее сообщение пользователя и предыдущий бот-вопрос
-    await message.delete()
-    prev_bot_id = data.get("last_bot_message_id")
-    if prev_bot_id:
-        try:
-            await message.chat.delete_message(prev_bot_id)
-        except Exception:
-            pass
-
-    if not rows:
-        await message.answer("📬 По вашему запросу ТС не найдено.", reply_markup=get_main_menu())
-    else:
-        await show_search_results(message, rows)
+        search.filter_date_to = NO_DATE
 
-    log_user_action(user_id, "truck_search", f"results={len(rows)}")
-    await state.clear()
+    shown = await start_search(
+        message,
+        state,
+        "truck",
+        search.filters(),
+        "📬 По вашему запросу ТС не найдено.",
+    )
+    # Последнее сообщение пользователя и предыдущий бот-вопрос удаляются в фоне
+    cleanup_messages(message, search.last_bot_message_id)
+    log_user_action(user_id, "truck_search", f"results={shown}")
 
 
 # ========== СЦЕНАРИЙ: РЕДАКТИРОВАНИЕ/УДАЛЕНИЕ ТС ==========
@@ -477,7 +433,7 @@ async def filter_date_to_truck(message: types.Message, state: FSMContext):
 async def handle_edit_truck(callback: types.CallbackQuery):
     """Show edit options for selected truck."""
     truck_id = int(callback.data.split(":")[1])
-    row = get_truck(truck_id)
+    row = await get_truck(truck_id)
     if not row:
         await callback.answer()
         return
@@ -493,6 +449,7 @@ async def handle_edit_truck(callback: types.CallbackQuery):
             [types.InlineKeyboardButton(text="Маршрут", callback_data=f"edit_truck_route:{row['id']}")],
             [types.InlineKeyboardButton(text="Даты", callback_data=f"edit_truck_dates:{row['id']}")],
             [types.InlineKeyboardButton(text="Вес", callback_data=f"edit_truck_weight:{row['id']}")],
+            [types.InlineKeyboardButton(text="📦 Подходящие грузы", callback_data=f"match_truck:{row['id']}")],
             [types.InlineKeyboardButton(text="❌ Удалить", callback_data=f"del_truck:{row['id']}")],
         ]
     )
@@ -500,9 +457,21 @@ async def handle_edit_truck(callback: types.CallbackQuery):
     await callback.answer()
 
 
+async def show_truck_matches(callback: types.CallbackQuery):
+    """Show cargo that fit the selected truck."""
+    truck_id = int(callback.data.split(":")[1])
+    matches = await async_db.run(match_truck, truck_id, SEARCH_PAGE_SIZE)
+    if not matches:
+        await callback.message.answer("📦 Подходящих грузов пока нет.")
+    else:
+        text, _ = format_search_results([m.row for m in matches], 0, False)
+        await callback.message.answer(text)
+    await callback.answer()
+
+
 async def start_edit_truck_weight(callback: types.CallbackQuery, state: FSMContext):
     truck_id = int(callback.data.split(":")[1])
-    await state.update_data(edit_truck_id=truck_id)
+    await TruckEdit(edit_truck_id=truck_id).save(state)
     await callback.message.answer("Новый вес (тонны):")
     await state.set_state(TruckEditStates.weight)
     await callback.answer()
@@ -510,13 +479,8 @@ async def start_edit_truck_weight(callback: types.CallbackQuery, state: FSMConte
 
 async def start_edit_truck_route(callback: types.CallbackQuery, state: FSMContext):
     truck_id = int(callback.data.split(":")[1])
-    await state.update_data(edit_truck_id=truck_id)
-    regions = get_regions()
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=r)] for r in regions],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
+    await TruckEdit(edit_truck_id=truck_id).save(state)
+    kb = keyboards.regions()
     await callback.message.answer("Новый регион стоянки:", reply_markup=kb)
     await state.set_state(TruckEditStates.route_region)
     await callback.answer()
@@ -524,17 +488,12 @@ async def start_edit_truck_route(callback: types.CallbackQuery, state: FSMContex
 
 async def start_edit_truck_dates(callback: types.CallbackQuery, state: FSMContext):
     truck_id = int(callback.data.split(":")[1])
-    await state.update_data(edit_truck_id=truck_id)
+    edit = TruckEdit(edit_truck_id=truck_id)
+    edit.use_calendar("date_from")
+    await edit.save(state)
     await callback.message.answer(
         "Новая дата отправления:", reply_markup=generate_calendar()
     )
-    await state.update_data(
-        calendar_field="date_from",
-        calendar_next_state=TruckEditStates.date_to,
-        calendar_next_text="Новая дата окончания:",
-        calendar_next_markup=generate_calendar(),
-        calendar_include_skip=False,
-    )
     await state.set_state(TruckEditStates.date_from)
     await callback.answer()
 
@@ -545,10 +504,9 @@ async def process_edit_truck_weight(message: types.Message, state: FSMContext):
     if not ok:
         await message.answer("Введите число от 1 до 1000:")
         return
-    data = await state.get_data()
-    tid = data.get("edit_truck_id")
-    if tid:
-        update_truck_weight(tid, weight)
+    edit = await TruckEdit.load(state)
+    if edit.edit_truck_id:
+        await update_truck_weight(edit.edit_truck_id, weight)
         clear_city_cache()
     await message.answer("Запись обновлена.", reply_markup=get_main_menu())
     await state.clear()
@@ -556,30 +514,32 @@ async def process_edit_truck_weight(message: types.Message, state: FSMContext):
 
 async def process_edit_truck_route_region(message: types.Message, state: FSMContext):
     """Store new region and ask for city."""
-    region = message.text.strip()
-    await state.update_data(new_region=region)
-    cities = get_cities(region)
-    kb = types.ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=c)] for c in cities],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
-    await message.answer("Новый город стоянки:", reply_markup=kb)
+    edit = await TruckEdit.load(state)
+    edit.new_region = message.text.strip()
+    await edit.save(state)
+    await message.answer(
+        "Новый город стоянки (первые буквы названия):",
+        reply_markup=types.ReplyKeyboardRemove(),
+    )
     await state.set_state(TruckEditStates.route_city)
 
 
 async def process_edit_truck_route_city(message: types.Message, state: FSMContext):
     """Update truck location in the database."""
-    data = await state.get_data()
-    region = data.get("new_region")
+    edit = await TruckEdit.load(state)
+    region = edit.new_region
     if not region:
         await message.answer("Попробуйте снова: выберите регион.")
         await state.clear()
         return
-    cities = get_cities(region)
-    tid = data.get("edit_truck_id")
-    if tid:
-        update_truck_route(tid, message.text.strip(), region)
+    city = message.text.strip()
+    # Города известных регионов уточняем по справочнику
+    if is_region(region) and not is_city(region, city):
+        city = await resolve_city_input(message, region)
+        if not city:
+            return
+    if edit.edit_truck_id:
+        await update_truck_route(edit.edit_truck_id, city, region)
         clear_city_cache()
     await message.answer("Маршрут обновлён.", reply_markup=get_main_menu())
     await state.clear()
@@ -587,18 +547,20 @@ async def process_edit_truck_route_city(message: types.Message, state: FSMContex
 
 async def process_edit_truck_date_from(message: types.Message, state: FSMContext):
     """Store new start date for truck."""
-    await state.update_data(new_date_from=message.text.strip())
+    edit = await TruckEdit.load(state)
+    edit.new_date_from = message.text.strip()
+    await edit.save(state)
     await message.answer("Новая дата окончания (ГГГГ-ММ-ДД):")
     await state.set_state(TruckEditStates.date_to)
 
 
 async def process_edit_truck_date_to(message: types.Message, state: FSMContext):
     """Update truck dates."""
-    data = await state.get_data()
-    tid = data.get("edit_truck_id")
-    df = data.get("new_date_from")
-    if tid and df:
-        update_truck_dates(tid, df, message.text.strip())
+    edit = await TruckEdit.load(state)
+    if edit.edit_truck_id and edit.new_date_from:
+        await update_truck_dates(
+            edit.edit_truck_id, edit.new_date_from, message.text.strip()
+        )
     await message.answer("Даты обновлены.", reply_markup=get_main_menu())
     await state.clear()
 
@@ -606,7 +568,7 @@ async def process_edit_truck_date_to(message: types.Message, state: FSMContext):
 async def handle_delete_truck(callback: types.CallbackQuery):
     """Delete truck entry and inform the user."""
     truck_id = int(callback.data.split(":")[1])
-    delete_truck(truck_id)
+    await delete_truck(truck_id)
     clear_city_cache()
     await callback.answer("Удалено")
     await callback.message.delete()
@@ -640,6 +602,7 @@ def register_truck_handlers(dp: Dispatcher):
     # Поиск ТС
     dp.message.register(cmd_start_find_trucks,       lambda m: m.text == "🔍 Найти ТС")
     dp.message.register(filter_city,                 StateFilter(TruckSearchStates.city))
+    dp.message.register(filter_route_region,         StateFilter(TruckSearchStates.route_region))
     dp.message.register(filter_date_from_truck,      StateFilter(TruckSearchStates.date_from))
     dp.message.register(filter_date_to_truck,        StateFilter(TruckSearchStates.date_to))
     dp.callback_query.register(
@@ -670,6 +633,10 @@ def register_truck_handlers(dp: Dispatcher):
         start_edit_truck_weight,
         lambda c: c.data.startswith("edit_truck_weight:"),
     )
+    dp.callback_query.register(
+        show_truck_matches,
+        lambda c: c.data.startswith("match_truck:"),
+    )
     dp.callback_query.register(
         handle_delete_truck,
         lambda c: c.data.startswith("del_truck:"),
@@ -0,0 +1,51 @@
+"""Periodic database upkeep of a running bot.
+
+Triggers append every change of users, cargo and trucks to ``change_log``
+so processes sharing the database can replay each other's writes (see
+:func:`db.sync_changes`).  The table is trimmed to the newest
+:attr:`Config.CHANGE_LOG_KEEP` entries every
+:attr:`Config.CHANGE_LOG_PRUNE_INTERVAL` seconds by a background task of one
+bot process: the only one with ``python bot.py``, worker 0 with
+``python supervisor.py``.  The deletion goes through the :mod:`async_db`
+writer thread, so it never blocks the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import async_db
+from config import Config
+
+_task: asyncio.Task | None = None
+
+
+async def _prune_forever(interval: float, keep: int) -> None:
+    while True:
+        try:
+            await async_db.prune_change_log(keep)
+        except Exception:
+            logging.exception("Failed to prune the change log")
+        await asyncio.sleep(interval)
+
+
+async def on_startup() -> None:
+    """Dispatcher startup hook: start pruning ``change_log``."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(
+            _prune_forever(Config.CHANGE_LOG_PRUNE_INTERVAL, Config.CHANGE_LOG_KEEP)
+        )
+
+
+async def on_shutdown() -> None:
+    """Dispatcher shutdown hook: stop pruning."""
+    global _task
+    task, _task = _task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
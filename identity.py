@@ -0,0 +1,159 @@
+"""Cache mapping Telegram IDs to internal user IDs.
+
+Almost every handler needs the ``users.id`` of the sender, and looking it up
+costs a database round trip each time, often several per update.  Lookups
+here go through a bounded LRU cache whose entries expire after
+:attr:`Config.USER_CACHE_TTL` seconds.  Unregistered senders are cached as
+``None`` as well.
+
+The cache follows the database through :func:`db.add_change_listener`:
+deleting a user drops its entry and registering a user drops the cached
+``None`` answers once the transaction commits.  An answer read from the
+database is not stored if the cache was invalidated while it was being
+looked up, since it may predate the change.  Switching ``db.DB_PATH`` (as
+tests do) empties the cache.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import async_db
+import db
+from config import Config
+
+_MISSING = object()
+
+
+class UserIdCache:
+    """Thread-safe TTL/LRU map ``telegram_id -> user_id | None``."""
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, tuple[int | None, float]] = OrderedDict()
+        self._path: str | None = None
+        # Bumped on every invalidation, see :meth:`put`
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _check_path(self) -> None:
+        # Called with the lock held
+        if self._path != db.DB_PATH:
+            self._entries.clear()
+            self._generation += 1
+            self._path = db.DB_PATH
+
+    @property
+    def generation(self) -> int:
+        """Counter changed by every invalidation of the cache."""
+        with self._lock:
+            self._check_path()
+            return self._generation
+
+    def get(self, telegram_id: int):
+        """Return the cached user ID, or ``_MISSING`` when unknown or expired."""
+        with self._lock:
+            self._check_path()
+            entry = self._entries.get(telegram_id)
+            if entry is None or entry[1] <= self._clock():
+                if entry is not None:
+                    del self._entries[telegram_id]
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(
+        self, telegram_id: int, user_id: int | None, generation: int | None = None
+    ) -> None:
+        """Store ``user_id`` for ``telegram_id``.
+
+        ``generation`` is the value of :attr:`generation` read before the
+        answer was looked up; the answer is dropped if the cache has been
+        invalidated since.
+        """
+        with self._lock:
+            self._check_path()
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[telegram_id] = (user_id, self._clock() + self.ttl)
+            self._entries.move_to_end(telegram_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, telegram_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(telegram_id, None)
+
+    def forget_user(self, user_id: int | None) -> None:
+        """Drop every entry resolving to ``user_id``."""
+        with self._lock:
+            self._generation += 1
+            stale = [tg for tg, (uid, _) in self._entries.items() if uid == user_id]
+            for telegram_id in stale:
+                del self._entries[telegram_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def on_change(self, table: str, row_id: int) -> None:
+        """Change listener for :mod:`db`."""
+        if table != "users":
+            return
+        # ``row_id`` was either deleted or just registered: drop its entries
+        # and the "not registered" answers that may now be wrong
+        self.forget_user(row_id)
+        self.forget_user(None)
+
+
+_cache = UserIdCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+db.add_change_listener(_cache.on_change)
+
+
+async def resolve_user_id(telegram_id: int) -> int | None:
+    """Return ``users.id`` of ``telegram_id`` or ``None`` if not registered."""
+    user_id = _cache.get(telegram_id)
+    if user_id is _MISSING:
+        generation = _cache.generation
+        user_id = await async_db.get_user_id(telegram_id)
+        _cache.put(telegram_id, user_id, generation)
+    return user_id
+
+
+def forget(telegram_id: int) -> None:
+    """Drop the cached answer for ``telegram_id``."""
+    _cache.forget(telegram_id)
+
+
+def clear() -> None:
+    """Empty the cache."""
+    _cache.clear()
+
+
+def cache_stats() -> dict[str, int]:
+    """Return hit/miss counters and the current size of the cache."""
+    return {
+        "hits": _cache.hits,
+        "misses": _cache.misses,
+        "size": len(_cache),
+        "maxsize": _cache.maxsize,
+    }
@@ -0,0 +1,275 @@
+"""Prometheus-style counters, gauges and latency histograms.
+
+The bot measures where time goes: handlers (:class:`middlewares.
+HandlerMetricsMiddleware`), :mod:`db` functions called through
+:mod:`async_db`, Telegram Bot API requests (:class:`middlewares.
+TelegramApiMetricsMiddleware`) and the time they wait in :mod:`outbound`,
+and :mod:`fsm_storage` loads and flushes.
+:func:`render` returns all of them in the Prometheus text exposition format
+and :func:`start_metrics_server` serves it at ``/metrics`` (bot.py starts it
+on :attr:`Config.METRICS_HOST` and :attr:`Config.METRICS_PORT`).
+
+Metrics are updated from the event loop and from database threads, so every
+metric guards its values with a lock.  The module has no third-party
+dependencies; ``aiohttp`` (installed with aiogram) is imported only when the
+server starts.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Upper bounds (seconds) of latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: list[tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label combination."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            labels = _format_labels(list(zip(self.labelnames, key)))
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Value that goes up and down (e.g. queue length) per label combination."""
+
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class _HistogramValues:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int) -> None:
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (usually seconds) per label combination."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple[str, ...], _HistogramValues] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = _HistogramValues(len(self.buckets) + 1)
+            values.buckets[index] += 1
+            values.sum += value
+            values.count += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the ``with`` block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            values = self._values.get(self._key(labels))
+            return values.count if values is not None else 0
+
+    def collect(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = [
+                (key, list(v.buckets), v.sum, v.count)
+                for key, v in sorted(self._values.items())
+            ]
+        for key, buckets, total, count in items:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), buckets):
+                cumulative += n
+                labels = _format_labels(pairs + [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(pairs)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds", "Time spent in update handlers.", ("handler",)
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Handlers that raised an exception.", ("handler",)
+)
+DB_SECONDS = Histogram(
+    "bot_db_query_seconds",
+    "Execution time of db functions on database threads.",
+    ("function",),
+)
+DB_ERRORS = Counter(
+    "bot_db_errors_total", "db functions that raised an exception.", ("function",)
+)
+TELEGRAM_SECONDS = Histogram(
+    "bot_telegram_api_seconds", "Latency of Telegram Bot API requests.", ("method",)
+)
+TELEGRAM_ERRORS = Counter(
+    "bot_telegram_api_errors_total",
+    "Failed Telegram Bot API requests by exception type.",
+    ("method", "error"),
+)
+TELEGRAM_QUEUE_DEPTH = Gauge(
+    "bot_telegram_queue_depth",
+    "Bot API requests waiting for the outbound rate limit.",
+    ("priority",),
+)
+TELEGRAM_QUEUE_SECONDS = Histogram(
+    "bot_telegram_queue_seconds",
+    "Time Bot API requests waited for the outbound rate limit.",
+    ("priority",),
+)
+TELEGRAM_RETRIES = Counter(
+    "bot_telegram_api_retries_total",
+    "Bot API requests repeated after a RetryAfter error.",
+    ("method",),
+)
+FSM_SECONDS = Histogram(
+    "bot_fsm_storage_seconds",
+    "Time of FSM storage loads from SQLite and of flushes.",
+    ("operation",),
+)
+FSM_CACHE = Counter(
+    "bot_fsm_cache_total",
+    "FSM storage lookups served from memory (hit) or SQLite (miss).",
+    ("result",),
+)
+
+
+def render() -> str:
+    """Return every metric in the Prometheus text exposition format."""
+    return REGISTRY.render()
+
+
+async def start_metrics_server(host: str, port: int):
+    """Serve :func:`render` at ``http://host:port/metrics``.
+
+    Returns the ``aiohttp.web.AppRunner``; call its ``cleanup()`` to stop.
+    """
+    from aiohttp import web
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            body=render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
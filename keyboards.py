@@ -0,0 +1,107 @@
+"""Registry of reply keyboards shared by all handlers.
+
+Menus, region lists, body types and similar keyboards never change between
+messages, yet building a 78-row markup object for every answer is not free.
+Builders here are memoized: the first call creates the markup and later
+calls return the same (frozen) instance.  Cache keys are the button labels
+themselves, so a changed :class:`Config` list or a reloaded locations index
+yields a fresh keyboard automatically; :func:`invalidate` drops everything.
+
+The returned objects are shared and must not be modified by callers.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Callable
+
+from aiogram import types
+
+from config import Config
+from locations import get_regions
+
+# Button labels of the main and admin menus
+MAIN_MENU_ROWS = (
+    ("➕ Добавить груз",),
+    ("➕ Добавить ТС",),
+    ("🔍 Найти груз", "🔍 Найти ТС"),
+    ("📋 Мой профиль",),
+)
+ADMIN_MENU_ROWS = (
+    ("Статистика",),
+    ("Пользователи",),
+    ("Активные грузы",),
+    ("Активные ТС",),
+    ("Экспорт", "Импорт"),
+    ("Рассылка", "Статус рассылок"),
+    ("↩️ Выход",),
+)
+
+_caches: list[Callable] = []
+
+
+def _memoized(maxsize: int | None = None):
+    """``lru_cache`` that also registers the builder for :func:`invalidate`."""
+
+    def decorator(func):
+        cached = lru_cache(maxsize=maxsize)(func)
+        _caches.append(cached)
+        return cached
+
+    return decorator
+
+
+def invalidate() -> None:
+    """Forget every cached keyboard."""
+    for cached in _caches:
+        cached.cache_clear()
+
+
+@_memoized(maxsize=1024)
+def build(
+    rows: tuple[tuple[str, ...], ...], one_time: bool = True
+) -> types.ReplyKeyboardMarkup:
+    """Return the shared reply keyboard with button labels ``rows``."""
+    return types.ReplyKeyboardMarkup(
+        keyboard=[[types.KeyboardButton(text=text) for text in row] for row in rows],
+        resize_keyboard=True,
+        one_time_keyboard=one_time,
+    )
+
+
+@_memoized(maxsize=1024)
+def column(options: tuple[str, ...]) -> types.ReplyKeyboardMarkup:
+    """Return a one-time keyboard with one button per row."""
+    return build(tuple((o,) for o in options))
+
+
+# Suggestion lists vary with the typed text, so only the recent ones are kept
+@_memoized(maxsize=512)
+def grid(options: tuple[str, ...], width: int = 2) -> types.ReplyKeyboardMarkup:
+    """Return a compact one-time keyboard with ``width`` buttons per row."""
+    return build(
+        tuple(options[i:i + width] for i in range(0, len(options), width))
+    )
+
+
+def main_menu() -> types.ReplyKeyboardMarkup:
+    return build(MAIN_MENU_ROWS, one_time=False)
+
+
+def admin_menu() -> types.ReplyKeyboardMarkup:
+    return build(ADMIN_MENU_ROWS, one_time=False)
+
+
+def regions() -> types.ReplyKeyboardMarkup:
+    """Keyboard listing every region of :func:`locations.get_regions`."""
+    return column(get_regions())
+
+
+def body_types(any_option: str) -> types.ReplyKeyboardMarkup:
+    """Keyboard of :attr:`Config.BODY_TYPES` plus the ``any_option`` button."""
+    return column((*Config.BODY_TYPES, any_option))
+
+
+def directions() -> types.ReplyKeyboardMarkup:
+    """Keyboard of :attr:`Config.TRUCK_DIRECTIONS`."""
+    return column(tuple(Config.TRUCK_DIRECTIONS))
@@ -2,39 +2,245 @@
 
 from __future__ import annotations
 
+import difflib
 import json
+import logging
 import os
+import pickle
+import re
+import sys
+from array import array
 from functools import lru_cache
-from typing import List
+from typing import NamedTuple
 
 _DATA_FILE = os.path.join(os.path.dirname(__file__), "russia.json")
+# Compiled form of :data:`_DATA_FILE`, rebuilt whenever the JSON changes
+_INDEX_FILE = os.path.join(os.path.dirname(__file__), "russia.idx")
+_INDEX_VERSION = 1
 
+# Words of region names that do not identify a region on their own
+_REGION_STOPWORDS = frozenset(
+    {"и", "обл", "область", "край", "респ", "республика", "ао", "автономный", "округ"}
+)
+_WORD_RE = re.compile(r"[^\W\d_]+(?:-[^\W\d_]+)*")
+_LIST_SEPARATORS = re.compile(r"[,;\n]+")
 
-@lru_cache(maxsize=1)
-def _load_mapping() -> dict[str, list[str]]:
-    """Load region to city mapping from :data:`russia.json`."""
-    with open(_DATA_FILE, "r", encoding="utf-8") as fh:
+
+class _Index(NamedTuple):
+    """Regions and cities with integer ids.
+
+    ``regions`` is sorted; region ``i`` owns the sorted, de-duplicated slice
+    ``cities[offsets[i]:offsets[i + 1]]`` and ``city_region[j]`` is the id of
+    the region city ``j`` belongs to.
+    """
+
+    regions: tuple[str, ...]
+    cities: tuple[str, ...]
+    offsets: array
+    city_region: array
+
+
+def _source_stamp(path: str) -> tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def compile_index(json_path: str = _DATA_FILE) -> _Index:
+    """Build the index from the ``russia.json`` file at ``json_path``."""
+    with open(json_path, "r", encoding="utf-8") as fh:
         records = json.load(fh)
 
-    mapping: dict[str, list[str]] = {}
+    mapping: dict[str, set[str]] = {}
     for row in records:
-        region = row["region"]
-        city = row["city"]
-        mapping.setdefault(region, []).append(city)
+        mapping.setdefault(row["region"], set()).add(row["city"])
+
+    regions = tuple(sorted(mapping))
+    cities: list[str] = []
+    offsets = array("I", [0])
+    city_region = array("H")
+    for region_id, region in enumerate(regions):
+        names = sorted(mapping[region])
+        cities.extend(names)
+        city_region.extend([region_id] * len(names))
+        offsets.append(len(cities))
+    return _Index(regions, tuple(cities), offsets, city_region)
+
+
+def build_index(json_path: str = _DATA_FILE, index_path: str = _INDEX_FILE) -> _Index:
+    """Compile ``json_path`` and store the result at ``index_path``."""
+    index = compile_index(json_path)
+    payload = {
+        "version": _INDEX_VERSION,
+        "source": _source_stamp(json_path),
+        "index": tuple(index),
+    }
+    tmp = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, index_path)
+    return index
+
+
+def _read_index(json_path: str, index_path: str) -> _Index | None:
+    """Return the stored index if it was built from the current JSON."""
+    try:
+        with open(index_path, "rb") as fh:
+            payload = pickle.load(fh)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logging.warning("Ignoring unreadable locations index %s", index_path)
+        return None
+    if payload.get("version") != _INDEX_VERSION:
+        return None
+    try:
+        if tuple(payload.get("source", ())) != _source_stamp(json_path):
+            return None
+    except FileNotFoundError:
+        pass  # Only the compiled index was deployed
+    return _Index(*payload["index"])
+
+
+@lru_cache(maxsize=1)
+def _load_index() -> _Index:
+    """Load the locations index, recompiling it when ``russia.json`` changed."""
+    index = _read_index(_DATA_FILE, _INDEX_FILE)
+    if index is None:
+        try:
+            index = build_index(_DATA_FILE, _INDEX_FILE)
+        except OSError:
+            logging.warning("Could not write %s, using JSON directly", _INDEX_FILE)
+            index = compile_index(_DATA_FILE)
+    intern = sys.intern
+    return index._replace(
+        regions=tuple(intern(r) for r in index.regions),
+        cities=tuple(intern(c) for c in index.cities),
+    )
+
+
+@lru_cache(maxsize=1)
+def _cities_by_region() -> dict[str, tuple[str, ...]]:
+    index = _load_index()
+    return {
+        region: index.cities[index.offsets[i]:index.offsets[i + 1]]
+        for i, region in enumerate(index.regions)
+    }
+
+
+def get_index() -> _Index:
+    """Return the loaded locations index (regions, flat city list, offsets)."""
+    return _load_index()
+
+
+def get_regions() -> tuple[str, ...]:
+    """Return all regions, sorted."""
+    return _load_index().regions
+
+
+def get_cities(region: str) -> tuple[str, ...]:
+    """Return the sorted cities of ``region`` (empty for unknown regions)."""
+    return _cities_by_region().get(region, ())
+
+
+def is_region(name: str) -> bool:
+    """Return whether ``name`` is exactly one of :func:`get_regions`."""
+    return name in _cities_by_region()
+
+
+@lru_cache(maxsize=None)
+def _city_set(region: str) -> frozenset[str]:
+    return frozenset(get_cities(region))
+
+
+def is_city(region: str, city: str) -> bool:
+    """Return whether ``city`` is listed for ``region``."""
+    return city in _city_set(region)
+
+
+@lru_cache(maxsize=1)
+def _region_aliases() -> dict[str, str]:
+    """Map casefolded spellings to canonical region names.
+
+    Aliases are the full region name, each significant word of it (so both
+    "Башкортостан" and "Башкирия" are understood) and the names of the
+    region's cities.  Aliases shared by several regions are dropped.
+    """
+    aliases: dict[str, str] = {}
+    ambiguous: set[str] = set()
+
+    def add(alias: str, region: str) -> None:
+        if aliases.setdefault(alias, region) != region:
+            ambiguous.add(alias)
+
+    index = _load_index()
+    for region in index.regions:
+        add(region.casefold(), region)
+        for word in _WORD_RE.findall(region.casefold()):
+            if word not in _REGION_STOPWORDS and len(word) > 2:
+                add(word, region)
+    for city, region_id in zip(index.cities, index.city_region):
+        add(city.casefold(), index.regions[region_id])
+
+    for alias in ambiguous:
+        del aliases[alias]
+    return aliases
+
+
+def normalize_region(text: str) -> str | None:
+    """Return the canonical region for free-form ``text`` or ``None``.
+
+    Exact names, single words of a name ("тверская"), city names ("Тверь"),
+    small typos and shortened forms are accepted as long as they point to a
+    single region.
+    """
+    key = " ".join(text.casefold().split())
+    if not key:
+        return None
+    aliases = _region_aliases()
+    if key in aliases:
+        return aliases[key]
+
+    words = [w for w in _WORD_RE.findall(key) if w not in _REGION_STOPWORDS]
+    for word in words:
+        if word in aliases:
+            return aliases[word]
+
+    close = difflib.get_close_matches(key, aliases.keys(), n=1, cutoff=0.8)
+    if close:
+        return aliases[close[0]]
+
+    for word in words:
+        if len(word) < 4:
+            continue
+        stem = word[: max(4, len(word) - 2)]
+        found = {r for alias, r in aliases.items() if alias.startswith(stem)}
+        if len(found) == 1:
+            return found.pop()
+    return None
 
-    for cities in mapping.values():
-        cities.sort()
-    return mapping
 
+def parse_regions(text: str) -> tuple[list[str], list[str]]:
+    """Split a comma-separated list into canonical regions and leftovers.
 
-def get_regions() -> list[str]:
-    """Return the full sorted list of regions."""
-    mapping = _load_mapping()
-    regions = sorted(mapping.keys())
-    return regions
+    Returns ``(regions, unknown)``: recognised regions without duplicates in
+    input order and the parts that could not be matched to any region.
+    """
+    regions: list[str] = []
+    unknown: list[str] = []
+    for part in _LIST_SEPARATORS.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        region = normalize_region(part)
+        if region is None:
+            unknown.append(part)
+        elif region not in regions:
+            regions.append(region)
+    return regions, unknown
 
 
-def get_cities(region: str) -> list[str]:
-    """Return the full sorted list of cities for ``region``."""
-    mapping = _load_mapping()
-    return mapping.get(region, [])
+if __name__ == "__main__":
+    built = build_index()
+    print(
+        f"{_INDEX_FILE}: {len(built.regions)} регионов, {len(built.cities)} городов"
+    )
@@ -0,0 +1,370 @@
+"""Matching of cargo with trucks able to carry it, and vice versa.
+
+Cargo and trucks are kept in an in-memory index keyed by
+``(region, body type, date bucket)``.  A cargo entry is indexed under its
+departure region and every bucket its loading window touches; a truck under
+its parking region, the regions of its route and every bucket of its
+availability window.  Looking up counterparts is then a handful of dictionary
+probes followed by exact checks and ranking of the few candidates found,
+instead of users repeating searches city by city.
+
+Only the days from today to :attr:`Config.MATCH_HORIZON_DAYS` ahead are
+indexed, so a far-off ``date_to`` cannot blow up the index, and listings
+whose ``date_to`` has passed are dropped.  Entries hold just the fields
+needed for matching; the rows shown to users, with the owner's current
+name, are read from the database for the matches found.
+
+The index is built lazily on first use and kept current through
+:func:`db.add_change_listener`: changed rows are only marked dirty when their
+transaction commits and are re-read before the next lookup.  Changes made by
+other bot processes sharing the database are picked up from
+:func:`db.sync_changes` before every lookup.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Iterable, NamedTuple
+
+import db
+from config import Config
+from locations import normalize_region, parse_regions
+
+# Width of a date bucket in days; a window spanning N buckets is stored N times
+BUCKET_DAYS = 7
+
+
+def _today() -> int:
+    return date.today().toordinal()
+
+
+def _parse_day(value: str | None) -> int | None:
+    try:
+        return date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def _key(value: str | None) -> str:
+    return db.normalize_city(value) or ""
+
+
+# Body type answers meaning "any body" ("Любой" for trucks, "Не важно" for
+# cargo) are stored under the empty key
+_ANY_BODY = ""
+_ANY_BODY_ANSWERS = frozenset({"любой", "не важно"})
+
+
+def _body_key(value: str | None) -> str:
+    key = _key(value)
+    return _ANY_BODY if key in _ANY_BODY_ANSWERS else key
+
+
+def _region_key(value: str | None) -> str:
+    return _key(normalize_region(value or "") or value)
+
+
+def parse_route_regions(text: str | None) -> frozenset[str]:
+    """Return keys of the regions listed in a truck's ``route_regions``.
+
+    Parts are mapped to canonical regions like the add-truck flow does;
+    unrecognised parts are kept as typed.
+    """
+    if not text:
+        return frozenset()
+    regions, unknown = parse_regions(text)
+    return frozenset(_key(r) for r in regions + unknown)
+
+
+@dataclass(frozen=True, slots=True)
+class _Entry:
+    """Fields of a cargo or truck row relevant for matching."""
+
+    user_id: int
+    regions: frozenset[str]  # cargo: departure region; truck: parking + route
+    region: str  # cargo: departure region; truck: parking region
+    city: str  # cargo: departure city; truck: parking city
+    region_to: str  # cargo only
+    body_type: str
+    weight: int
+    start: int
+    end: int
+
+    def buckets(self, first: int, last: int) -> range:
+        """Buckets of the window's days between ``first`` and ``last``."""
+        start, end = max(self.start, first), min(self.end, last)
+        if start > end:
+            return range(0)
+        return range(start // BUCKET_DAYS, end // BUCKET_DAYS + 1)
+
+
+def _cargo_entry(row: sqlite3.Row) -> _Entry | None:
+    start, end = _parse_day(row["date_from"]), _parse_day(row["date_to"])
+    if start is None or row["weight"] is None:
+        return None
+    region = _region_key(row["region_from"])
+    return _Entry(
+        user_id=row["user_id"],
+        regions=frozenset((region,)),
+        region=region,
+        city=_key(row["city_from"]),
+        region_to=_region_key(row["region_to"]),
+        body_type=_body_key(row["body_type"]),
+        weight=row["weight"],
+        start=start,
+        end=max(start, end if end is not None else start),
+    )
+
+
+def _truck_entry(row: sqlite3.Row) -> _Entry | None:
+    start, end = _parse_day(row["date_from"]), _parse_day(row["date_to"])
+    if start is None or row["weight"] is None:
+        return None
+    region = _region_key(row["region"])
+    return _Entry(
+        user_id=row["user_id"],
+        regions=parse_route_regions(row["route_regions"]) | {region},
+        region=region,
+        city=_key(row["city"]),
+        region_to="",
+        body_type=_body_key(row["body_type"]),
+        weight=row["weight"],
+        start=start,
+        end=max(start, end if end is not None else start),
+    )
+
+
+def _score(cargo: _Entry, truck: _Entry) -> float | None:
+    """Rank ``truck`` for ``cargo``; ``None`` when they are incompatible."""
+    if cargo.user_id == truck.user_id or truck.weight < cargo.weight:
+        return None
+    overlap = min(cargo.end, truck.end) - max(cargo.start, truck.start) + 1
+    if overlap <= 0:
+        return None
+
+    score = 2.0 if truck.region == cargo.region else 1.0
+    if cargo.region_to in truck.regions:
+        score += 2.0
+    if cargo.city and truck.city == cargo.city:
+        score += 1.0
+    score += overlap / (cargo.end - cargo.start + 1)
+    score += cargo.weight / truck.weight
+    return score
+
+
+class Match(NamedTuple):
+    """A counterpart found by :func:`match_cargo` or :func:`match_truck`."""
+
+    score: float
+    row: sqlite3.Row  # with the owner's ``name``
+
+
+class _Side:
+    """Entries of one table plus their ``(region, body, bucket)`` index.
+
+    Only the days from ``first`` to ``last`` (ordinals) are indexed.
+    """
+
+    def __init__(self, first: int, last: int) -> None:
+        self.first = first
+        self.last = last
+        self.entries: dict[int, _Entry] = {}
+        # Buckets each entry was indexed under, which depend on the window
+        self.indexed: dict[int, range] = {}
+        self.index: defaultdict[tuple[str, str, int], set[int]] = defaultdict(set)
+        self.body_types: set[str] = set()
+
+    def put(self, row_id: int, entry: _Entry | None) -> None:
+        self.remove(row_id)
+        if entry is None or entry.end < self.first:
+            return
+        self.entries[row_id] = entry
+        self.indexed[row_id] = buckets = entry.buckets(self.first, self.last)
+        self.body_types.add(entry.body_type)
+        for region in entry.regions:
+            for bucket in buckets:
+                self.index[(region, entry.body_type, bucket)].add(row_id)
+
+    def remove(self, row_id: int) -> None:
+        entry = self.entries.pop(row_id, None)
+        if entry is None:
+            return
+        buckets = self.indexed.pop(row_id)
+        for region in entry.regions:
+            for bucket in buckets:
+                key = (region, entry.body_type, bucket)
+                ids = self.index[key]
+                ids.discard(row_id)
+                if not ids:
+                    del self.index[key]
+
+    def candidates(
+        self, regions: Iterable[str], body_type: str, buckets: range
+    ) -> set[int]:
+        # A specific body type is served by the same and by "any" entries,
+        # "any" by entries of every body type
+        if body_type == _ANY_BODY:
+            bodies = self.body_types
+        else:
+            bodies = {body_type, _ANY_BODY}
+        found: set[int] = set()
+        for region in regions:
+            for body in bodies:
+                for bucket in buckets:
+                    found |= self.index.get((region, body, bucket), set())
+        return found
+
+    def roll(self, first: int, last: int) -> None:
+        """Move the indexed days to ``first``..``last`` (later than before).
+
+        Expired entries are dropped and those reaching past the old window
+        are indexed again; buckets of days gone by are left until the entry
+        expires, since lookups no longer reach them.
+        """
+        old_last = self.last
+        self.first, self.last = first, last
+        for row_id, entry in list(self.entries.items()):
+            if entry.end < first:
+                self.remove(row_id)
+            elif entry.end > old_last:
+                self.put(row_id, entry)
+
+
+class MatchIndex:
+    """Thread-safe index of cargo and trucks for :mod:`db` at ``DB_PATH``."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._path: str | None = None
+        self._cargo = _Side(0, 0)
+        self._trucks = _Side(0, 0)
+        self._dirty: dict[str, set[int]] = {"cargo": set(), "trucks": set()}
+
+    def mark_dirty(self, table: str, row_id: int) -> None:
+        """Change listener: re-read ``row_id`` of ``table`` before next lookup."""
+        with self._lock:
+            if table in self._dirty:
+                self._dirty[table].add(row_id)
+
+    def invalidate(self) -> None:
+        """Drop everything; the index is rebuilt on the next lookup."""
+        with self._lock:
+            self._path = None
+
+    def _sync(self) -> None:
+        # Called with the lock held
+        first = _today()
+        last = first + Config.MATCH_HORIZON_DAYS
+        if self._path != db.DB_PATH:
+            self._cargo, self._trucks = _Side(first, last), _Side(first, last)
+            for table in self._dirty.values():
+                table.clear()
+            for row in db.get_cargo_with_owner():
+                self._cargo.put(row["id"], _cargo_entry(row))
+            for row in db.get_trucks_with_owner():
+                self._trucks.put(row["id"], _truck_entry(row))
+            self._path = db.DB_PATH
+            return
+
+        if first != self._cargo.first:
+            self._cargo.roll(first, last)
+            self._trucks.roll(first, last)
+        for side, load, make, table in (
+            (self._cargo, db.get_cargo_with_owner, _cargo_entry, "cargo"),
+            (self._trucks, db.get_trucks_with_owner, _truck_entry, "trucks"),
+        ):
+            dirty = self._dirty[table]
+            if not dirty:
+                continue
+            rows = {row["id"]: row for row in load(sorted(dirty))}
+            for row_id in dirty:
+                row = rows.get(row_id)
+                side.put(row_id, make(row) if row else None)
+            dirty.clear()
+
+    def _sync_other_processes(self) -> None:
+        # Must run without the lock: replayed changes call mark_dirty
+        if not db.sync_changes():
+            self.invalidate()
+
+    def match_cargo(self, cargo_id: int, limit: int = 10) -> list[Match]:
+        """Return trucks for cargo ``cargo_id``, best first."""
+        self._sync_other_processes()
+        with self._lock:
+            self._sync()
+            cargo = self._cargo.entries.get(cargo_id)
+            if cargo is None:
+                return []
+            found = []
+            for truck_id in self._trucks.candidates(
+                cargo.regions,
+                cargo.body_type,
+                cargo.buckets(self._trucks.first, self._trucks.last),
+            ):
+                truck = self._trucks.entries[truck_id]
+                score = _score(cargo, truck)
+                if score is not None:
+                    found.append((score, truck.start, truck_id))
+        return _best(found, limit, db.get_trucks_with_owner)
+
+    def match_truck(self, truck_id: int, limit: int = 10) -> list[Match]:
+        """Return cargo for truck ``truck_id``, best first."""
+        self._sync_other_processes()
+        with self._lock:
+            self._sync()
+            truck = self._trucks.entries.get(truck_id)
+            if truck is None:
+                return []
+            found = []
+            for cargo_id in self._cargo.candidates(
+                truck.regions,
+                truck.body_type,
+                truck.buckets(self._cargo.first, self._cargo.last),
+            ):
+                cargo = self._cargo.entries[cargo_id]
+                score = _score(cargo, truck)
+                if score is not None:
+                    found.append((score, cargo.start, cargo_id))
+        return _best(found, limit, db.get_cargo_with_owner)
+
+
+def _best(
+    found: list[tuple[float, int, int]],
+    limit: int,
+    load: Callable[[list[int]], list[sqlite3.Row]],
+) -> list[Match]:
+    """Rank ``(score, start, id)`` candidates and read the top rows."""
+    found.sort(key=lambda m: (-m[0], m[1], m[2]))
+    found = found[:limit]
+    rows = {row["id"]: row for row in load([row_id for _, _, row_id in found])}
+    # A row deleted meanwhile is skipped
+    return [Match(score, rows[row_id]) for score, _, row_id in found if row_id in rows]
+
+
+_index = MatchIndex()
+db.add_change_listener(_index.mark_dirty)
+
+
+def match_cargo(cargo_id: int, limit: int = 10) -> list[Match]:
+    """Return up to ``limit`` trucks suitable for cargo ``cargo_id``.
+
+    A truck matches when it stands in, or passes through, the cargo's
+    departure region, has a compatible body type ("Любой"/"Не важно" match
+    every type), can carry the weight and is
+    available on at least one loading day.  Trucks already in the departure
+    region and those heading to the destination region rank first.
+    Blocking; call through :func:`async_db.run` from handlers.
+    """
+    return _index.match_cargo(cargo_id, limit)
+
+
+def match_truck(truck_id: int, limit: int = 10) -> list[Match]:
+    """Return up to ``limit`` cargo entries suitable for truck ``truck_id``.
+
+    Uses the same compatibility rules and ranking as :func:`match_cargo`.
+    """
+    return _index.match_truck(truck_id, limit)
@@ -0,0 +1,102 @@
+"""Background deletion of messages that are no longer needed.
+
+Wizard steps remove the user's answer and the previous question so the chat
+shows only the current question.  Deleting them one by one before sending
+the next question cost two Bot API round trips per step.  Handlers instead
+queue the IDs with :meth:`MessageCleaner.delete` (non-blocking) and reply
+straight away; a background task collects everything queued within
+:attr:`Config.MESSAGE_CLEANUP_DELAY` seconds and removes it with one
+``deleteMessages`` request per chat (up to 100 messages each).
+
+Deletion is best effort, as before: messages that are already gone or too
+old to delete are skipped by Telegram, and failed requests are only logged.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+from config import Config
+
+# Message IDs accepted by one deleteMessages request
+MAX_BATCH = 100
+
+
+class MessageCleaner:
+    """Queues message deletions of ``bot`` and sends them in batches."""
+
+    def __init__(self, bot: Bot, *, delay: float | None = None) -> None:
+        self.bot = bot
+        self.delay = Config.MESSAGE_CLEANUP_DELAY if delay is None else delay
+        self._pending: dict[int, list[int]] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        """Number of message IDs waiting to be deleted."""
+        return sum(len(ids) for ids in self._pending.values())
+
+    def delete(self, chat_id: int, *message_ids: int | None) -> None:
+        """Queue deletion of ``message_ids`` in ``chat_id``; ``None`` is skipped."""
+        ids = [mid for mid in message_ids if mid]
+        if not ids:
+            return
+        self._pending.setdefault(chat_id, []).extend(ids)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="message-cleanup")
+
+    async def flush(self) -> None:
+        """Wait until every queued message has been handled."""
+        while self._task is not None and not self._task.done():
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Delete queued messages without waiting for more."""
+        self.delay = 0
+        await self.flush()
+
+    async def _run(self) -> None:
+        while self._pending:
+            # Deletions queued meanwhile go into the same requests
+            await asyncio.sleep(self.delay)
+            pending, self._pending = self._pending, {}
+            await asyncio.gather(
+                *(self._delete(chat_id, ids) for chat_id, ids in pending.items())
+            )
+
+    async def _delete(self, chat_id: int, ids: list[int]) -> None:
+        ids = sorted(set(ids))
+        for start in range(0, len(ids), MAX_BATCH):
+            batch = ids[start:start + MAX_BATCH]
+            try:
+                await self.bot.delete_messages(chat_id, batch)
+            except TelegramRetryAfter as e:
+                # Retried in the next round
+                self._pending.setdefault(chat_id, []).extend(ids[start:])
+                await asyncio.sleep(e.retry_after)
+                return
+            except TelegramAPIError as e:
+                logging.debug("Could not delete messages in %s: %s", chat_id, e)
+            except Exception:
+                logging.exception("Failed to delete messages in %s", chat_id)
+
+
+_cleaner: MessageCleaner | None = None
+
+
+def get_cleaner(bot: Bot) -> MessageCleaner:
+    """Return the cleaner of ``bot``, creating it on first use."""
+    global _cleaner
+    if _cleaner is None or _cleaner.bot is not bot:
+        _cleaner = MessageCleaner(bot)
+    return _cleaner
+
+
+async def on_shutdown() -> None:
+    """Dispatcher shutdown hook: delete messages still queued."""
+    if _cleaner is not None:
+        await _cleaner.close()
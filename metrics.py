@@ -1,17 +1,50 @@
-"""Statistics helpers for bot usage metrics."""
+"""Statistics helpers for bot usage metrics.
 
-from utils import db_cursor
+Numbers come from counters that triggers in :mod:`db` keep up to date
+(``stats_totals`` and the hourly ``stats_hourly`` buckets), so the cost of a
+query depends on the length of the window, not on the number of users.
+Windows are measured in whole hours of UTC time.
+"""
 
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import db
+
+# Windows shown in the admin statistics: (title, hours)
+STAT_WINDOWS = (("24ч", 24), ("7 дней", 24 * 7), ("30 дней", 24 * 30))
+
+
+@dataclass(slots=True)
+class WindowStats:
+    """Activity during the last ``hours`` hours."""
+
+    hours: int
+    users: int = 0
+    cargo: int = 0
+    trucks: int = 0
+    cargo_search: int = 0
+    truck_search: int = 0
 
-def get_bot_statistics():
-    """Return total number of users and users registered in the last 24 hours."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
 
-        cursor.execute(
-            "SELECT COUNT(*) FROM users WHERE datetime(created_at) >= datetime('now', '-1 day')"
-        )
-        new_users = cursor.fetchone()[0]
+def _since_hour(hours: int) -> str:
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    return since.strftime("%Y-%m-%d %H:00")
 
+
+def get_window_stats(hours: int) -> WindowStats:
+    """Return registrations, new cargo/trucks and searches of the last ``hours``."""
+    return WindowStats(hours, **db.get_stats_since(_since_hour(hours)))
+
+
+def get_statistics() -> tuple[dict[str, int], list[tuple[str, WindowStats]]]:
+    """Return current totals and activity for every window of :data:`STAT_WINDOWS`."""
+    windows = [(title, get_window_stats(hours)) for title, hours in STAT_WINDOWS]
+    return db.get_stats_totals(), windows
+
+
+def get_bot_statistics():
+    """Return total number of users and users registered in the last 24 hours."""
+    total_users = db.get_stats_totals()["users"]
+    new_users = get_window_stats(24).users
     return total_users, new_users
@@ -0,0 +1,82 @@
+"""Dispatcher middlewares shared by all handlers."""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from identity import resolve_user_id
+from instrumentation import (
+    HANDLER_ERRORS,
+    HANDLER_SECONDS,
+    TELEGRAM_ERRORS,
+    TELEGRAM_SECONDS,
+)
+
+
+class UserIdentityMiddleware(BaseMiddleware):
+    """Resolve the sender's ``users.id`` once per update.
+
+    The ID (``None`` for unregistered users) is passed to handlers declaring
+    a ``user_id`` parameter, so they never look the sender up themselves.
+    Register it as an outer middleware of ``dp.update`` so the
+    ``event_from_user`` set by aiogram is available.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None and not user.is_bot:
+            data["user_id"] = await resolve_user_id(user.id)
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Time every handler call under the name of the handler function.
+
+    Register it as an inner middleware of each observer (``dp.message``,
+    ``dp.callback_query``, ...) so aiogram has already picked the handler.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        name = getattr(callback, "__name__", "unknown")
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, handler=name)
+
+
+class TelegramApiMetricsMiddleware:
+    """Bot session middleware timing Telegram Bot API requests per method.
+
+    Install with ``bot.session.middleware(TelegramApiMetricsMiddleware())``.
+    """
+
+    async def __call__(self, make_request, bot, method) -> Any:
+        name = getattr(method, "__api_method__", type(method).__name__)
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - start, method=name)
@@ -0,0 +1,132 @@
+"""Rate limiting of outgoing Bot API requests.
+
+Telegram allows about 30 messages per second per bot and about one message
+per second to the same chat; beyond that it answers ``RetryAfter``.
+:class:`OutboundScheduler` is a bot session middleware (installed by
+:func:`bot.create_bot`) through which every request passes:
+
+* requests that send, edit or delete messages take a token from a bucket
+  refilled at :attr:`Config.TELEGRAM_RATE` per second; other methods
+  (``getUpdates``, ``answerCallbackQuery``...) are not limited;
+* waiting requests are served by priority: replies to users
+  (:data:`INTERACTIVE`, the default) go before :data:`BULK` ones, so
+  handlers stay responsive while a broadcast uses the rest of the rate.
+  Code sending in bulk calls :func:`set_priority` in its task;
+* bulk requests to one chat are spaced :attr:`Config.TELEGRAM_CHAT_INTERVAL`
+  seconds apart.  Interactive ones are not: a handler sends a few messages
+  at once, which Telegram tolerates in short bursts;
+* after ``RetryAfter`` all limited requests wait as long as Telegram asks and
+  the request is repeated up to :attr:`Config.TELEGRAM_MAX_RETRIES` times.
+
+The queue length and waiting time per priority are exported as metrics.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextvars import ContextVar
+from typing import Any
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import Config
+from instrumentation import TELEGRAM_QUEUE_DEPTH, TELEGRAM_QUEUE_SECONDS, TELEGRAM_RETRIES
+from ratelimit import KeyedRateLimiter, TokenBucket
+
+# Priority classes, served in this order
+INTERACTIVE, BULK = "interactive", "bulk"
+_ORDER = {INTERACTIVE: 0, BULK: 1}
+
+# Methods counted against the rate limit (by name prefix)
+_LIMITED_PREFIXES = ("send", "edit", "delete", "copy", "forward")
+_UNLIMITED = {"deleteWebhook"}
+
+_priority: ContextVar[str] = ContextVar("outbound_priority", default=INTERACTIVE)
+
+
+def set_priority(priority: str) -> None:
+    """Send requests of the current task (and tasks it starts) with ``priority``."""
+    if priority not in _ORDER:
+        raise ValueError(f"Unknown priority {priority!r}")
+    _priority.set(priority)
+
+
+def is_limited(method_name: str) -> bool:
+    """Return whether Bot API method ``method_name`` counts against the limit."""
+    return method_name.startswith(_LIMITED_PREFIXES) and method_name not in _UNLIMITED
+
+
+class OutboundScheduler:
+    """Bot session middleware pacing requests by priority.
+
+    Install with ``bot.session.middleware(OutboundScheduler())`` before other
+    session middlewares, so they see only the time of the request itself.
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float | None = None,
+        chat_interval: float | None = None,
+        max_retries: int | None = None,
+    ) -> None:
+        self._bucket = TokenBucket(rate or Config.TELEGRAM_RATE)
+        self._chats = KeyedRateLimiter(
+            Config.TELEGRAM_CHAT_INTERVAL if chat_interval is None else chat_interval
+        )
+        self.max_retries = (
+            Config.TELEGRAM_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._granter: asyncio.Task | None = None
+
+    @property
+    def waiting(self) -> int:
+        """Number of requests waiting for their turn."""
+        return sum(not fut.done() for _, _, fut in self._waiters)
+
+    async def __call__(self, make_request, bot, method) -> Any:
+        name = getattr(method, "__api_method__", type(method).__name__)
+        if not is_limited(name):
+            return await make_request(bot, method)
+        priority = _priority.get()
+        chat_id = getattr(method, "chat_id", None)
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(priority, chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                # Flood limits apply to the whole bot
+                self._bucket.pause(e.retry_after)
+                TELEGRAM_RETRIES.inc(method=name)
+
+    async def _wait_turn(self, priority: str, chat_id: Any) -> None:
+        start = time.perf_counter()
+        if priority == BULK and chat_id is not None:
+            await self._chats.acquire(chat_id)
+        turn = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (_ORDER[priority], next(self._seq), turn))
+        if self._granter is None or self._granter.done():
+            self._granter = asyncio.create_task(self._grant(), name="outbound-scheduler")
+        TELEGRAM_QUEUE_DEPTH.inc(priority=priority)
+        try:
+            await turn
+        finally:
+            TELEGRAM_QUEUE_DEPTH.dec(priority=priority)
+            TELEGRAM_QUEUE_SECONDS.observe(time.perf_counter() - start, priority=priority)
+
+    async def _grant(self) -> None:
+        # Tokens go to the most important waiter at the moment they are free
+        while self._waiters:
+            await self._bucket.acquire()
+            while self._waiters:
+                _, _, turn = heapq.heappop(self._waiters)
+                if not turn.done():
+                    turn.set_result(None)
+                    break
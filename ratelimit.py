@@ -0,0 +1,90 @@
+"""Asyncio rate limiters for outgoing Telegram requests.
+
+Telegram allows about 30 messages per second in total and about one message
+per second to the same chat; exceeding either results in ``RetryAfter``
+errors.  :class:`TokenBucket` paces the total rate and can be paused for the
+time requested by Telegram, :class:`KeyedRateLimiter` spaces requests per
+chat.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class TokenBucket:
+    """Allow ``rate`` acquisitions per second with bursts up to ``capacity``.
+
+    Waiters are served in FIFO order.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, capacity if capacity is not None else rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        async with self._lock:
+            while True:
+                now = self._clock()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Refuse acquisitions for ``seconds`` (e.g. after ``RetryAfter``)."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        # Start refilling from empty only when the pause ends
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+
+class KeyedRateLimiter:
+    """Allow one acquisition per ``interval`` seconds for every key.
+
+    Only the ``max_keys`` most recently used keys are remembered.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        max_keys: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.interval = interval
+        self.max_keys = max_keys
+        self._clock = clock
+        self._next: OrderedDict[Hashable, float] = OrderedDict()
+
+    async def acquire(self, key: Hashable) -> None:
+        now = self._clock()
+        ready = self._next.pop(key, now)
+        start = max(now, ready)
+        self._next[key] = start + self.interval
+        while len(self._next) > self.max_keys:
+            self._next.popitem(last=False)
+        if start > now:
+            await asyncio.sleep(start - now)
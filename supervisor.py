@@ -0,0 +1,344 @@
+"""Run the bot in several worker processes sharded by chat.
+
+``python bot.py`` handles every update in one process, so CPU-bound work
+(building keyboards, formatting results, serialising markups) is limited to
+one core.  ``python supervisor.py`` instead receives updates in a light
+supervisor process (long polling or, with ``BOT_MODE=webhook``, a webhook
+server using the ``WEBHOOK_*`` settings) and forwards each raw update to one of
+:attr:`Config.BOT_WORKERS` worker processes chosen by ``chat_id % workers``.
+Every worker runs the usual dispatcher from :func:`bot.create_dispatcher`.
+
+Routing by chat keeps all updates of a conversation in one worker, so the
+in-memory FSM and user ID caches stay valid.  The SQLite databases are
+shared in WAL mode; caches built from data other workers may change (the
+matching index) replay their writes through :func:`db.sync_changes`.  Only
+worker 0 resumes unfinished broadcasts and prunes the change log (see
+:mod:`housekeeping`).  Worker ``i`` serves its metrics on
+``METRICS_PORT + 1 + i``; the supervisor itself uses ``METRICS_PORT``.
+
+Dead workers are restarted.  On SIGINT/SIGTERM the supervisor stops
+receiving updates, lets workers finish the queued ones and waits for them
+to exit.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import queue
+import secrets
+import signal
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+import db
+from config import Config
+from instrumentation import Counter, start_metrics_server
+
+# Seconds between liveness checks of the workers
+_CHECK_INTERVAL = 1.0
+# Long polling timeout passed to getUpdates
+_POLL_TIMEOUT = 30
+# Seconds workers get to finish queued updates at shutdown
+_STOP_TIMEOUT = 60.0
+
+UPDATES_ROUTED = Counter(
+    "bot_updates_routed_total", "Updates forwarded to each worker.", ("worker",)
+)
+
+
+def chat_id_of(update: dict[str, Any]) -> int:
+    """Return the chat (or, failing that, user) ID a raw update belongs to."""
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = value.get("from") or value.get("user")
+        if user:
+            return user["id"]
+    return 0
+
+
+def shard_of(update: dict[str, Any], workers: int) -> int:
+    """Return the index of the worker handling ``update``."""
+    return chat_id_of(update) % workers
+
+
+# ---- Worker process ----
+
+def _worker_main(index: int, workers: int, updates: multiprocessing.Queue) -> None:
+    # The supervisor decides when workers stop (sentinel ``None``)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"[worker {index}] %(levelname)s %(name)s: %(message)s",
+    )
+    asyncio.run(_serve(index, workers, updates))
+
+
+async def _serve(index: int, workers: int, updates: multiprocessing.Queue) -> None:
+    from async_db import shutdown
+    from bot import create_bot, create_dispatcher
+    from db_pool import close_all
+
+    parent = multiprocessing.parent_process()
+    # Telegram's limit is per bot: workers share it
+    bot = create_bot(rate=Config.TELEGRAM_RATE / workers)
+    dp = create_dispatcher(resume_broadcasts=index == 0, prune_change_log=index == 0)
+    workflow = {"bot": bot, "bots": [bot], "dispatcher": dp, **dp.workflow_data}
+    metrics_runner = None
+    if Config.METRICS_PORT:
+        metrics_runner = await start_metrics_server(
+            Config.METRICS_HOST, Config.METRICS_PORT + 1 + index
+        )
+    tasks: set[asyncio.Task] = set()
+
+    async def handle(update: dict[str, Any]) -> None:
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            logging.exception("Failed to handle update %s", update.get("update_id"))
+
+    def next_update():
+        while parent is None or parent.is_alive():
+            try:
+                return updates.get(timeout=_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    loop = asyncio.get_running_loop()
+    await dp.emit_startup(**workflow)
+    try:
+        while (update := await loop.run_in_executor(None, next_update)) is not None:
+            task = asyncio.create_task(handle(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    finally:
+        await dp.emit_shutdown(**workflow)
+        await bot.session.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        shutdown()
+        close_all()
+
+
+# ---- Supervisor process ----
+
+class Supervisor:
+    """Starts, restarts and stops the workers and routes updates to them."""
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = [self._context.Queue() for _ in range(workers)]
+        self._processes: list[multiprocessing.Process | None] = [None] * workers
+        self._stopping = False
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self.workers, self._queues[index]),
+            name=f"bot-worker-{index}",
+        )
+        process.start()
+        self._processes[index] = process
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._start(index)
+
+    def route(self, update: dict[str, Any]) -> None:
+        index = shard_of(update, self.workers)
+        self._queues[index].put(update)
+        UPDATES_ROUTED.inc(worker=str(index))
+
+    async def watch(self) -> None:
+        """Restart workers that died."""
+        while not self._stopping:
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    logging.error(
+                        "Worker %d exited with code %s, restarting",
+                        index, process.exitcode,
+                    )
+                    self._start(index)
+            await asyncio.sleep(_CHECK_INTERVAL)
+
+    async def stop(self, timeout: float) -> None:
+        """Let workers finish queued updates, then wait for them to exit."""
+        self._stopping = True
+        for updates in self._queues:
+            updates.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logging.warning(
+                    "Worker %s did not stop in time, terminating", process.name
+                )
+                process.terminate()
+                process.join()
+
+
+class _ApiError(Exception):
+    """Bot API answered ``ok: false``."""
+
+    def __init__(self, description: str, retry_after: float | None) -> None:
+        super().__init__(description)
+        self.retry_after = retry_after
+
+
+async def _call(
+    session: aiohttp.ClientSession, token: str, method: str, **params: Any
+) -> Any:
+    # Raw Bot API call: updates are routed as JSON without parsing them here
+    async with session.post(
+        f"https://api.telegram.org/bot{token}/{method}",
+        json={k: v for k, v in params.items() if v is not None},
+        timeout=aiohttp.ClientTimeout(total=_POLL_TIMEOUT + 10),
+    ) as resp:
+        payload = await resp.json()
+    if not payload.get("ok"):
+        raise _ApiError(
+            f"{method} failed: {payload.get('description')}",
+            (payload.get("parameters") or {}).get("retry_after"),
+        )
+    return payload["result"]
+
+
+async def _poll(
+    session: aiohttp.ClientSession, token: str, allowed: list[str], supervisor: Supervisor
+) -> None:
+    await _call(session, token, "deleteWebhook")
+    offset = None
+    try:
+        while True:
+            try:
+                updates = await _call(
+                    session, token, "getUpdates",
+                    offset=offset, timeout=_POLL_TIMEOUT, allowed_updates=allowed,
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError, _ApiError) as e:
+                delay = getattr(e, "retry_after", None) or 5
+                logging.warning("getUpdates failed (%s), retrying in %ss", e, delay)
+                await asyncio.sleep(delay)
+                continue
+            for update in updates:
+                supervisor.route(update)
+                offset = update["update_id"] + 1
+    finally:
+        if offset is not None:
+            # Confirm routed updates so they are not received again
+            try:
+                await _call(
+                    session, token, "getUpdates", offset=offset, timeout=0, limit=1
+                )
+            except Exception:
+                logging.exception("Failed to confirm received updates")
+
+
+async def _serve_webhook(
+    session: aiohttp.ClientSession, token: str, allowed: list[str], supervisor: Supervisor
+) -> web.AppRunner:
+    secret = Config.WEBHOOK_SECRET
+    if Config.WEBHOOK_URL:
+        secret = secret or secrets.token_urlsafe(32)
+
+    async def receive(request: web.Request) -> web.Response:
+        header = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if secret and not secrets.compare_digest(header, secret):
+            return web.Response(text="Unauthorized", status=401)
+        supervisor.route(await request.json())
+        return web.json_response({})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "workers": supervisor.workers})
+
+    app = web.Application()
+    app.router.add_post(Config.WEBHOOK_PATH, receive)
+    app.router.add_get("/health", health)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, Config.WEBHOOK_HOST, Config.WEBHOOK_PORT).start()
+    if Config.WEBHOOK_URL:
+        await _call(
+            session, token, "setWebhook",
+            url=Config.WEBHOOK_URL.rstrip("/") + Config.WEBHOOK_PATH,
+            secret_token=secret,
+            allowed_updates=allowed,
+        )
+    return runner
+
+
+async def main(workers: int) -> None:
+    from bot import API_TOKEN, create_dispatcher
+
+    db.init_db()
+    # Update types the handlers need, as resolved by aiogram itself
+    allowed = create_dispatcher(resume_broadcasts=False).resolve_used_update_types()
+
+    supervisor = Supervisor(workers)
+    supervisor.start()
+    logging.info("Started %d workers", workers)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    metrics_runner = None
+    if Config.METRICS_PORT:
+        metrics_runner = await start_metrics_server(
+            Config.METRICS_HOST, Config.METRICS_PORT
+        )
+    watcher = asyncio.create_task(supervisor.watch())
+    async with aiohttp.ClientSession() as session:
+        webhook_runner = None
+        poller = None
+        try:
+            if Config.BOT_MODE == "webhook":
+                webhook_runner = await _serve_webhook(
+                    session, API_TOKEN, allowed, supervisor
+                )
+            else:
+                poller = asyncio.create_task(
+                    _poll(session, API_TOKEN, allowed, supervisor)
+                )
+            await stop.wait()
+        finally:
+            if poller is not None:
+                poller.cancel()
+                await asyncio.gather(poller, return_exceptions=True)
+            if webhook_runner is not None:
+                await webhook_runner.cleanup()
+            await supervisor.stop(_STOP_TIMEOUT)
+            watcher.cancel()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-w", "--workers", type=int, default=Config.BOT_WORKERS,
+        help="number of worker processes (default: BOT_WORKERS or CPU count)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="[supervisor] %(levelname)s %(name)s: %(message)s"
+    )
+    asyncio.run(main(max(1, args.workers)))
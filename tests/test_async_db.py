@@ -0,0 +1,82 @@
+import os
+import sys
+import asyncio
+import sqlite3
+import tempfile
+import threading
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import db
+import async_db
+
+
+def setup_temp_db(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    db.init_db()
+    return tmp.name
+
+
+def test_run_executes_off_event_loop_thread():
+    async def main():
+        return await async_db.run(threading.get_ident)
+
+    assert asyncio.run(main()) != threading.get_ident()
+
+
+def test_wrappers_forward_to_db(monkeypatch):
+    db_path = setup_temp_db(monkeypatch)
+
+    async def main():
+        await async_db.add_user(7, "N", "C", "+79991234567", "2024-01-01")
+        return await async_db.get_user_id(7)
+
+    user_id = asyncio.run(main())
+
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT id FROM users WHERE telegram_id = 7").fetchone()
+    conn.close()
+    assert user_id == row[0]
+
+
+def test_wrappers_follow_monkeypatched_db(monkeypatch):
+    monkeypatch.setattr(db, "get_cargo", lambda cid: {"id": cid})
+    assert asyncio.run(async_db.get_cargo(5)) == {"id": 5}
+
+
+def test_concurrent_writes_are_committed_together(monkeypatch):
+    db_path = setup_temp_db(monkeypatch)
+
+    def failing_write():
+        with db.get_connection() as conn:
+            conn.execute(
+                "INSERT INTO users (telegram_id, name) VALUES (99, 'ghost')"
+            )
+            raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            *(async_db.add_user(i, "N", "C", "p", "2024-01-01") for i in range(20)),
+            async_db.write(failing_write),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert isinstance(results[-1], RuntimeError)
+    assert sorted(results[:-1]) == list(range(1, 21))
+
+    conn = sqlite3.connect(db_path)
+    ids = {r[0] for r in conn.execute("SELECT telegram_id FROM users")}
+    conn.close()
+    assert ids == set(range(20))
+
+
+def test_init_db_enables_wal(monkeypatch):
+    db_path = setup_temp_db(monkeypatch)
+    conn = sqlite3.connect(db_path)
+    mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+    assert mode.lower() == "wal"
@@ -0,0 +1,32 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_load_benchmark_runs_all_scenarios(tmp_path):
+    # Separate interpreter: other tests replace parts of aiogram with stubs
+    out = tmp_path / "result.json"
+    subprocess.run(
+        [
+            sys.executable, os.path.join(ROOT, "benchmarks", "load.py"),
+            "--users", "3", "--concurrency", "2", "--cargo-rows", "50",
+            "--truck-rows", "20", "--seed-users", "5", "--json", str(out),
+        ],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        timeout=120,
+    )
+    result = json.loads(out.read_text(encoding="utf-8"))
+
+    assert result["errors"] == 0
+    assert set(result["scenarios"]) == {
+        "registration", "add_cargo", "add_truck", "search_cargo", "search_trucks"
+    }
+    assert result["updates"] == 3 * 35
+    assert result["handlers"]["cmd_start"]["count"] == 3
+    assert result["api_calls"]["sendMessage"] > 0
+    assert result["added"] == {"cargo": 3, "trucks": 3}
@@ -0,0 +1,77 @@
+import os
+import sys
+import asyncio
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aiohttp import ClientSession, web
+from aiogram import Bot, Dispatcher
+
+from webhook import build_app
+
+SECRET = "test-secret"
+
+
+def make_update(update_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "U"},
+            "text": text,
+        },
+    }
+
+
+async def serve(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def test_webhook_feeds_updates_and_checks_secret():
+    received = []
+    events = []
+
+    async def run():
+        dp = Dispatcher()
+
+        async def on_text(message):
+            await asyncio.sleep(0.05)
+            received.append(message.text)
+
+        async def on_shutdown():
+            # In-flight updates finish before the shutdown hooks
+            events.append(("shutdown", list(received)))
+
+        dp.message.register(on_text)
+        dp.shutdown.register(on_shutdown)
+        bot = Bot("42:TEST")
+        runner, base = await serve(build_app(dp, bot, path="/hook", secret=SECRET))
+        try:
+            async with ClientSession() as session:
+                async with session.get(base + "/health") as resp:
+                    assert resp.status == 200
+                    assert (await resp.json())["status"] == "ok"
+                async with session.post(
+                    base + "/hook", json=make_update(1, "forged"),
+                    headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+                ) as resp:
+                    assert resp.status == 401
+                async with session.post(
+                    base + "/hook", json=make_update(2, "hello"),
+                    headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+                ) as resp:
+                    assert resp.status == 200
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+    assert received == ["hello"]
+    assert events == [("shutdown", ["hello"])]
@@ -0,0 +1,141 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+import db
+import broadcast
+from ratelimit import KeyedRateLimiter, TokenBucket
+
+
+def setup_temp_db(monkeypatch, users=5):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    db.init_db()
+    for i in range(1, users + 1):
+        db.add_user(100 + i, f"U{i}", "C", f"+7999000000{i}", "2024-01-01")
+    return tmp.name
+
+
+class FakeBot:
+    def __init__(self, blocked=(), flood=()):
+        self.sent = []
+        self.blocked = set(blocked)
+        self.flood = set(flood)
+
+    async def send_message(self, chat_id, text):
+        method = SendMessage(chat_id=chat_id, text=text)
+        if chat_id in self.flood:
+            self.flood.discard(chat_id)
+            raise TelegramRetryAfter(method, "Flood control", 0)
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method, "bot was blocked by the user")
+        self.sent.append((chat_id, text))
+
+
+def make_broadcaster(bot):
+    return broadcast.Broadcaster(
+        bot, rate=1000, concurrency=3, batch_size=2, chat_interval=0
+    )
+
+
+def test_broadcast_delivers_and_marks_blocked(monkeypatch):
+    setup_temp_db(monkeypatch)
+    bot = FakeBot(blocked={102}, flood={103})
+    sender = make_broadcaster(bot)
+
+    async def run():
+        broadcast_id = await sender.start("hello", 1)
+        await sender.wait(broadcast_id)
+        return broadcast_id
+
+    broadcast_id = asyncio.run(run())
+
+    row = db.get_broadcast(broadcast_id)
+    assert row["status"] == broadcast.DONE
+    assert row["total"] == 5
+    assert (row["sent"], row["failed"], row["blocked"]) == (4, 0, 1)
+    # Every reachable user got the text once, then the admin got the report
+    assert sorted(c for c, t in bot.sent if t == "hello") == [101, 103, 104, 105]
+    assert bot.sent[-1][0] == 1
+    assert db.get_all_telegram_ids() == [101, 103, 104, 105]
+
+
+def test_broadcast_resumes_after_saved_batch(monkeypatch):
+    setup_temp_db(monkeypatch)
+    broadcast_id = db.create_broadcast("again", 0, "2024-01-01T00:00")
+    db.update_broadcast_progress(broadcast_id, 3, 3, 0, 0)
+    bot = FakeBot()
+    sender = make_broadcaster(bot)
+
+    async def run():
+        assert await sender.resume() == [broadcast_id]
+        await sender.wait(broadcast_id)
+
+    asyncio.run(run())
+
+    assert [c for c, _ in bot.sent] == [104, 105]
+    row = db.get_broadcast(broadcast_id)
+    assert row["status"] == broadcast.DONE
+    assert row["sent"] == 5
+
+
+def test_cancelled_broadcast_is_not_resumed(monkeypatch):
+    setup_temp_db(monkeypatch)
+    broadcast_id = db.create_broadcast("stop", 0, "2024-01-01T00:00")
+    sender = make_broadcaster(FakeBot())
+
+    asyncio.run(sender.cancel(broadcast_id))
+
+    assert db.get_broadcast(broadcast_id)["status"] == broadcast.CANCELLED
+    assert db.get_running_broadcast_ids() == []
+
+
+def test_token_bucket_paces_and_pauses(monkeypatch):
+    now = [0.0]
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+        now[0] += delay
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+
+    async def run():
+        for _ in range(3):
+            await bucket.acquire()
+        bucket.pause(5)
+        await bucket.acquire()
+
+    asyncio.run(run())
+
+    # Third token after 0.5 s; after the pause the bucket starts empty
+    assert sleeps == [0.5, 5, 0.5]
+
+
+def test_keyed_limiter_spaces_same_chat(monkeypatch):
+    now = [0.0]
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    limiter = KeyedRateLimiter(interval=1, clock=lambda: now[0])
+
+    async def run():
+        await limiter.acquire(1)
+        await limiter.acquire(2)
+        await limiter.acquire(1)
+
+    asyncio.run(run())
+
+    assert sleeps == [1]
@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import db
+import instrumentation
+from bulk_import import detect_encoding, import_file, import_listings
+
+
+def setup_temp_db(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    db.init_db()
+    db.add_user(111, "Партнёр", "Казань", "+79990000001", "2024-01-01T00:00:00")
+    return tmp.name
+
+
+CARGO_CSV = """region_from;city_from;region_to;city_to;date_from;date_to;weight;body_type;is_local;comment
+Татарстан;казань;Москва;Москва;01.03.2030;02.03.2030;12;тент;нет;срочно
+Татарстан;Казань;Москва;Москва;2030-03-05;2030-03-04;12;;;
+Нарния;Казань;Москва;Москва;01.03.2030;02.03.2030;1200;Тент;нет;
+Татарстан;Казань;Москва;Москва;01.03.2030;02.03.2030;5;;да;
+"""
+
+
+def test_cargo_rows_are_validated_and_inserted(monkeypatch):
+    setup_temp_db(monkeypatch)
+    before = instrumentation.DB_SECONDS.count(function="add_cargo_many")
+
+    report = import_listings("cargo", CARGO_CSV.splitlines(keepends=True), 111, chunk_size=1)
+
+    assert report.imported == 2
+    # Every chunk is inserted by the async_db writer thread
+    assert instrumentation.DB_SECONDS.count(function="add_cargo_many") == before + 2
+    assert [line for line, _ in report.errors] == [3, 4]
+    assert "date_to" in report.errors[0][1]
+    assert "неизвестный регион" in report.errors[1][1]
+    with db.get_connection() as conn:
+        rows = conn.execute(
+            "SELECT city_from, region_to, date_from, body_type, is_local, comment,"
+            " city_from_norm FROM cargo ORDER BY id"
+        ).fetchall()
+    assert [tuple(r) for r in rows] == [
+        ("Казань", "Москва и Московская обл.", "2030-03-01", "Тент", 0, "срочно", "казань"),
+        ("Казань", "Москва и Московская обл.", "2030-03-01", "Не важно", 1, "", "казань"),
+    ]
+    # Usage counters are kept by triggers
+    assert db.get_stats_totals()["cargo"] == 2
+
+
+def test_truck_import_from_cp1251_file(monkeypatch, tmp_path):
+    setup_temp_db(monkeypatch)
+    path = tmp_path / "trucks.csv"
+    path.write_bytes(
+        "region,city,date_from,date_to,weight,direction,route_regions,owner_telegram_id\n"
+        "Татарстан,Казань,01.03.2030,05.03.2030,20,попутный путь,\"Москва, Свердловская\",\n"
+        "Татарстан,Казань,01.03.2030,05.03.2030,20,Ищу заказ,нет,999\n"
+        "Татарстан,Казань,01.03.2030,05.03.2030,20,куда-нибудь,,\n"
+        .encode("cp1251")
+    )
+    assert detect_encoding(str(path)) == "cp1251"
+
+    report = import_file("trucks", str(path), owner_telegram_id=111)
+
+    assert report.imported == 1
+    assert [line for line, _ in report.errors] == [3, 4]
+    assert "не зарегистрирован" in report.errors[0][1]
+    truck = db.get_truck(1)
+    assert truck["direction"] == "Попутный путь"
+    assert truck["body_type"] == "Любой"
+    with db.get_connection() as conn:
+        regions = {
+            r["region"]
+            for r in conn.execute("SELECT region FROM truck_route_regions WHERE truck_id = 1")
+        }
+    assert regions == {"Москва и Московская обл.", "Свердловская обл."}
@@ -0,0 +1,86 @@
+import os
+import sys
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+# Import order of bot.py: handlers first, they import calendar_keyboard
+import handlers  # noqa: F401
+import calendar_keyboard
+from calendar_keyboard import calendar_cache_stats, current_month, generate_calendar
+
+
+def test_calendar_markup_is_cached_per_month():
+    before = calendar_cache_stats()
+    first = generate_calendar(2031, 2, include_skip=True)
+    assert generate_calendar(2031, 2, include_skip=True) is first
+    assert generate_calendar(2031, 2) is not first
+
+    after = calendar_cache_stats()
+    assert after["misses"] - before["misses"] == 2
+    assert after["hits"] - before["hits"] == 1
+
+
+def test_default_month_is_current():
+    assert generate_calendar() is generate_calendar(*current_month())
+
+
+def test_month_grid_matches_calendar_module():
+    import calendar
+
+    assert calendar_keyboard._month_grid(2024, 2) == tuple(
+        tuple(week) for week in calendar.monthcalendar(2024, 2)
+    )
+
+
+def test_navigation_outside_the_calendar_is_ignored():
+    import asyncio
+    from types import SimpleNamespace
+
+    edited = []
+    answered = []
+
+    async def edit_reply_markup(reply_markup=None):
+        edited.append(reply_markup)
+
+    async def answer(*args, **kwargs):
+        answered.append(args)
+
+    for data in ("cal:next_m:9999-12", "cal:prev_y:1-5", "cal:next_m:2024-40", "cal:next_m:x"):
+        callback = SimpleNamespace(
+            data=data,
+            message=SimpleNamespace(edit_reply_markup=edit_reply_markup),
+            answer=answer,
+        )
+        asyncio.run(calendar_keyboard.handle_calendar_callback(callback, None))
+
+    assert edited == []
+    assert len(answered) == 4
+
+
+def test_forged_dates_are_ignored():
+    import asyncio
+    from types import SimpleNamespace
+
+    class State:
+        def __init__(self, name):
+            self.name = name
+
+        async def get_data(self):
+            return {"date_from": "2030-01-01", "new_date_from": "2030-01-01",
+                    "edit_cargo_id": 1, "calendar_field": "date_to"}
+
+        async def get_state(self):
+            return self.name
+
+    answered = []
+
+    async def answer(*args, **kwargs):
+        answered.append(args)
+
+    for name in ("CargoAddStates:date_to", "CargoEditStates:date_to"):
+        for data in ("cal:skip", "cal:2030-02-30", "cal:2030-01-01; DROP"):
+            callback = SimpleNamespace(data=data, message=None, answer=answer)
+            asyncio.run(calendar_keyboard.handle_calendar_callback(callback, State(name)))
+
+    assert answered == [()] * 6
@@ -0,0 +1,50 @@
+import os
+import sys
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from city_lookup import (
+    PrefixTrie,
+    SUGGESTIONS_LIMIT,
+    regions_of_city,
+    resolve_city,
+    suggest_cities,
+    suggest_regions,
+)
+
+MOSCOW = "Москва и Московская обл."
+
+
+def test_trie_keeps_insertion_order_per_prefix():
+    trie = PrefixTrie(keep=2)
+    for key in ("ab", "abc", "abd", "b"):
+        trie.insert(key, key.upper())
+    assert trie.search("ab") == ["AB", "ABC"]
+    assert trie.search("b") == ["B"]
+    assert trie.search("x") == []
+
+
+def test_prefix_suggestions_are_short_and_in_region():
+    found = suggest_cities("по", MOSCOW)
+    assert 0 < len(found) <= SUGGESTIONS_LIMIT
+    assert all(
+        any(word.startswith("по") for word in name.lower().split())
+        for name in found
+    )
+    assert found[0] == "Подольск"  # whole-name matches come first
+    assert "Подольск" in suggest_cities("подо", MOSCOW)
+    assert suggest_cities("подо", "Тверская обл.") == []
+
+
+def test_later_words_and_typos_are_matched():
+    assert "Нижний Новгород" in suggest_cities("новг")
+    assert suggest_cities("пдольск", MOSCOW) == ["Подольск"]
+    assert suggest_regions("твер") == ["Тверская обл."]
+
+
+def test_resolve_city_and_reverse_index():
+    assert resolve_city("москва", MOSCOW) == ("Москва", [])
+    city, options = resolve_city("мыт", MOSCOW)
+    assert city is None and "Мытищи" in options
+    assert regions_of_city("тверь") == ("Тверская обл.",)
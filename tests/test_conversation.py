@@ -0,0 +1,170 @@
+import os
+import sys
+import asyncio
+import json
+import types
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageText
+from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
+
+import message_cleanup
+from conversation import CargoDraft, CargoSearch, Flow, TruckSearch
+from handlers import common
+
+
+class CountingFSM:
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+        self.state = None
+        self.reads = 0
+        self.writes = 0
+
+    async def get_data(self):
+        self.reads += 1
+        return dict(self.data)
+
+    async def update_data(self, **kwargs):
+        self.writes += 1
+        self.data.update(kwargs)
+
+    async def set_state(self, st):
+        self.state = st
+
+
+class DummyBot:
+    def __init__(self, edit_error=None):
+        self.deleted = []
+        self.edited = []
+        self.edit_error = edit_error
+
+    async def edit_message_text(self, text, chat_id, message_id, reply_markup=None):
+        if self.edit_error:
+            raise TelegramBadRequest(
+                EditMessageText(text=text, chat_id=chat_id, message_id=message_id),
+                self.edit_error,
+            )
+        self.edited.append((chat_id, message_id, text))
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.deleted.append((chat_id, message_ids))
+        return True
+
+
+class DummyMessage:
+    def __init__(self, bot=None):
+        self.bot = bot or DummyBot()
+        self.chat = types.SimpleNamespace(id=5)
+        self.message_id = 8
+        self.answers = []
+
+    async def answer(self, text, reply_markup=None):
+        self.answers.append(text)
+        return types.SimpleNamespace(message_id=42)
+
+
+def test_flow_keeps_flat_primitive_keys():
+    data = {"weight": 5, "city_from": "Казань", "edit_truck_id": 3}
+    draft = CargoDraft.from_data(data)
+    assert draft.weight == 5 and draft.city_from == "Казань"
+
+    draft.use_calendar("date_from")
+    stored = draft.to_data()
+    assert "edit_truck_id" not in stored
+    assert stored["calendar_field"] == "date_from"
+    assert json.loads(json.dumps(stored)) == stored
+    assert not draft.is_complete()
+
+
+def test_search_filters_skip_any_values():
+    search = CargoSearch(filter_city_from="все", filter_city_to="казань",
+                         filter_date_from="нет", filter_date_to="2030-01-01")
+    assert search.filters() == {
+        "city_from": None,
+        "city_to": "казань",
+        "date_from": None,
+        "date_to": "2030-01-01",
+    }
+    assert TruckSearch(filter_route_region="Татарстан").filters()["route_region"] == "Татарстан"
+
+
+def test_ask_and_store_writes_flow_once():
+    state = CountingFSM({"last_bot_message_id": 7})
+    message = DummyMessage()
+
+    async def step():
+        draft = await CargoDraft.load(state)
+        draft.region_from = "Татарстан"
+        # A reply keyboard cannot be added by editing: the question is resent
+        markup = ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="A")]])
+        await common.ask_and_store(message, state, "?", "next", markup, flow=draft)
+        await message_cleanup.get_cleaner(message.bot).flush()
+
+    asyncio.run(step())
+    assert (state.reads, state.writes) == (1, 1)
+    # The answer and the previous question go in one deleteMessages call
+    assert message.bot.deleted == [(5, [7, 8])]
+    assert state.data["region_from"] == "Татарстан"
+    assert state.data["last_bot_message_id"] == 42
+    assert state.state == "next"
+    assert Flow.from_data(state.data).last_bot_message_id == 42
+
+
+def run_card_step(message, last_bot_message_id=7):
+    state = CountingFSM({"last_bot_message_id": last_bot_message_id})
+
+    async def step():
+        await common.ask_and_store(message, state, "Вес:", "next")
+        await message_cleanup.get_cleaner(message.bot).flush()
+
+    asyncio.run(step())
+    return state
+
+
+def test_ask_and_store_edits_card_in_place():
+    message = DummyMessage()
+    state = run_card_step(message)
+
+    assert message.bot.edited == [(5, 7, "Вес:")]
+    assert message.answers == []
+    # Only the user's answer is deleted, the card stays
+    assert message.bot.deleted == [(5, [8])]
+    assert state.data["last_bot_message_id"] == 7
+
+
+def test_card_is_resent_when_it_cannot_be_edited():
+    message = DummyMessage(DummyBot(edit_error="message to edit not found"))
+    state = run_card_step(message)
+
+    assert message.answers == ["Вес:"]
+    assert message.bot.deleted == [(5, [7, 8])]
+    assert state.data["last_bot_message_id"] == 42
+
+
+def test_unchanged_card_is_kept():
+    message = DummyMessage(DummyBot(edit_error="message is not modified"))
+    state = run_card_step(message)
+
+    assert message.answers == []
+    assert state.data["last_bot_message_id"] == 7
+
+
+def test_forged_page_numbers_are_rejected():
+    search = {"kind": "cargo", "filters": {}, "cursors": [None, ["2030-01-01", 5]],
+              "message_id": 8}
+    alerts = []
+
+    async def answer(text=None, show_alert=False):
+        alerts.append(text)
+
+    for data in ("page:-1", "page:x", "page:2"):
+        state = CountingFSM({"search": search})
+        callback = types.SimpleNamespace(data=data, message=DummyMessage(), answer=answer)
+        asyncio.run(common.handle_search_page(callback, state))
+        # Stored cursors stay intact
+        assert state.data["search"]["cursors"] == [None, ["2030-01-01", 5]]
+
+    assert alerts == ["Результаты устарели, выполните поиск заново."] * 3
@@ -0,0 +1,147 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from db_pool import ConnectionPool, PoolClosedError
+
+
+def make_pool(**kwargs):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    return ConnectionPool(tmp.name, **kwargs)
+
+
+def test_connections_are_reused():
+    pool = make_pool(size=2)
+    with pool.connection() as conn:
+        first = conn
+    with pool.connection() as conn:
+        assert conn is first
+    assert pool.created == 1
+
+
+def test_commit_and_rollback():
+    pool = make_pool(size=1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (2)")
+            raise ValueError
+
+    with pool.connection() as conn:
+        rows = conn.execute("SELECT x FROM t").fetchall()
+    assert [r["x"] for r in rows] == [1]
+
+
+def test_pool_size_is_bounded():
+    pool = make_pool(size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    pool.timeout = 5
+    waiter.start()
+    pool.release(conn)
+    waiter.join()
+    assert got == [conn]
+
+
+def test_broken_connection_is_replaced():
+    pool = make_pool(size=1, health_check_interval=0)
+    with pool.connection() as conn:
+        broken = conn
+    broken.close()
+    with pool.connection() as conn:
+        assert conn is not broken
+        assert conn.execute("SELECT 1").fetchone()[0] == 1
+    assert pool.created == 1
+
+
+def test_close_refuses_new_connections():
+    pool = make_pool(size=2)
+    held = pool.acquire()
+    pool.close()
+    with pytest.raises(PoolClosedError):
+        pool.acquire()
+    pool.release(held)
+    assert pool.created == 0
+
+
+def test_nested_blocks_share_transaction():
+    pool = make_pool(size=1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+
+    with pool.connection() as outer:
+        outer.execute("INSERT INTO t VALUES (1)")
+        with pytest.raises(ValueError):
+            with pool.connection() as inner:
+                assert inner is outer
+                inner.execute("INSERT INTO t VALUES (2)")
+                raise ValueError
+        with pool.connection() as inner:
+            inner.execute("INSERT INTO t VALUES (3)")
+
+    with pool.connection() as conn:
+        rows = conn.execute("SELECT x FROM t ORDER BY x").fetchall()
+    assert [r["x"] for r in rows] == [1, 3]
+
+
+def test_on_commit_runs_after_commit_only():
+    pool = make_pool(size=1)
+    calls = []
+
+    with pool.connection():
+        pool.on_commit(lambda: calls.append("outer"))
+        with pytest.raises(ValueError):
+            with pool.connection():
+                pool.on_commit(lambda: calls.append("rolled back"))
+                raise ValueError
+        assert calls == []
+
+    with pytest.raises(ValueError):
+        with pool.connection():
+            pool.on_commit(lambda: calls.append("failed"))
+            raise ValueError
+
+    pool.on_commit(lambda: calls.append("immediate"))
+    assert calls == ["outer", "immediate"]
+
+
+def test_immediate_transaction_waits_for_other_writers():
+    pool = make_pool(size=2)
+    conn = pool.acquire()
+    conn.execute("PRAGMA journal_mode=WAL")
+    pool.release(conn)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+
+    def other_writer():
+        with pool.connection(immediate=True) as conn:
+            conn.execute("INSERT INTO t VALUES (2)")
+
+    thread = threading.Thread(target=other_writer)
+    # Read, let another writer try to commit, then write: a deferred
+    # transaction would fail here with "database is locked"
+    with pool.connection(immediate=True) as conn:
+        conn.execute("SELECT COUNT(*) FROM t").fetchone()
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        conn.execute("INSERT INTO t VALUES (1)")
+    thread.join()
+
+    with pool.connection() as conn:
+        rows = conn.execute("SELECT x FROM t ORDER BY rowid").fetchall()
+    assert [r["x"] for r in rows] == [1, 2]
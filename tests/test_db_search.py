@@ -0,0 +1,152 @@
+import os
+import sys
+import sqlite3
+import tempfile
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import db
+
+
+def setup_temp_db(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    db.init_db()
+    return tmp.name
+
+
+def add_user():
+    db.add_user(1, "u", "c", "p", "2024-01-01")
+    return db.get_user_id(1)
+
+
+def test_search_is_case_insensitive_for_cyrillic(monkeypatch):
+    setup_temp_db(monkeypatch)
+    uid = add_user()
+    db.add_cargo(
+        uid, "Москва", "Москва", "Тверь", "Тверская область",
+        "2024-05-01", "2024-05-02", 10, "Тент", 0, "", "2024-01-01",
+    )
+    db.add_truck(
+        uid, "Казань", "Татарстан", "2024-05-01", "2024-05-03",
+        20, "Тент", "Ищу заказ", "", "", "2024-01-01",
+    )
+
+    assert len(db.search_cargo(city_from="москва", city_to="ТВЕРЬ")) == 1
+    assert len(db.search_cargo(city_from="тверь")) == 0
+    assert len(db.search_trucks(city="казань")) == 1
+
+    db.update_truck_route(1, "Самара", "Самарская область")
+    assert db.search_trucks(city="казань") == []
+    assert len(db.search_trucks(city="самара")) == 1
+
+
+def test_dates_are_stored_in_canonical_form(monkeypatch):
+    setup_temp_db(monkeypatch)
+    uid = add_user()
+    db.add_cargo(
+        uid, "A", "AR", "B", "BR",
+        "01.05.2024", "2024-05-02T10:00:00", 10, "Тент", 0, "", "2024-01-01",
+    )
+    row = db.get_cargo(1)
+    assert (row["date_from"], row["date_to"]) == ("2024-05-01", "2024-05-02")
+
+    assert len(db.search_cargo(date_from="2024-04-30", date_to="2024-05-01")) == 1
+    assert db.search_cargo(date_from="2024-05-02") == []
+
+
+def test_init_db_migrates_existing_rows(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    conn = sqlite3.connect(tmp.name)
+    conn.execute(
+        "CREATE TABLE cargo (id INTEGER PRIMARY KEY, user_id INTEGER,"
+        " city_from TEXT, region_from TEXT, city_to TEXT, region_to TEXT,"
+        " date_from TEXT, date_to TEXT, weight INTEGER, body_type TEXT,"
+        " is_local INTEGER, comment TEXT, created_at TEXT)"
+    )
+    conn.execute(
+        "INSERT INTO cargo (city_from, city_to, date_from, date_to)"
+        " VALUES ('Пермь', 'Уфа', '2024-06-01T08:00:00', '02.06.2024')"
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    db.init_db()
+
+    conn = sqlite3.connect(tmp.name)
+    row = conn.execute(
+        "SELECT city_from_norm, city_to_norm, date_from, date_to FROM cargo"
+    ).fetchone()
+    conn.close()
+    assert row == ("пермь", "уфа", "2024-06-01", "2024-06-02")
+
+
+def test_search_predicates_use_indexes(monkeypatch):
+    db_path = setup_temp_db(monkeypatch)
+    conn = sqlite3.connect(db_path)
+    plan = " ".join(
+        r[3]
+        for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM cargo"
+            " WHERE city_from_norm = ? AND city_to_norm = ? AND date_from >= ?",
+            ("a", "b", "2024-01-01"),
+        )
+    )
+    conn.close()
+    assert "idx_cargo_route_date" in plan
+
+
+def test_keyset_pagination_walks_all_rows(monkeypatch):
+    setup_temp_db(monkeypatch)
+    uid = add_user()
+    for day in (3, 1, 2, 1, 3):
+        db.add_cargo(
+            uid, "Москва", "Москва", "Тверь", "Тверская область",
+            f"2024-05-0{day}", f"2024-05-0{day}", 10, "Тент", 0, "", "2024-01-01",
+        )
+
+    seen = []
+    after = None
+    while True:
+        page = db.search_cargo(city_from="Москва", after=after, limit=2)
+        seen.extend((r["date_from"], r["id"]) for r in page)
+        if len(page) < 2:
+            break
+        after = (page[-1]["date_from"], page[-1]["id"])
+
+    assert seen == sorted(seen)
+    assert len(seen) == len(set(seen)) == 5
+
+
+def test_route_region_search_uses_link_table(monkeypatch):
+    path = setup_temp_db(monkeypatch)
+    uid = add_user()
+    going = db.add_truck(
+        uid, "Казань", "Татарстан", "2024-05-01", "2024-05-03",
+        20, "Тент", "Попутный путь", "Тверь, москва", "", "2024-01-01",
+    )
+    db.add_truck(
+        uid, "Казань", "Татарстан", "2024-05-01", "2024-05-03",
+        20, "Тент", "Ищу заказ", "", "", "2024-01-01",
+    )
+
+    rows = db.search_trucks(route_region="Тверская обл.")
+    assert [r["id"] for r in rows] == [going]
+
+    conn = sqlite3.connect(path)
+    plan = " ".join(
+        r[3] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT truck_id FROM truck_route_regions"
+            " WHERE region = ?",
+            ("Тверская обл.",),
+        )
+    )
+    conn.close()
+    assert "PRIMARY KEY" in plan
+
+    db.delete_truck(going)
+    assert db.search_trucks(route_region="Тверская обл.") == []
@@ -55,6 +55,12 @@ class ReplyKeyboardMarkup:
         pass
 
 aiogram_types.ReplyKeyboardMarkup = ReplyKeyboardMarkup
+
+class ReplyKeyboardRemove:
+    def __init__(self, *args, **kwargs):
+        pass
+
+aiogram_types.ReplyKeyboardRemove = ReplyKeyboardRemove
 aiogram_fsm.InlineKeyboardMarkup = InlineKeyboardMarkup
 
 class CallbackQuery:
@@ -105,7 +111,12 @@ sys.modules["handlers"] = handlers_pkg
 common_stub = types.ModuleType("handlers.common")
 common_stub.get_main_menu = lambda: None
 common_stub.ask_and_store = lambda *a, **k: None
+common_stub.cleanup_messages = lambda *a, **k: None
 common_stub.show_search_results = lambda *a, **k: None
+common_stub.start_search = lambda *a, **k: None
+common_stub.format_search_results = lambda *a, **k: ("", None)
+common_stub.SEARCH_PAGE_SIZE = 5
+common_stub.resolve_city_input = lambda *a, **k: None
 common_stub.create_paged_keyboard = lambda *a, **k: None
 common_stub.process_weight_step = lambda *a, **k: None
 common_stub.parse_and_store_date = lambda *a, **k: True
@@ -282,7 +293,7 @@ def test_edit_profile(monkeypatch):
     asyncio.run(profile.start_edit_name(cq, state))
     assert state.state == profile.UserEditStates.name
     msg = DummyMessage("new")
-    asyncio.run(profile.process_new_name(msg, state))
+    asyncio.run(profile.process_new_name(msg, state, user_id=1))
     conn = sqlite3.connect(db_path)
     name = conn.execute("SELECT name FROM users WHERE telegram_id=1").fetchone()[0]
     conn.close()
@@ -0,0 +1,78 @@
+import os
+import sys
+import csv
+import gzip
+import json
+import tempfile
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import db
+from export import export_filename, parse_export_date, write_export
+
+
+def setup_temp_db(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    db.init_db()
+    return tmp.name
+
+
+def add_users_and_cargo():
+    db.add_user(1, "Иван", "Казань", "+79990000001", "2024-01-10T09:00:00")
+    db.add_user(2, "Пётр", "Москва", "+79990000002", "2024-02-01T12:00:00")
+    user_id = db.get_user_id(1)
+    for day in ("2024-01-15", "2024-01-31", "2024-02-01"):
+        db.add_cargo(
+            user_id, "Казань", "Татарстан", "Москва", "Москва",
+            "2024-03-01", "2024-03-02", 10, "Тент", 0, "", f"{day}T23:59:00",
+        )
+
+
+def test_csv_export_filters_by_creation_date(monkeypatch, tmp_path):
+    setup_temp_db(monkeypatch)
+    add_users_and_cargo()
+    path = tmp_path / "cargo.csv.gz"
+
+    count = write_export(str(path), "cargo", "csv", "2024-01-15", "2024-01-31")
+
+    with gzip.open(path, "rt", encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert count == len(rows) == 2
+    assert [r["created_at"][:10] for r in rows] == ["2024-01-15", "2024-01-31"]
+    assert rows[0]["owner_name"] == "Иван"
+    assert rows[0]["city_from"] == "Казань"
+
+
+def test_jsonl_export_streams_in_batches(monkeypatch, tmp_path):
+    setup_temp_db(monkeypatch)
+    add_users_and_cargo()
+    # Every row comes from the same cursor however small the batches
+    assert len(list(db.iter_export_rows("cargo", batch_size=1))) == 3
+
+    path = tmp_path / "users.jsonl.gz"
+    assert write_export(str(path), "users", "jsonl", date_from="2024-02-01") == 1
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert lines == [{
+        "id": 2, "telegram_id": 2, "name": "Пётр", "city": "Москва",
+        "phone": "+79990000002", "created_at": "2024-02-01T12:00:00",
+        "is_blocked": 0,
+    }]
+
+
+def test_export_arguments():
+    assert parse_export_date("31.01.2024") == "2024-01-31"
+    assert parse_export_date("2024-01-31") == "2024-01-31"
+    with pytest.raises(ValueError):
+        parse_export_date("31/01/2024")
+    assert export_filename("trucks", "csv") == "trucks.csv.gz"
+    assert export_filename("cargo", "jsonl", "2024-01-01", None) == (
+        "cargo_2024-01-01_now.jsonl.gz"
+    )
+    with pytest.raises(ValueError):
+        write_export("unused", "change_log")
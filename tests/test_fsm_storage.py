@@ -0,0 +1,77 @@
+import os
+import sys
+import asyncio
+import sqlite3
+import tempfile
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aiogram.fsm.storage.base import StorageKey
+
+from fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def make_path():
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    return tmp.name
+
+
+def test_conversation_survives_restart():
+    path = make_path()
+
+    async def first_run():
+        storage = SQLiteStorage(path, flush_interval=60)
+        await storage.set_state(KEY, "CargoAddStates:weight")
+        await storage.update_data(KEY, {"city_from": "Казань"})
+        await storage.update_data(KEY, {"weight": 5, "cursor": (1, 2)})
+        # Nothing is written before the flush
+        assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM fsm").fetchone()[0] == 0
+        await storage.close()
+
+    async def second_run():
+        storage = SQLiteStorage(path)
+        state = await storage.get_state(KEY)
+        data = await storage.get_data(KEY)
+        await storage.close()
+        return state, data
+
+    asyncio.run(first_run())
+    state, data = asyncio.run(second_run())
+    assert state == "CargoAddStates:weight"
+    assert data == {"city_from": "Казань", "weight": 5, "cursor": [1, 2]}
+
+
+def test_cleared_conversation_is_deleted():
+    path = make_path()
+
+    async def main():
+        storage = SQLiteStorage(path)
+        await storage.set_state(KEY, "s")
+        await storage.flush()
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.close()
+
+    asyncio.run(main())
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM fsm").fetchone()[0] == 0
+
+
+def test_abandoned_conversation_expires():
+    path = make_path()
+
+    async def main():
+        storage = SQLiteStorage(path)
+        await storage.update_data(KEY, {"weight": 1})
+        await storage.close()
+
+        expired = SQLiteStorage(path, ttl=0)
+        assert await expired.get_data(KEY) == {}
+        await expired.flush()
+        await expired.close()
+
+    asyncio.run(main())
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM fsm").fetchone()[0] == 0
@@ -0,0 +1,42 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import db
+import housekeeping
+from config import Config
+
+
+def setup_temp_db(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    db.init_db()
+    return tmp.name
+
+
+def change_log_size():
+    with db.get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0]
+
+
+def test_change_log_is_pruned_in_background(monkeypatch):
+    setup_temp_db(monkeypatch)
+    for tg in range(5):
+        db.add_user(tg, "N", "C", "+79991234567", "2024-01-01")
+    assert change_log_size() == 5
+    monkeypatch.setattr(Config, "CHANGE_LOG_KEEP", 2)
+    monkeypatch.setattr(Config, "CHANGE_LOG_PRUNE_INTERVAL", 0.01)
+
+    async def main():
+        await housekeeping.on_startup()
+        await asyncio.sleep(0.05)
+        await housekeeping.on_shutdown()
+
+    asyncio.run(main())
+    assert change_log_size() == 2
+    assert housekeeping._task is None
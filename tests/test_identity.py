@@ -0,0 +1,125 @@
+import os
+import sys
+import asyncio
+import tempfile
+import types
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+# Minimal aiogram stubs when the real package is not imported yet
+aiogram_module = sys.modules.setdefault("aiogram", types.ModuleType("aiogram"))
+aiogram_types_module = sys.modules.setdefault(
+    "aiogram.types", types.ModuleType("aiogram.types")
+)
+if not hasattr(aiogram_module, "BaseMiddleware"):
+    aiogram_module.BaseMiddleware = object
+if not hasattr(aiogram_types_module, "TelegramObject"):
+    aiogram_types_module.TelegramObject = object
+
+import db
+import async_db
+import identity
+from middlewares import UserIdentityMiddleware
+
+
+def setup_temp_db(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    db.init_db()
+    return tmp.name
+
+
+def count_lookups(monkeypatch):
+    calls = []
+    original = db.get_user_id
+
+    def get_user_id(telegram_id):
+        calls.append(telegram_id)
+        return original(telegram_id)
+
+    monkeypatch.setattr(db, "get_user_id", get_user_id)
+    return calls
+
+
+def test_cache_expires_and_evicts():
+    now = [0.0]
+    cache = identity.UserIdCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put(1, 11)
+    cache.put(2, None)
+    assert cache.get(2) is None
+    assert cache.get(1) == 11
+
+    # 1 was used last, so 2 is evicted
+    cache.put(3, 33)
+    assert cache.get(2) is identity._MISSING
+    assert cache.get(1) == 11
+
+    now[0] = 10
+    assert cache.get(1) is identity._MISSING
+
+
+def test_resolve_hits_database_once(monkeypatch):
+    setup_temp_db(monkeypatch)
+    db.add_user(1, "N", "C", "+79991234567", "2024-01-01")
+    calls = count_lookups(monkeypatch)
+
+    async def main():
+        return [await identity.resolve_user_id(1) for _ in range(3)]
+
+    assert asyncio.run(main()) == [1, 1, 1]
+    assert calls == [1]
+
+
+def test_registration_and_deletion_invalidate(monkeypatch):
+    setup_temp_db(monkeypatch)
+    calls = count_lookups(monkeypatch)
+
+    async def main():
+        found = [await identity.resolve_user_id(5)]
+        await async_db.add_user(5, "N", "C", "+79991234567", "2024-01-01")
+        found.append(await identity.resolve_user_id(5))
+        await async_db.delete_user(found[-1])
+        found.append(await identity.resolve_user_id(5))
+        return found
+
+    assert asyncio.run(main()) == [None, 1, None]
+    assert calls == [5, 5, 5]
+
+
+def test_middleware_injects_user_id(monkeypatch):
+    setup_temp_db(monkeypatch)
+    db.add_user(9, "N", "C", "+79991234567", "2024-01-01")
+    seen = {}
+
+    async def handler(event, data):
+        seen.update(data)
+        return "handled"
+
+    user = types.SimpleNamespace(id=9, is_bot=False)
+    middleware = UserIdentityMiddleware()
+    result = asyncio.run(middleware(handler, object(), {"event_from_user": user}))
+
+    assert result == "handled"
+    assert seen["user_id"] == 1
+
+
+def test_answer_read_before_invalidation_is_not_cached(monkeypatch):
+    setup_temp_db(monkeypatch)
+    original = db.get_user_id
+
+    def get_user_id(telegram_id):
+        found = original(telegram_id)
+        # The user registers while the lookup is in flight
+        db.add_user(telegram_id, "N", "C", "+79991234567", "2024-01-01")
+        return found
+
+    monkeypatch.setattr(db, "get_user_id", get_user_id)
+
+    async def main():
+        first = await identity.resolve_user_id(7)
+        monkeypatch.setattr(db, "get_user_id", original)
+        return [first, await identity.resolve_user_id(7)]
+
+    assert asyncio.run(main()) == [None, 1]
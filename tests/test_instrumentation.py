@@ -0,0 +1,125 @@
+import os
+import sys
+import asyncio
+import tempfile
+import types
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+# Minimal aiogram stubs when the real package is not imported yet
+aiogram_module = sys.modules.setdefault("aiogram", types.ModuleType("aiogram"))
+aiogram_types_module = sys.modules.setdefault(
+    "aiogram.types", types.ModuleType("aiogram.types")
+)
+if not hasattr(aiogram_module, "BaseMiddleware"):
+    aiogram_module.BaseMiddleware = object
+if not hasattr(aiogram_types_module, "TelegramObject"):
+    aiogram_types_module.TelegramObject = object
+
+import pytest
+
+import db
+import async_db
+import instrumentation
+from instrumentation import Counter, Histogram, Registry
+from middlewares import HandlerMetricsMiddleware, TelegramApiMetricsMiddleware
+
+
+def make_registry(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr(instrumentation, "REGISTRY", registry)
+    return registry
+
+
+def test_render_counter_and_histogram(monkeypatch):
+    registry = make_registry(monkeypatch)
+    counter = Counter("test_total", "Things.", ("kind",))
+    histogram = Histogram("test_seconds", "Time.", ("op",), buckets=(0.1, 1))
+    counter.inc(kind='a"b')
+    counter.inc(2, kind='a"b')
+    histogram.observe(0.05, op="x")
+    histogram.observe(0.5, op="x")
+    histogram.observe(5, op="x")
+
+    text = registry.render()
+
+    assert "# TYPE test_total counter" in text
+    assert 'test_total{kind="a\\"b"} 3' in text
+    assert 'test_seconds_bucket{op="x",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{op="x",le="1"} 2' in text
+    assert 'test_seconds_bucket{op="x",le="+Inf"} 3' in text
+    assert 'test_seconds_count{op="x"} 3' in text
+    assert 'test_seconds_sum{op="x"} 5.55' in text
+
+
+def test_metric_requires_declared_labels(monkeypatch):
+    make_registry(monkeypatch)
+    counter = Counter("test_labels_total", "Things.", ("kind",))
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+
+def test_handler_middleware_times_handler_by_name():
+    async def cmd_example(event, data):
+        return "ok"
+
+    async def failing_handler(event, data):
+        raise RuntimeError("boom")
+
+    middleware = HandlerMetricsMiddleware()
+    handler = types.SimpleNamespace(callback=cmd_example)
+
+    async def run():
+        assert await middleware(cmd_example, object(), {"handler": handler}) == "ok"
+        failing = {"handler": types.SimpleNamespace(callback=failing_handler)}
+        with pytest.raises(RuntimeError):
+            await middleware(failing_handler, object(), failing)
+
+    before = instrumentation.HANDLER_SECONDS.count(handler="cmd_example")
+    asyncio.run(run())
+
+    assert instrumentation.HANDLER_SECONDS.count(handler="cmd_example") == before + 1
+    assert instrumentation.HANDLER_ERRORS.value(handler="failing_handler") >= 1
+
+
+def test_api_middleware_times_requests_by_method():
+    class SendMessage:
+        __api_method__ = "sendMessage"
+
+    async def make_request(bot, method):
+        return True
+
+    before = instrumentation.TELEGRAM_SECONDS.count(method="sendMessage")
+    asyncio.run(TelegramApiMetricsMiddleware()(make_request, None, SendMessage()))
+    assert instrumentation.TELEGRAM_SECONDS.count(method="sendMessage") == before + 1
+
+
+def test_async_db_calls_are_timed(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    db.init_db()
+
+    before = instrumentation.DB_SECONDS.count(function="get_user_id")
+    asyncio.run(async_db.get_user_id(1))
+    assert instrumentation.DB_SECONDS.count(function="get_user_id") == before + 1
+    assert "bot_db_query_seconds_bucket" in instrumentation.render()
+
+
+def test_metrics_server_serves_text():
+    from aiohttp import ClientSession
+
+    async def run():
+        runner = await instrumentation.start_metrics_server("127.0.0.1", 0)
+        try:
+            host, port = runner.addresses[0][:2]
+            async with ClientSession() as session:
+                async with session.get(f"http://{host}:{port}/metrics") as resp:
+                    return resp.status, await resp.text()
+        finally:
+            await runner.cleanup()
+
+    status, text = asyncio.run(run())
+    assert status == 200
+    assert "# TYPE bot_handler_seconds histogram" in text
@@ -0,0 +1,26 @@
+import os
+import sys
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import keyboards
+from config import Config
+
+
+def test_static_keyboards_are_shared():
+    assert keyboards.main_menu() is keyboards.main_menu()
+    assert keyboards.regions() is keyboards.regions()
+    assert keyboards.body_types("Любой") is keyboards.body_types("Любой")
+    assert keyboards.body_types("Любой") is not keyboards.body_types("Не важно")
+    assert keyboards.grid(("a", "b", "c")) is keyboards.grid(("a", "b", "c"))
+
+
+def test_config_change_and_invalidate_rebuild(monkeypatch):
+    before = keyboards.directions()
+    monkeypatch.setattr(Config, "TRUCK_DIRECTIONS", ["Только по городу"])
+    assert keyboards.directions() is not before
+
+    menu = keyboards.main_menu()
+    keyboards.invalidate()
+    assert keyboards.main_menu() is not menu
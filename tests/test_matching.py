@@ -0,0 +1,137 @@
+import os
+import sys
+import sqlite3
+import tempfile
+from datetime import date
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import db
+import matching
+from config import Config
+
+
+def setup_temp_db(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    monkeypatch.setattr(db, "DB_PATH", tmp.name)
+    monkeypatch.setattr(matching, "_today", lambda: date(2024, 5, 1).toordinal())
+    db.init_db()
+    for tg in (1, 2, 3):
+        db.add_user(tg, f"u{tg}", "c", "p", "2024-01-01")
+    return [db.get_user_id(tg) for tg in (1, 2, 3)]
+
+
+def add_cargo(uid, region_from="Тверская область", region_to="Московская область",
+              date_from="2024-05-02", date_to="2024-05-04", weight=10, body="Тент"):
+    return db.add_cargo(
+        uid, "Тверь", region_from, "Москва", region_to,
+        date_from, date_to, weight, body, 0, "", "2024-01-01",
+    )
+
+
+def add_truck(uid, region="Тверская область", route="", date_from="2024-05-01",
+              date_to="2024-05-10", weight=20, body="Тент"):
+    return db.add_truck(
+        uid, "Тверь", region, date_from, date_to,
+        weight, body, "Ищу заказ", route, "", "2024-01-01",
+    )
+
+
+def ids(matches):
+    return [m.row["id"] for m in matches]
+
+
+def test_compatible_trucks_are_ranked(monkeypatch):
+    u1, u2, u3 = setup_temp_db(monkeypatch)
+    cargo = add_cargo(u1)
+    local = add_truck(u2)
+    passing = add_truck(u3, region="Новгородская область", route="тверская область, Московская область")
+    add_truck(u2, weight=5)  # too small
+    add_truck(u2, body="Рефрижератор")  # other body type
+    add_truck(u2, date_from="2024-05-05")  # not available on loading days
+    add_truck(u1)  # own truck
+
+    # Heading to the destination region outweighs standing at the pickup
+    matches = matching.match_cargo(cargo)
+    assert ids(matches) == [passing, local]
+    assert matches[1].row["name"] == "u2"
+
+    cargo_ids = ids(matching.match_truck(local))
+    assert cargo_ids == [cargo]
+
+
+def test_index_follows_committed_changes(monkeypatch):
+    u1, u2, _ = setup_temp_db(monkeypatch)
+    cargo = add_cargo(u1)
+    assert matching.match_cargo(cargo) == []
+
+    truck = add_truck(u2, weight=5)
+    assert matching.match_cargo(cargo) == []
+
+    db.update_truck_weight(truck, 15)
+    assert ids(matching.match_cargo(cargo)) == [truck]
+
+    db.update_cargo_dates(cargo, "2024-06-01", "2024-06-02")
+    assert matching.match_cargo(cargo) == []
+
+    db.update_cargo_dates(cargo, "2024-05-01", "2024-05-01")
+    db.delete_truck(truck)
+    assert matching.match_cargo(cargo) == []
+    assert matching.match_truck(truck) == []
+
+
+def test_any_body_type_matches_every_body(monkeypatch):
+    u1, u2, _ = setup_temp_db(monkeypatch)
+    cargo = add_cargo(u1, body="Не важно")
+    reefer = add_truck(u2, body="Рефрижератор")
+    any_truck = add_truck(u2, body="Любой")
+
+    assert sorted(ids(matching.match_cargo(cargo))) == sorted([reefer, any_truck])
+    tent_cargo = add_cargo(u1, body="Тент")
+    assert ids(matching.match_truck(any_truck)) == sorted([cargo, tent_cargo])
+
+
+def test_index_follows_changes_of_other_processes(monkeypatch):
+    u1, u2, _ = setup_temp_db(monkeypatch)
+    cargo = add_cargo(u1)
+    truck = add_truck(u2, weight=5)
+    assert matching.match_cargo(cargo) == []
+
+    # Written by another process: no in-process change notification
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("UPDATE trucks SET weight = 15 WHERE id = ?", (truck,))
+    conn.commit()
+    assert ids(matching.match_cargo(cargo)) == [truck]
+
+    # Entries pruned before being read force a rebuild
+    conn.execute("UPDATE trucks SET weight = 5 WHERE id = ?", (truck,))
+    conn.execute("UPDATE cargo SET weight = 12 WHERE id = ?", (cargo,))
+    conn.commit()
+    conn.close()
+    db.prune_change_log(1)
+    assert matching.match_cargo(cargo) == []
+
+
+def test_index_covers_horizon_and_drops_expired(monkeypatch):
+    u1, u2, _ = setup_temp_db(monkeypatch)
+    cargo = add_cargo(u1, date_to="2099-12-31")
+    truck = add_truck(u2, date_to="2099-12-31")
+    later = add_truck(u2, date_from="2025-03-01", date_to="2025-03-05")
+
+    # Only the horizon is indexed, not every week until 2099
+    assert ids(matching.match_cargo(cargo)) == [truck]
+    trucks = matching._index._trucks
+    assert len(trucks.indexed[truck]) <= Config.MATCH_HORIZON_DAYS // 7 + 2
+
+    # Owner names are read when matches are shown
+    db.update_user_name(u2, "renamed")
+    assert matching.match_cargo(cargo)[0].row["name"] == "renamed"
+
+    monkeypatch.setattr(matching, "_today", lambda: date(2025, 2, 20).toordinal())
+    assert sorted(ids(matching.match_cargo(cargo))) == [truck, later]
+
+    monkeypatch.setattr(matching, "_today", lambda: date(2025, 3, 10).toordinal())
+    assert ids(matching.match_cargo(cargo)) == [truck]
+    assert later not in trucks.entries
@@ -0,0 +1,70 @@
+import os
+import sys
+import asyncio
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import DeleteMessages
+
+from message_cleanup import MessageCleaner
+
+
+class FakeBot:
+    def __init__(self, fail=None):
+        self.calls = []
+        self.fail = list(fail or [])
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.calls.append((chat_id, list(message_ids)))
+        if self.fail:
+            raise self.fail.pop(0)
+        return True
+
+
+def test_deletions_are_batched_per_chat():
+    bot = FakeBot()
+
+    async def run():
+        cleaner = MessageCleaner(bot, delay=0.01)
+        cleaner.delete(1, 10, None, 11)
+        cleaner.delete(2, 20)
+        cleaner.delete(1, 12, 10)
+        assert cleaner.pending == 5
+        await cleaner.flush()
+        assert cleaner.pending == 0
+
+    asyncio.run(run())
+    assert sorted(bot.calls) == [(1, [10, 11, 12]), (2, [20])]
+
+
+def test_large_batches_are_split():
+    bot = FakeBot()
+
+    async def run():
+        cleaner = MessageCleaner(bot, delay=0)
+        cleaner.delete(1, *range(1, 251))
+        await cleaner.flush()
+
+    asyncio.run(run())
+    assert [len(ids) for _, ids in bot.calls] == [100, 100, 50]
+
+
+def test_retry_after_requeues_and_errors_are_ignored():
+    method = DeleteMessages(chat_id=1, message_ids=[1])
+    bot = FakeBot(fail=[
+        TelegramRetryAfter(method, "Flood", retry_after=0),
+        TelegramBadRequest(method, "message can't be deleted"),
+    ])
+
+    async def run():
+        cleaner = MessageCleaner(bot, delay=0)
+        cleaner.delete(1, 1, 2)
+        await cleaner.flush()
+        # Still usable after errors
+        cleaner.delete(1, 3)
+        await cleaner.close()
+
+    asyncio.run(run())
+    assert bot.calls == [(1, [1, 2]), (1, [1, 2]), (1, [3])]
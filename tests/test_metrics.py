@@ -16,9 +16,11 @@ sys.modules.setdefault("aiogram", aiogram_module)
 sys.modules.setdefault("aiogram.types", aiogram_types_module)
 
 import sqlite3
+import time
+from datetime import datetime
 
 import db
-from metrics import get_bot_statistics
+from metrics import get_bot_statistics, get_statistics
 
 
 def setup_temp_db(monkeypatch):
@@ -38,9 +40,9 @@ def test_get_bot_statistics(monkeypatch):
     cur.execute(
         "INSERT INTO users (telegram_id, name, city, phone, created_at) VALUES (1, 'old', 'c', 'p', '2020-01-01')"
     )
-    # user registered now
+    # user registered now (handlers store local time)
     cur.execute(
-        "INSERT INTO users (telegram_id, name, city, phone, created_at) VALUES (2, 'new', 'c', 'p', datetime('now'))"
+        "INSERT INTO users (telegram_id, name, city, phone, created_at) VALUES (2, 'new', 'c', 'p', datetime('now', 'localtime'))"
     )
     conn.commit()
     conn.close()
@@ -48,3 +50,57 @@ def test_get_bot_statistics(monkeypatch):
     total, new = get_bot_statistics()
     assert total == 2
     assert new == 1
+
+
+def test_counters_follow_inserts_and_deletes(monkeypatch):
+    setup_temp_db(monkeypatch)
+    now = datetime.now().isoformat()
+    db.add_user(1, "a", "c", "p", now)
+    db.add_user(2, "b", "c", "p", "2020-01-01")
+    user_id = db.get_user_id(1)
+    db.add_cargo(
+        user_id, "Москва", "Москва", "Тверь", "Тверская область",
+        "2024-05-01", "2024-05-02", 5, "тент", 0, "", now,
+    )
+    db.record_event("cargo_search")
+    db.record_event("cargo_search")
+
+    totals, windows = get_statistics()
+    assert totals == {"users": 2, "cargo": 1, "trucks": 0}
+    day = dict(windows)["24ч"]
+    assert (day.users, day.cargo, day.cargo_search, day.truck_search) == (1, 1, 2, 0)
+
+    db.delete_user(user_id)
+    assert db.get_stats_totals() == {"users": 1, "cargo": 0, "trucks": 0}
+    assert get_bot_statistics() == (1, 0)
+
+
+def test_counters_backfilled_for_existing_rows(monkeypatch):
+    db_path = setup_temp_db(monkeypatch)
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TRIGGER stats_users_insert")
+    conn.execute(
+        "INSERT INTO users (telegram_id, name, city, phone, created_at)"
+        " VALUES (3, 'x', 'c', 'p', datetime('now', 'localtime'))"
+    )
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+    assert get_bot_statistics() == (1, 1)
+
+
+def test_hour_buckets_use_utc(monkeypatch):
+    setup_temp_db(monkeypatch)
+    monkeypatch.setenv("TZ", "Asia/Vladivostok")
+    time.tzset()
+    try:
+        db.add_user(1, "a", "c", "p", datetime.now().isoformat())
+        db.record_event("cargo_search")
+        with db.get_connection() as conn:
+            hours = dict(conn.execute("SELECT kind, hour FROM stats_hourly"))
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    # Registrations (local created_at) and events share the UTC clock
+    assert hours["users"] == hours["cargo_search"]
@@ -0,0 +1,74 @@
+import os
+import sys
+import asyncio
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+
+import instrumentation
+import outbound
+from outbound import OutboundScheduler
+
+
+def test_interactive_requests_overtake_bulk_ones():
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append((method.chat_id, method.text))
+        return True
+
+    async def send(scheduler, chat_id, text, priority):
+        outbound.set_priority(priority)
+        await scheduler(make_request, None, SendMessage(chat_id=chat_id, text=text))
+
+    async def run():
+        # Bursts of 20, then one request every 50 ms
+        scheduler = OutboundScheduler(rate=20, chat_interval=0)
+        bulk = [
+            asyncio.create_task(send(scheduler, i, "bulk", outbound.BULK))
+            for i in range(30)
+        ]
+        await asyncio.sleep(0.01)
+        assert scheduler.waiting == 10
+        await send(scheduler, 100, "reply", outbound.INTERACTIVE)
+        await asyncio.gather(*bulk)
+
+    asyncio.run(run())
+    assert len(sent) == 31
+    assert sent[20] == (100, "reply")
+
+
+def test_retry_after_pauses_and_repeats():
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(method.text)
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method, "Flood control", retry_after=0)
+        return "ok"
+
+    before = instrumentation.TELEGRAM_RETRIES.value(method="sendMessage")
+    scheduler = OutboundScheduler(rate=100, max_retries=2)
+    result = asyncio.run(scheduler(make_request, None, SendMessage(chat_id=1, text="x")))
+
+    assert result == "ok"
+    assert calls == ["x", "x"]
+    assert instrumentation.TELEGRAM_RETRIES.value(method="sendMessage") == before + 1
+
+
+def test_only_message_methods_are_limited():
+    assert outbound.is_limited("sendMessage")
+    assert outbound.is_limited("deleteMessages")
+    assert not outbound.is_limited("deleteWebhook")
+    assert not outbound.is_limited("getUpdates")
+
+    async def make_request(bot, method):
+        return True
+
+    before = instrumentation.TELEGRAM_QUEUE_SECONDS.count(priority="interactive")
+    scheduler = OutboundScheduler(rate=100)
+    asyncio.run(scheduler(make_request, None, AnswerCallbackQuery(callback_query_id="1")))
+    assert instrumentation.TELEGRAM_QUEUE_SECONDS.count(priority="interactive") == before
@@ -182,10 +182,8 @@ def setup_temp_db(monkeypatch):
 def test_process_phone_valid(monkeypatch):
     db_path = setup_temp_db(monkeypatch)
     monkeypatch.setattr(registration, "get_main_menu", lambda: None)
-    monkeypatch.setattr(registration, "log_user_action", lambda *a, **kw: None)
-    async def _get_uid(m):
-        return 1
-    monkeypatch.setattr(registration, "get_current_user_id", _get_uid)
+    actions = []
+    monkeypatch.setattr(registration, "log_user_action", lambda *a, **kw: actions.append(a))
 
     msg = DummyMessage(text="+79991234567")
     state = DummyFSMContext({"name": "N", "city": "C"})
@@ -201,15 +199,14 @@ def test_process_phone_valid(monkeypatch):
     row = conn.execute("SELECT phone FROM users WHERE telegram_id = 1").fetchone()
     conn.close()
     assert row["phone"] == "+79991234567"
+    # The sender was not registered when the update arrived
+    assert actions == [(1, "registration")]
 
 
 def test_process_phone_invalid(monkeypatch):
     setup_temp_db(monkeypatch)
     monkeypatch.setattr(registration, "get_main_menu", lambda: None)
     monkeypatch.setattr(registration, "log_user_action", lambda *a, **kw: None)
-    async def _get_uid_none(m):
-        return None
-    monkeypatch.setattr(registration, "get_current_user_id", _get_uid_none)
 
     msg = DummyMessage(text="12345")
     state = DummyFSMContext({"name": "N", "city": "C"})
@@ -0,0 +1,23 @@
+import os
+import sys
+
+# Ensure project root is on sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from supervisor import chat_id_of, shard_of
+
+
+def test_updates_are_routed_by_chat():
+    message = {"update_id": 1, "message": {"chat": {"id": 7}, "from": {"id": 9}}}
+    callback = {
+        "update_id": 2,
+        "callback_query": {"from": {"id": 9}, "message": {"chat": {"id": 7}}},
+    }
+    member = {"update_id": 3, "my_chat_member": {"chat": {"id": 7}, "from": {"id": 7}}}
+    inline = {"update_id": 4, "inline_query": {"from": {"id": 9}}}
+
+    assert [chat_id_of(u) for u in (message, callback, member, inline)] == [7, 7, 7, 9]
+    assert shard_of(message, 4) == shard_of(callback, 4) == 3
+    assert shard_of({"update_id": 5}, 4) == 0
+    # Group chats have negative IDs
+    assert 0 <= shard_of({"update_id": 6, "message": {"chat": {"id": -100}}}, 3) < 3
@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 import types
@@ -23,7 +24,8 @@ from utils import (
     validate_weight,
     validate_phone,
 )
-from locations import get_regions, get_cities
+import locations
+from locations import get_regions, get_cities, normalize_region, parse_regions
 
 
 def test_parse_date_valid():
@@ -77,3 +79,44 @@ def test_locations_lists():
     for r in regions:
         cities = get_cities(r)
         assert cities, f"{r} should have cities"
+
+
+def test_normalize_region_fuzzy():
+    assert normalize_region("Тверская обл.") == "Тверская обл."
+    assert normalize_region("тверская область") == "Тверская обл."
+    assert normalize_region("Тверь") == "Тверская обл."
+    assert normalize_region("Башкирия") == "Башкортостан(Башкирия)"
+    assert normalize_region("Ярославская облась") == "Ярославская обл."
+    assert normalize_region("абвгд") is None
+
+
+def test_parse_regions_reports_unknown():
+    regions, unknown = parse_regions("москва, Тверь; тверская, абвгд")
+    assert regions == ["Москва и Московская обл.", "Тверская обл."]
+    assert unknown == ["абвгд"]
+
+
+def test_locations_index_is_rebuilt_when_json_changes(tmp_path):
+    src = tmp_path / "russia.json"
+    idx = str(tmp_path / "russia.idx")
+    rows = [{"region": "Б", "city": "Y"}, {"region": "А", "city": "X"}]
+    src.write_text(json.dumps(rows), encoding="utf-8")
+
+    assert locations._read_index(str(src), idx) is None
+    built = locations.build_index(str(src), idx)
+    assert built.regions == ("А", "Б")
+    assert locations._read_index(str(src), idx) == built
+
+    rows.append({"region": "А", "city": "W"})
+    src.write_text(json.dumps(rows), encoding="utf-8")
+    os.utime(src, ns=(0, 0))
+    assert locations._read_index(str(src), idx) is None
+    assert locations.compile_index(str(src)).cities == ("W", "X", "Y")
+
+
+def test_is_region_and_is_city():
+    region = get_regions()[0]
+    assert locations.is_region(region)
+    assert not locations.is_region(region + "x")
+    assert locations.is_city(region, get_cities(region)[0])
+    assert not locations.is_city(region, "нет такого")
@@ -108,7 +108,12 @@ async def dummy_show_search_results(*args, **kwargs):
     pass
 common_stub.get_main_menu = lambda: None
 common_stub.ask_and_store = dummy_ask_and_store
+common_stub.cleanup_messages = lambda *a, **k: None
 common_stub.show_search_results = dummy_show_search_results
+common_stub.start_search = dummy_show_search_results
+common_stub.format_search_results = lambda *a, **k: ("", None)
+common_stub.SEARCH_PAGE_SIZE = 5
+common_stub.resolve_city_input = lambda *a, **k: None
 common_stub.create_paged_keyboard = lambda *a, **k: None
 async def dummy_process_weight_step(
     message,
@@ -119,6 +124,7 @@ async def dummy_process_weight_step(
     invalid_text,
     *,
     validate_func,
+    flow_cls=None,
 ):
     raw = message.text.strip()
     ok, weight = validate_func(raw)
@@ -131,14 +137,14 @@ async def dummy_process_weight_step(
 
 async def dummy_parse_and_store_date(
     message,
-    state,
+    flow,
     field_name,
     error_text,
     *,
     compare_field=None,
     compare_error="",
 ):
-    await state.update_data(**{field_name: "2024-01-01"})
+    setattr(flow, field_name, "2024-01-01")
     return True
 common_stub.process_weight_step = dummy_process_weight_step
 common_stub.parse_and_store_date = dummy_parse_and_store_date
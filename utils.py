@@ -8,6 +8,7 @@ import logging
 import re
 from aiogram import types
 from db import get_connection
+from identity import resolve_user_id
 from config import Config
 
 
@@ -19,15 +20,10 @@ def db_cursor():
         with db_cursor() as cursor:
             cursor.execute(...)
             ...
-    В конце автоматически выполняется conn.commit() и conn.close().
+    В конце автоматически выполняется commit, а соединение возвращается в пул.
     """
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        yield cursor
-        conn.commit()
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        yield conn.cursor()
 
 
 def parse_date(text: str) -> str | None:
@@ -47,13 +43,9 @@ async def get_current_user_id(message: types.Message) -> int | None:
     """
     Возвращает id пользователя из таблицы users по telegram_id.
     Если пользователь не найден — возвращает None.
+    Обработчики получают этот id от UserIdentityMiddleware в аргументе user_id.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE telegram_id = ?", (message.from_user.id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row["id"] if row else None
+    return await resolve_user_id(message.from_user.id)
 
 
 def format_date_for_display(iso_date: str) -> str:
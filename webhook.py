@@ -0,0 +1,134 @@
+"""Receiving updates through a webhook instead of long polling.
+
+With ``BOT_MODE=webhook`` Telegram pushes every update to an aiohttp server
+listening on :attr:`Config.WEBHOOK_HOST` and :attr:`Config.WEBHOOK_PORT`, so
+updates arrive without ``getUpdates`` round trips and several instances can
+sit behind a load balancer.  Requests are accepted only with the
+``X-Telegram-Bot-Api-Secret-Token`` header equal to
+:attr:`Config.WEBHOOK_SECRET` and answered immediately; the update is
+processed in the background.  ``GET /health`` reports whether the server is
+up for load balancer checks.
+
+On SIGINT/SIGTERM the server stops accepting updates, waits up to
+:attr:`Config.WEBHOOK_SHUTDOWN_TIMEOUT` seconds for updates still being
+handled and then runs the dispatcher shutdown hooks (FSM flush, broadcasts).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import secrets
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import Config
+
+
+class WebhookRequestHandler(SimpleRequestHandler):
+    """Request handler that lets in-flight updates finish on shutdown."""
+
+    def __init__(self, *args, shutdown_timeout: float, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.shutdown_timeout = shutdown_timeout
+
+    @property
+    def pending(self) -> int:
+        """Number of updates still being handled."""
+        return len(self._background_feed_update_tasks)
+
+    async def close(self) -> None:
+        tasks = set(self._background_feed_update_tasks)
+        if tasks:
+            _, unfinished = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+            if unfinished:
+                logging.warning(
+                    "Cancelling %d updates still running at shutdown", len(unfinished)
+                )
+                for task in unfinished:
+                    task.cancel()
+                await asyncio.gather(*unfinished, return_exceptions=True)
+        await super().close()
+
+
+def build_app(
+    dp: Dispatcher,
+    bot: Bot,
+    *,
+    path: str | None = None,
+    secret: str | None = None,
+    shutdown_timeout: float | None = None,
+) -> web.Application:
+    """Return the aiohttp application feeding webhook updates to ``dp``."""
+    handler = WebhookRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=Config.WEBHOOK_SECRET if secret is None else secret,
+        shutdown_timeout=(
+            Config.WEBHOOK_SHUTDOWN_TIMEOUT
+            if shutdown_timeout is None
+            else shutdown_timeout
+        ),
+    )
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "pending_updates": handler.pending})
+
+    app = web.Application()
+    app.router.add_get("/health", health)
+    # Registered first so in-flight updates finish before the shutdown hooks
+    handler.register(app, path=path or Config.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def _wait_for_signal() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Not supported on Windows: Ctrl+C cancels the task instead
+            pass
+    await stop.wait()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Serve the webhook until SIGINT/SIGTERM.
+
+    When :attr:`Config.WEBHOOK_URL` is set the webhook is registered with
+    Telegram on startup; a random secret is used if none is configured.
+    """
+    secret = Config.WEBHOOK_SECRET
+    if Config.WEBHOOK_URL:
+        secret = secret or secrets.token_urlsafe(32)
+        url = Config.WEBHOOK_URL.rstrip("/") + Config.WEBHOOK_PATH
+
+        async def set_webhook(bot: Bot) -> None:
+            await bot.set_webhook(
+                url,
+                secret_token=secret,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logging.info("Webhook set to %s", url)
+
+        dp.startup.register(set_webhook)
+    elif not secret:
+        logging.warning("WEBHOOK_SECRET is empty: webhook requests are not verified")
+
+    runner = web.AppRunner(build_app(dp, bot, secret=secret), access_log=None)
+    await runner.setup()
+    try:
+        site = web.TCPSite(runner, Config.WEBHOOK_HOST, Config.WEBHOOK_PORT)
+        await site.start()
+        logging.info(
+            "Listening for webhook updates on %s:%s%s",
+            Config.WEBHOOK_HOST, Config.WEBHOOK_PORT, Config.WEBHOOK_PATH,
+        )
+        await _wait_for_signal()
+    finally:
+        await runner.cleanup()